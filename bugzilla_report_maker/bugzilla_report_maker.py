@@ -10,18 +10,39 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Status changes listed per resource type in the report, all of them are in the environment state diff file
+REPORT_CHANGES_LIMIT = 20
+
 
 class bugzilla_report_maker:
     """
     Generate a bugzilla report template
     """
 
-    def __init__(self, logs_path, issue_found, test_name, components_versions, events_file_path):
+    def __init__(self, logs_path, issue_found, test_name, components_versions, events_file_path, env_state_diff=None):
         self.logs_path = logs_path
         self.issue_found = issue_found
         self.test_name = test_name
         self.components_versions = components_versions
         self.events_file_path = events_file_path
+        # changes of the environment state since the test start, see env_state.diff_snapshots
+        self.env_state_diff = env_state_diff
+
+    def env_state_changes(self):
+        """
+        Count of the added, removed and changed resources per resource type, and the status changes
+        """
+        lines = []
+        for resource_type, changes in sorted(self.env_state_diff['resources'].items()):
+            lines.append("%s: %s added, %s removed, %s changed" % (
+                resource_type, len(changes['added']), len(changes['removed']), len(changes['changed'])
+            ))
+            for change in changes['changed'][:REPORT_CHANGES_LIMIT]:
+                lines.append("    %s: %s -> %s" % (change['name'], change['before']['status'], change['after']['status']))
+            if len(changes['changed']) > REPORT_CHANGES_LIMIT:
+                lines.append("    and %s more" % (len(changes['changed']) - REPORT_CHANGES_LIMIT))
+
+        return "\n".join(lines)
 
     def tail_lines_event_log(self, lines=10):
         stdin, stdout = os.popen2("tail -n " + str(lines) + " " + self.events_file_path)
@@ -44,6 +65,10 @@ class bugzilla_report_maker:
         data_dict["actual results"] = self.issue_found
         data_dict["expected results"] = "This should not appear: %s" % self.issue_found
         data_dict["additional_info"] = "Logs full path:\n" + self.logs_path
+        if self.env_state_diff is not None:
+            data_dict["additional_info"] += "\n\nEnvironment state changes since the test start:\n" + (
+                self.env_state_changes() or "None"
+            )
 
         file_full_path = self.logs_path + "/" + "bugzilla_report"
         logger.info("Creating bugzilla report file %s" % file_full_path)
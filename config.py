@@ -10,3 +10,7 @@ LOCAL_ROOT_PASSWORD = "localhost_pass"
 SLAVE_HOST = Host("127.0.0.1")
 SLAVE_HOST.users.append(RootUser(LOCAL_ROOT_PASSWORD))
 FULL_PERMISSIONS = "777"
+# Logs are compressed on hosts slower than this (bytes/sec) in the 'auto' compression mode
+COMPRESS_BELOW_BANDWIDTH = 50 * 1024 * 1024
+# Bytes read from a host to measure its bandwidth
+BANDWIDTH_PROBE_SIZE = 1024 * 1024
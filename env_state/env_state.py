@@ -2,13 +2,21 @@ import argparse
 import datetime
 import json
 import logging
+from contextlib import closing
+from multiprocessing.pool import ThreadPool
 
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
 from tabulate import tabulate
 
 import config
 
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 logging.basicConfig(
@@ -17,6 +25,22 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S')
 logger = logging.getLogger(__name__)
 
+API_USER = 'admin@internal'
+# (connect, read) timeout in seconds of a single API request, big collections take a while to be served
+REQUEST_TIMEOUT = (10, 300)
+# Key of the list of resources in the JSON response of each resource type
+RESOURCE_KEYS = {
+    'storagedomains': 'storage_domain', 'hosts': 'host', 'clusters': 'cluster', 'datacenters': 'data_center',
+    'vms': 'vm', 'networks': 'network', 'templates': 'template', 'disks': 'disk', 'vnicprofiles': 'vnic_profile',
+}
+# Resource types that grow to thousands on big engines, fetched a page of PAGE_SIZE resources at a time
+PAGED_RESOURCES = ['vms', 'templates', 'disks']
+PAGE_SIZE = 500
+# Fields kept of each resource, the API has no field selection so the rest is dropped while the response is parsed
+RESOURCE_FIELDS = ('id', 'name', 'status', 'external_status')
+# The snapshot of the statuses is written next to the results file, as <results file>.json
+SNAPSHOT_EXTENSION = '.json'
+
 
 class EnvState:
     """
@@ -29,45 +53,258 @@ class EnvState:
         self.engine_uri = engine_uri
         self.engine_pass = engine_pass
         self.results_path = results_path
+        # resource type -> resource id -> {'name': name, 'status': status}
+        self.snapshot = {}
 
-    def parse_response(self, resource_dict):
-        name_status_lst = []
-        for i in range(0, len(resource_dict[resource_dict.keys()[0]])):
-            if 'name' and 'status' in resource_dict[resource_dict.keys()[0]][i]:
-                name_status_lst.append({resource_dict[resource_dict.keys()[0]][i]['name']:
-                                        resource_dict[resource_dict.keys()[0]][i]['status']})
+    def create_session(self, pool_size):
+        """
+        Session for all the API requests, its connections to the engine are kept alive and reused instead of opening
+        a new TLS connection per request
 
-            elif 'name' and 'external_status' in resource_dict[resource_dict.keys()[0]][i]:
-                name_status_lst.append({resource_dict[resource_dict.keys()[0]][i]['name']:
-                                        resource_dict[resource_dict.keys()[0]][i]['external_status']})
+        :param pool_size: connections kept open to the engine, one per concurrent request
+        :type pool_size: int
+        :return: the session
+        :rtype: requests.Session
+        """
+        session = requests.Session()
+        session.auth = (API_USER, self.engine_pass)
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        return session
 
-            else:
-                name_status_lst.append({resource_dict[resource_dict.keys()[0]][i]['name']: None})
+    def fetch_resource(self, session, resource, timeout=REQUEST_TIMEOUT, page_size=PAGE_SIZE):
+        """
+        Query the engine for the statuses of all the resources of one type, page by page for the big resource types
 
-        return name_status_lst
+        :param session: session of the requests
+        :type session: requests.Session
+        :param resource: resource type, e.g. vms
+        :type resource: str
+        :param timeout: timeout of each request, see requests
+        :type timeout: tuple
+        :param page_size: resources per page of the paged resource types
+        :type page_size: int
+        :return: list of the resources as dicts of RESOURCE_FIELDS
+        :rtype: list
+        """
+        logger.info('Parsing resource: %s' % resource)
+        if resource not in PAGED_RESOURCES:
+            return self.fetch_page(session, resource, timeout=timeout)
+        resources = []
+        seen = set()
+        page = 1
+        while True:
+            page_resources = self.fetch_page(session, resource, page, page_size, timeout)
+            new_resources = [item for item in page_resources if item.get('id') not in seen]
+            resources.extend(new_resources)
+            seen.update(item.get('id') for item in new_resources)
+            # a short page is the last one, a page of known resources means the engine ignored the paging
+            if len(page_resources) < page_size or not new_resources:
+                break
+            page += 1
+        return resources
 
-def get_resources_stats(engine_uri, engine_pass, results_path):
-    envs_ob = EnvState(engine_uri, engine_pass, results_path)
+    def fetch_page(self, session, resource, page=None, page_size=None, timeout=REQUEST_TIMEOUT):
+        """
+        Query the engine for resources of one type, keeping only RESOURCE_FIELDS of each resource. With ijson installed
+        the response is parsed while it is read, one resource at a time, instead of loading the whole body.
 
-    for resource in envs_ob.resource_lst:
-        logger.info('Parsing resource: %s' % resource)
-        url_for_resource = 'https://%s/ovirt-engine/api/%s?accept=application/json' % (envs_ob.engine_uri, resource)
+        :param session: session of the requests
+        :type session: requests.Session
+        :param resource: resource type, e.g. vms
+        :type resource: str
+        :param page: page number starting at 1, None for all the resources
+        :type page: int
+        :param page_size: resources per page
+        :type page_size: int
+        :param timeout: timeout of the request, see requests
+        :type timeout: tuple
+        :return: list of the resources as dicts of RESOURCE_FIELDS
+        :rtype: list
+        """
+        url_for_resource = 'https://%s/ovirt-engine/api/%s?accept=application/json' % (self.engine_uri, resource)
+        params = {'search': 'page %s' % page, 'max': page_size} if page else None
+        response = None
         try:
-            response = requests.get(url_for_resource, auth=('admin@internal', envs_ob.engine_pass), verify=False)
-            resource_dict = json.loads(response.content)
-            resource_stats = envs_ob.parse_response(resource_dict=resource_dict)
-
-        except requests.exceptions.HTTPError as e:
+            # verify is given per request, a CA bundle set in the environment overrides the verify of the session
+            response = session.get(url_for_resource, params=params, verify=False, timeout=timeout, stream=True)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
             raise requests.exceptions.HTTPError(
                 "Something bad occurred when queering the engine with: %s\n%s\nresponse is: %s" % (
                     url_for_resource, e, response
                 )
             )
+        with closing(response):
+            if ijson is not None:
+                # the raw stream is not decoded by requests, a compressed response is decoded while it is read
+                response.raw.decode_content = True
+                items = ijson.items(response.raw, '%s.item' % RESOURCE_KEYS[resource])
+            else:
+                # an empty collection is an empty object
+                items = json.loads(response.content).get(RESOURCE_KEYS[resource], [])
+            return [dict((field, item[field]) for field in RESOURCE_FIELDS if field in item) for item in items]
+
+    def parse_resources(self, resources):
+        """
+        :param resources: resources as dicts with name and status or external status
+        :type resources: list
+        :return: list of {name: status} of the resources, the status is None if they have none
+        :rtype: list
+        """
+        return [{resource['name']: resource_status(resource)} for resource in resources]
+
+    def add_to_snapshot(self, resource_type, resources):
+        """
+        :param resource_type: resource type, e.g. vms
+        :type resource_type: str
+        :param resources: the resources of the type as dicts of RESOURCE_FIELDS
+        :type resources: list
+        """
+        self.snapshot[resource_type] = dict(
+            (resource.get('id', resource['name']), {'name': resource['name'], 'status': resource_status(resource)})
+            for resource in resources
+        )
+
+    def write_snapshot(self, path):
+        """
+        :param path: full path of the snapshot file
+        :type path: str
+        """
+        with open(path, 'w') as f:
+            json.dump(self.snapshot, f)
+
+
+def resource_status(resource):
+    """
+    :param resource: resource as a dict with name and status or external status
+    :type resource: dict
+    :return: the status, the external status if it has no status, None if it has none
+    :rtype: str
+    """
+    if 'status' in resource:
+        return resource['status']
+    return resource.get('external_status')
+
+
+def load_snapshot(path):
+    """
+    :param path: full path of a snapshot written by get_resources_stats
+    :type path: str
+    :return: resource type -> resource id -> {'name': name, 'status': status}
+    :rtype: dict
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+def diff_snapshots(before, after):
+    """
+    Compare two snapshots of the environment by resource ids, set operations on the ids and a single dict lookup per
+    resource keep it linear in the number of resources. Resource types missing from either snapshot (their query
+    failed) are not compared.
+
+    :param before: older snapshot, see load_snapshot
+    :type before: dict
+    :param after: newer snapshot
+    :type after: dict
+    :return: per resource type that changed, the added and removed resources and the resources whose name or status
+             changed, with a count of each per resource type under 'summary'
+    :rtype: dict
+    """
+    diff = {'summary': {}, 'resources': {}}
+    for resource_type in sorted(set(before) & set(after)):
+        old, new = before[resource_type], after[resource_type]
+        old_ids, new_ids = set(old), set(new)
+        changes = {
+            'added': [dict(new[i], id=i) for i in new_ids - old_ids],
+            'removed': [dict(old[i], id=i) for i in old_ids - new_ids],
+            'changed': [
+                {'id': i, 'name': new[i]['name'], 'before': old[i], 'after': new[i]}
+                for i in old_ids & new_ids if old[i] != new[i]
+            ],
+        }
+        if not [change for change in changes.values() if change]:
+            continue
+        for change in changes.values():
+            change.sort(key=lambda resource: (resource['name'], resource['id']))
+        diff['resources'][resource_type] = changes
+        diff['summary'][resource_type] = dict((kind, len(change)) for kind, change in changes.items())
+    return diff
+
+
+def write_snapshots_diff(before_path, after_path, diff_path):
+    """
+    Diff two snapshot files, see diff_snapshots, and write the diff as compact JSON
+
+    :param before_path: full path of the older snapshot
+    :type before_path: str
+    :param after_path: full path of the newer snapshot
+    :type after_path: str
+    :param diff_path: full path of the diff file
+    :type diff_path: str
+    :return: the diff
+    :rtype: dict
+    """
+    diff = diff_snapshots(load_snapshot(before_path), load_snapshot(after_path))
+    with open(diff_path, 'w') as f:
+        json.dump(diff, f, separators=(',', ':'), sort_keys=True)
+    logger.info("Environment state changes %s written to %s", diff['summary'], diff_path)
+    return diff
+
+
+def get_resources_stats(engine_uri, engine_pass, results_path, workers=None, timeout=REQUEST_TIMEOUT):
+    """
+    Query the engine for the statuses of all resource types at once and write them to the results file, so the time
+    it takes is about the time of the slowest resource type instead of the sum of all of them. A resource type that
+    fails does not hold the others, they are written and then the failure is raised. The statuses are also written as
+    a snapshot keyed by resource type and id to <results file>.json, see diff_snapshots.
+
+    :param engine_uri: engine uri, without https
+    :type engine_uri: str
+    :param engine_pass: admin API password
+    :type engine_pass: str
+    :param results_path: full path of the results file, the statuses are appended to it
+    :type results_path: str
+    :param workers: concurrent requests, one per resource type if None
+    :type workers: int
+    :param timeout: (connect, read) timeout in seconds of each request
+    :type timeout: tuple
+    :return: the snapshot
+    :rtype: dict
+    """
+    envs_ob = EnvState(engine_uri, engine_pass, results_path)
+    workers = workers or len(envs_ob.resource_lst)
+    session = envs_ob.create_session(workers)
+    pool = ThreadPool(workers)
+    try:
+        pending = [
+            (resource, pool.apply_async(envs_ob.fetch_resource, (session, resource, timeout)))
+            for resource in envs_ob.resource_lst
+        ]
+        results = []
+        errors = []
+        for resource, async_result in pending:
+            try:
+                results.append((resource, async_result.get()))
+            except Exception as e:
+                logger.error("Querying the engine for %s failed with error %s", resource, e)
+                errors.append(e)
+    finally:
+        pool.close()
+        pool.join()
+        session.close()
 
-        with open(envs_ob.results_path, 'a') as f:
+    with open(envs_ob.results_path, 'a') as f:
+        for resource, resources in results:
+            resource_stats = envs_ob.parse_resources(resources)
             f.write(tabulate([[i.items()[0][0], i.items()[0][1]] for i in resource_stats],
                              headers=[resource, 'State']))
             f.write('\n\n')
+            envs_ob.add_to_snapshot(resource, resources)
+    envs_ob.write_snapshot(envs_ob.results_path + SNAPSHOT_EXTENSION)
+    if errors:
+        raise errors[0]
+    return envs_ob.snapshot
 
 
 def main():
@@ -7,6 +7,13 @@ import config
 from rrmng.rrmngmnt.host import Host
 from rrmng.rrmngmnt.user import User
 
+# Log lines start with a fixed width timestamp, e.g. '2018-07-25 03:11:35,123+03 INFO ...'
+LOG_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+LOG_TIMESTAMP_LENGTH = 19
+# Parsed timestamps by their seconds prefix, many lines share a second
+_log_timestamps_cache = {}
+LOG_TIMESTAMPS_CACHE_SIZE = 100000
+
 
 def get_host_resource(ip, password, username=None):
     """
@@ -46,14 +53,16 @@ def get_host_executor(ip, password, username=None, use_pkey=False):
     ).executor(user, pkey=use_pkey)
 
 
-def create_localhost_logs_dir(local_host_logs_path):
+def create_localhost_logs_dir(local_host_logs_path, dir_name=None):
     """
     Collect logs from remote hosts back to one directory in localhost
+    The directory is named after the current timestamp unless dir_name is given
     """
     # Create directory names after current timestamp
     if not os.path.exists(local_host_logs_path):
         os.mkdir(local_host_logs_path)
-    dir_name = datetime.datetime.now().strftime("%d%m%y_%H:%M:%S")
+    if dir_name is None:
+        dir_name = datetime.datetime.now().strftime("%d%m%y_%H:%M:%S")
     full_path = local_host_logs_path + "/" + dir_name
     localhost_user = localhost_group = getpass.getuser()
     print "localhost_user and group is %s" % localhost_user
@@ -74,11 +83,18 @@ def create_localhost_short_logs_dir(local_host_logs_path, lines):
     config.SLAVE_HOST.fs.mkdir(short_logs_full_path)
     config.SLAVE_HOST.fs.chmod(short_logs_full_path, config.FULL_PERMISSIONS)
     file_list = config.SLAVE_HOST.fs.listdir(local_host_logs_path)
-    short_logs_names = [file.encode('utf-8') for file in file_list if file.endswith(".log" + str(lines))]
+    short_logs_names = [file.encode('utf-8') for file in file_list if is_short_log(file, lines)]
     for short_log_name in short_logs_names:
         config.SLAVE_HOST.fs.move(local_host_logs_path + "/" + short_log_name, short_logs_full_path + "/" + short_log_name)
 
 
+def is_short_log(file_name, lines):
+    """
+    Tell a short log, the last lines of a log dumped by log_dumper, named after the log with the number of lines
+    """
+    return file_name.endswith(".log" + str(lines))
+
+
 def chmod_files_directories(dir_path):
     """
     Change permissions recursively of all files and directories in a selected directory
@@ -87,3 +103,65 @@ def chmod_files_directories(dir_path):
         for f in files:
             config.SLAVE_HOST.fs.chmod(os.path.join(root, f), config.FULL_PERMISSIONS)
 
+
+def _parse_fixed_timestamp(stamp):
+    """
+    Parse 'YYYY-mm-dd HH:MM:SS' (or with 'T' as separator) by its fixed positions, much faster than strptime
+
+    :param stamp: the timestamp
+    :type stamp: str
+    :return: the parsed time, None if stamp is not such timestamp
+    :rtype: datetime.datetime
+    """
+    if (
+        len(stamp) != LOG_TIMESTAMP_LENGTH or stamp[4] != '-' or stamp[7] != '-' or stamp[10] not in ' T' or
+        stamp[13] != ':' or stamp[16] != ':'
+    ):
+        return None
+    try:
+        return datetime.datetime(
+            int(stamp[0:4]), int(stamp[5:7]), int(stamp[8:10]), int(stamp[11:13]), int(stamp[14:16]),
+            int(stamp[17:19])
+        )
+    except ValueError:
+        return None
+
+
+def parse_log_fraction(line, start=LOG_TIMESTAMP_LENGTH):
+    """
+    Parse the fraction of a second right after the timestamp of a log line, e.g. ',123' of '2018-07-25 03:11:35,123+03'
+
+    :param line: log line
+    :type line: str
+    :param start: offset of the fraction in the line, right after the seconds of the timestamp
+    :type start: int
+    :return: the fraction in microseconds, 0 if there is none
+    :rtype: int
+    """
+    if line[start:start + 1] not in (',', '.'):
+        return 0
+    digits = line[start + 1:start + 7]
+    end = 0
+    while end < len(digits) and digits[end].isdigit():
+        end += 1
+    return int(digits[:end].ljust(6, '0')) if end else 0
+
+
+def parse_log_timestamp(line):
+    """
+    Parse the timestamp a log line starts with, results are cached by the seconds prefix of the line
+
+    :param line: log line
+    :type line: str
+    :return: the time of the line (seconds resolution), None if the line has no timestamp
+    :rtype: datetime.datetime
+    """
+    stamp = line[:LOG_TIMESTAMP_LENGTH]
+    try:
+        return _log_timestamps_cache[stamp]
+    except KeyError:
+        pass
+    if len(_log_timestamps_cache) >= LOG_TIMESTAMPS_CACHE_SIZE:
+        _log_timestamps_cache.clear()
+    parsed = _log_timestamps_cache[stamp] = _parse_fixed_timestamp(stamp)
+    return parsed
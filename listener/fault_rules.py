@@ -0,0 +1,257 @@
+import logging
+import re
+import sre_constants
+import sre_parse
+
+import yaml
+
+SEVERITIES = ('critical', 'error', 'warning', 'info')
+# dump - run the whole incident flow (dump logs, notify, report)
+# notify - only notify via mail and console
+# log - only log the match
+ACTIONS = ('dump', 'notify', 'log')
+# Groups limit of a single regex
+MAX_GROUPS = 100
+
+logger = logging.getLogger("art.utils.fault_rules")
+
+
+def required_literal(regex):
+    """
+    Find the longest literal string that every match of regex contains
+
+    Only the top level sequence of the regex is inspected, which is enough for
+    fault signatures like 'Traceback' or 'vdsm.storage.exception.\\w+Error'.
+
+    Args:
+        regex (str): Regular expression
+
+    Returns:
+        str: The literal, empty string if no literal can be told
+    """
+    try:
+        parsed = sre_parse.parse(regex)
+    except sre_constants.error:
+        return ''
+    state = getattr(parsed, 'state', None) or parsed.pattern
+    if state.flags & (re.IGNORECASE | re.VERBOSE):
+        return ''
+    best = run = ''
+    for op, av in parsed:
+        if op == sre_constants.LITERAL:
+            run += chr(av)
+            continue
+        best = max(best, run, key=len)
+        run = ''
+    return max(best, run, key=len)
+
+
+def has_group_refs(regex):
+    """
+    Tell whether a regex refers to its own groups, like '(\\w+)=\\1' or
+    '(a)?(?(1)b|c)', such references point to other groups once the regex is
+    put together with other regexes
+
+    Args:
+        regex (str): Regular expression
+
+    Returns:
+        bool: True if the regex has group references
+    """
+    refs = (
+        sre_constants.GROUPREF, sre_constants.GROUPREF_IGNORE,
+        sre_constants.GROUPREF_EXISTS,
+    )
+
+    def walk(value):
+        if isinstance(value, sre_parse.SubPattern):
+            return any(op in refs or walk(av) for op, av in value)
+        if isinstance(value, (list, tuple)):
+            return any(walk(item) for item in value)
+        return False
+
+    try:
+        return walk(sre_parse.parse(regex))
+    except sre_constants.error:
+        return False
+
+
+def literals_regex(literals):
+    """
+    Build a regex matching any of the literals, factored as a prefix trie so
+    the regex engine walks all the literals at once instead of trying them
+    one after the other (an Aho-Corasick like prefilter run in C).
+
+    Args:
+        literals (list): Literal strings
+
+    Returns:
+        str: Regular expression
+    """
+    trie = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            if '' in node:
+                # a shorter literal is enough, any line with this one has it
+                break
+            node = node.setdefault(char, {})
+        else:
+            node.clear()
+            node[''] = True
+
+    def emit(node):
+        if '' in node:
+            return ''
+        alternatives = [re.escape(char) + emit(node[char]) for char in sorted(node)]
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return '(?:%s)' % '|'.join(alternatives)
+
+    return emit(trie)
+
+
+class FaultRule(object):
+    """
+    A single fault signature with its severity and the action it calls for
+    """
+
+    def __init__(self, name, regex, severity='error', action='dump', literal=None):
+        """
+        Args:
+            name (str): Rule name, used in logs, notifications and reports
+            regex (str): Regular expression searched on each log line
+            severity (str): One of SEVERITIES
+            action (str): One of ACTIONS
+            literal (str): Literal every matching line contains, used to
+                prefilter lines, found from the regex when not given
+        """
+        if severity not in SEVERITIES:
+            raise ValueError("Unknown severity %s for rule %s, expected one of %s" % (severity, name, SEVERITIES))
+        if action not in ACTIONS:
+            raise ValueError("Unknown action %s for rule %s, expected one of %s" % (action, name, ACTIONS))
+        self.name = name
+        self.regex = regex
+        self.severity = severity
+        self.action = action
+        self.pattern = re.compile(regex)
+        self.literal = required_literal(regex) if literal is None else literal
+
+    def __repr__(self):
+        return "FaultRule(%s, %s, %s, %s)" % (self.name, self.regex, self.severity, self.action)
+
+
+class FaultRuleSet(object):
+    """
+    Many fault rules evaluated together.
+
+    Lines are first found with one prefilter regex over the whole received
+    data, built from the literals of the rules (or the alternation of all
+    the rules when some rule has no literal). Lines passing the prefilter
+    are matched once against a combined regex with a capturing lookahead
+    per rule, which tells every rule that matched the line (big rule sets
+    are combined to a few such regexes). Rules referring to their own
+    groups are matched one by one, their group numbers would change in a
+    combined regex.
+    """
+
+    def __init__(self, rules):
+        """
+        Args:
+            rules (list): FaultRule instances
+        """
+        if not rules:
+            raise ValueError("At least one fault rule is needed")
+        self.rules = list(rules)
+        self._separate = [rule for rule in self.rules if has_group_refs(rule.regex)]
+        literals = [rule.literal for rule in self.rules]
+        if all(literals):
+            self.gate = re.compile(literals_regex(literals), re.MULTILINE)
+        else:
+            # a rule with group references can't be a part of the alternation, it is gated by its literal, without
+            # one every line start passes the prefilter
+            self.gate = re.compile(
+                '|'.join(
+                    (re.escape(rule.literal) if rule.literal else '^') if rule in self._separate
+                    else '(?:%s)' % rule.regex
+                    for rule in self.rules
+                ),
+                re.MULTILINE
+            )
+        self._combined = self._combine()
+
+    def _combine(self):
+        """
+        Build regexes with an optional capturing lookahead per rule, split to
+        batches to stay below the regex engine groups limit
+
+        Returns:
+            list: Tuples of (compiled regex, [(rule, group number)]), None if
+                the rules can't be combined (inline flags, clashing names)
+        """
+        batches = []
+        parts = []
+        groups = []
+        group = 1
+        for rule in self.rules:
+            if rule in self._separate:
+                continue
+            if rule.pattern.flags & ~re.UNICODE:
+                return None
+            if group + rule.pattern.groups >= MAX_GROUPS and parts:
+                batches.append((parts, groups))
+                parts, groups, group = [], [], 1
+            parts.append('(?:(?=.*?(%s)))?' % rule.regex)
+            groups.append((rule, group))
+            group += rule.pattern.groups + 1
+        batches.append((parts, groups))
+        try:
+            return [(re.compile(''.join(parts)), groups) for parts, groups in batches]
+        except (sre_constants.error, AssertionError, OverflowError) as ex:
+            logger.warning("Can't combine fault rules to a single regex (%s), matching one by one", ex)
+            return None
+
+    def match_line(self, line):
+        """
+        Args:
+            line (str): Single log line
+
+        Returns:
+            list: FaultRule instances that match the line
+        """
+        if self._combined is None:
+            return [rule for rule in self.rules if rule.pattern.search(line)]
+        matched = []
+        for combined, groups in self._combined:
+            match = combined.match(line)
+            matched.extend(rule for rule, group in groups if match.group(group) is not None)
+        if self._separate:
+            matched.extend(rule for rule in self._separate if rule.pattern.search(line))
+            # in the order of the rules, as if all of them were matched one by one
+            matched = [rule for rule in self.rules if rule in matched]
+        return matched
+
+    def __str__(self):
+        return "rules(%s)" % ", ".join(rule.name for rule in self.rules)
+
+
+def load_fault_rules(rules, fault_regex=None):
+    """
+    Build a rule set from its configuration
+
+    Args:
+        rules (list or str): Dicts with name, regex and optional severity,
+            action and literal keys, or a path to a yaml file holding such a
+            list
+        fault_regex (str): Single regex to add as a rule named 'fault_regex'
+
+    Returns:
+        FaultRuleSet: The rule set
+    """
+    if isinstance(rules, basestring):
+        with open(rules) as f:
+            rules = yaml.safe_load(f)
+    fault_rules = [FaultRule(**rule) for rule in rules or []]
+    if fault_regex:
+        fault_rules.append(FaultRule('fault_regex', fault_regex))
+    return FaultRuleSet(fault_rules)
@@ -0,0 +1,83 @@
+import time
+
+# Read size for a single recv call on a tail channel
+READ_SIZE = 64 * 1024
+# Upper bound for a single wait on channels readiness, so timeouts and
+# closed channels are noticed even when no data arrives
+SELECT_INTERVAL = 1.0
+
+
+def get_deadline(time_out):
+    """
+    Translate a watch timeout to an absolute deadline
+
+    :param time_out: watch timeout in seconds, None or -1 means watch forever
+    :type time_out: int
+    :return: deadline as returned by time.time(), None for no deadline
+    :rtype: float
+    """
+    if time_out is None or time_out < 0:
+        return None
+    return time.time() + time_out
+
+
+def get_wait_time(deadline, interval=SELECT_INTERVAL):
+    """
+    How long to wait for channels readiness before checking the deadline again
+
+    :param deadline: deadline as returned by get_deadline
+    :type deadline: float
+    :param interval: maximum wait time
+    :type interval: float
+    :return: seconds to wait, 0 when the deadline has passed
+    :rtype: float
+    """
+    if deadline is None:
+        return interval
+    return max(0, min(interval, deadline - time.time()))
+
+
+def deadline_passed(deadline):
+    """
+    :param deadline: deadline as returned by get_deadline
+    :type deadline: float
+    :return: True if the deadline has passed
+    :rtype: bool
+    """
+    return deadline is not None and time.time() >= deadline
+
+
+class WatchStats(object):
+    """
+    Counts data read while watching logs, to tell the watch throughput
+    """
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.bytes_read = 0
+        self.lines_read = 0
+
+    def update(self, data):
+        """
+        :param data: newly read data
+        :type data: str
+        """
+        self.bytes_read += len(data)
+        self.lines_read += data.count("\n")
+
+    @property
+    def elapsed(self):
+        return max(time.time() - self.start_time, 1e-6)
+
+    @property
+    def bytes_per_sec(self):
+        return self.bytes_read / self.elapsed
+
+    @property
+    def lines_per_sec(self):
+        return self.lines_read / self.elapsed
+
+    def __str__(self):
+        return "%d bytes (%.1f bytes/sec), %d lines (%.1f lines/sec) in %.1f seconds" % (
+            self.bytes_read, self.bytes_per_sec, self.lines_read, self.lines_per_sec, self.elapsed
+        )
@@ -0,0 +1,142 @@
+import re
+
+from listener.fault_rules import FaultRuleSet
+
+# A line which never ends (binary junk, a stuck writer) must not grow the
+# pending tail forever, past this size it is scanned as is and dropped.
+MAX_PENDING_LINE = 1024 * 1024
+
+
+class LineMatcher(object):
+    """
+    Incremental, line oriented regex matcher for streamed log data.
+
+    Data is fed in arbitrary chunks (as received from a channel or a pipe),
+    only complete lines are scanned and only the unfinished tail line is kept
+    between calls, so every byte is scanned once no matter how long the
+    watch lasts.
+    """
+
+    def __init__(self, regex, max_pending_line=MAX_PENDING_LINE):
+        """
+        Args:
+            regex (str, compiled pattern or FaultRuleSet): Regular expression
+                to look for, searched separately on each line, or a set of
+                fault rules
+            max_pending_line (int): Maximum size of the unfinished tail line
+                kept between feeds
+        """
+        self.rule_set = None
+        if isinstance(regex, FaultRuleSet):
+            self.rule_set = regex
+            regex = regex.gate
+        elif isinstance(regex, basestring):
+            regex = re.compile(regex, re.MULTILINE)
+        self.pattern = regex
+        self.max_pending_line = max_pending_line
+        self._tail = ""
+        # Stream offset right after the last fed byte
+        self.position = 0
+
+    def reset(self, position=0):
+        """
+        Drop the unfinished tail line and restart counting offsets from
+        position, used when the stream jumps (truncated or rotated file)
+
+        Args:
+            position (int): Stream offset of the next fed byte
+        """
+        self._tail = ""
+        self.position = position
+
+    def feed(self, data):
+        """
+        Scan new data for matching lines
+
+        Args:
+            data (str): Newly received data
+
+        Returns:
+            list: Full lines (without the line break) that match the regex
+        """
+        return [line for _, line, _ in self._feed(data)]
+
+    def feed_offsets(self, data):
+        """
+        Same as feed, but also tells where in the stream each line starts
+
+        Args:
+            data (str): Newly received data
+
+        Returns:
+            list: Tuples of (offset, line) for lines that match the regex
+        """
+        return [(offset, line) for offset, line, _ in self._feed(data)]
+
+    def feed_rules(self, data):
+        """
+        Same as feed, but also tells which fault rules matched each line
+
+        Args:
+            data (str): Newly received data
+
+        Returns:
+            list: Tuples of (line, rules) where rules is a list of FaultRule,
+                or None when matching a plain regex
+        """
+        return [(line, rules) for _, line, rules in self._feed(data)]
+
+    def _feed(self, data):
+        if not data:
+            return []
+        base = self.position - len(self._tail)
+        self.position += len(data)
+        buf = self._tail + data if self._tail else data
+        end = buf.rfind("\n")
+        if end == -1:
+            if len(buf) > self.max_pending_line:
+                self._tail = ""
+                return self._scan(buf, base)
+            self._tail = buf
+            return []
+        self._tail = buf[end + 1:]
+        return self._scan(buf, base, end)
+
+    def flush(self):
+        """
+        Scan the unfinished tail line, used once the stream has ended
+
+        Returns:
+            list: The tail line if it matches the regex
+        """
+        base = self.position - len(self._tail)
+        buf, self._tail = self._tail, ""
+        return [line for _, line, _ in self._scan(buf, base)] if buf else []
+
+    def _scan(self, buf, base, end=None):
+        """
+        Search buf[:end] in a single pass and expand each hit to its line,
+        base is the stream offset of buf[0]. With a rule set the hits are
+        only candidates, verified by matching the line against the rules.
+        """
+        if end is None:
+            end = len(buf)
+        lines = []
+        pos = 0
+        while pos < end:
+            match = self.pattern.search(buf, pos, end)
+            if match is None:
+                break
+            start = buf.rfind("\n", 0, match.start()) + 1
+            stop = buf.find("\n", match.start(), end)
+            if stop == -1:
+                stop = end
+            line = buf[start:stop].rstrip("\r")
+            pos = stop + 1
+            rules = None
+            if self.rule_set is not None:
+                rules = self.rule_set.match_line(line)
+                if not rules:
+                    continue
+            lines.append((base + start, line, rules))
+        return lines
@@ -0,0 +1,231 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import time
+
+from listener import helpers
+from listener.line_matcher import LineMatcher
+
+# inotify(7) flags, watched on the parent directory of each log so writes,
+# truncation, rotation and re-creation of the log are all reported
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+    IN_CREATE | IN_DELETE
+)
+# Sleep between checks of the logs when inotify is not available
+POLL_INTERVAL = 0.5
+
+logger = logging.getLogger("art.utils.local_log_follower")
+
+
+class Inotify(object):
+    """
+    Minimal inotify binding, only used to wake up when a watched directory
+    changes, events themselves are drained and ignored.
+    """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._epoll = select.epoll()
+        self._epoll.register(self.fd, select.EPOLLIN)
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        if self._add_watch(self.fd, path, mask) < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+
+    def wait(self, timeout):
+        """
+        Block until some event arrives or timeout (seconds) passes
+
+        Returns:
+            bool: True if an event arrived
+        """
+        if not self._epoll.poll(timeout):
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except OSError as ex:
+            if ex.errno != errno.EAGAIN:
+                raise
+        return True
+
+    def close(self):
+        self._epoll.close()
+        os.close(self.fd)
+
+
+class FollowedFile(object):
+    """
+    One followed log, keeps the open file object and the read position
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fh = None
+        self.inode = None
+
+    @property
+    def offset(self):
+        return self.fh.tell() if self.fh else 0
+
+    def open(self, at_end=False):
+        """
+        Open the log if it exists
+
+        Returns:
+            bool: True if the log was opened
+        """
+        try:
+            self.fh = open(self.path, 'rb')
+        except IOError as ex:
+            if ex.errno != errno.ENOENT:
+                raise
+            return False
+        self.inode = os.fstat(self.fh.fileno()).st_ino
+        if at_end:
+            self.fh.seek(0, os.SEEK_END)
+        return True
+
+    def close(self):
+        if self.fh:
+            self.fh.close()
+            self.fh = None
+
+    def read(self, read_size):
+        """
+        Read whatever was appended to the log since the last read, following
+        the log when it is truncated or replaced by a new file (rotation).
+
+        Yields:
+            tuple: (offset, data) chunks of new data
+        """
+        if self.fh is None and not self.open():
+            return
+        while True:
+            offset = self.offset
+            data = self.fh.read(read_size)
+            if data:
+                yield offset, data
+                continue
+
+            if os.fstat(self.fh.fileno()).st_size < self.fh.tell():
+                logger.info("file %s was truncated, following from its start", self.path)
+                self.fh.seek(0)
+                continue
+            try:
+                inode = os.stat(self.path).st_ino
+            except OSError:
+                # rotated away and not re-created yet, keep the old file
+                return
+            if inode == self.inode:
+                return
+            logger.info("file %s was rotated, following the new file", self.path)
+            self.close()
+            if not self.open():
+                return
+
+
+class LocalLogFollower(object):
+    """
+    Follow local logs natively, woken up by inotify instead of polling a
+    'tail' subprocess.
+    """
+
+    def __init__(self, paths, read_size=helpers.READ_SIZE):
+        """
+        Args:
+            paths (list): Full paths of logs to follow
+            read_size (int): Maximum size of a single read
+        """
+        self.files = [FollowedFile(path) for path in paths]
+        self.read_size = read_size
+        self.inotify = None
+
+    def open(self):
+        """
+        Open all logs at their end and start watching their directories
+        """
+        for followed in self.files:
+            followed.open(at_end=True)
+        try:
+            self.inotify = Inotify()
+        except (AttributeError, OSError) as ex:
+            logger.warning("inotify is not available (%s), polling every %s seconds", ex, POLL_INTERVAL)
+            return
+        for directory in set(os.path.dirname(os.path.abspath(f.path)) for f in self.files):
+            self.inotify.add_watch(directory)
+
+    def close(self):
+        for followed in self.files:
+            followed.close()
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+
+    def wait(self, timeout):
+        """
+        Wait until some log may have changed or timeout (seconds) passes
+        """
+        if self.inotify:
+            self.inotify.wait(timeout)
+        else:
+            time.sleep(min(timeout, POLL_INTERVAL))
+
+    def read(self):
+        """
+        Yields:
+            tuple: (path, offset, data) for new data in any of the logs
+        """
+        for followed in self.files:
+            for offset, data in followed.read(self.read_size):
+                yield followed.path, offset, data
+
+    def watch(self, regex, time_out=None):
+        """
+        Wait for the first line matching regex on any of the followed logs
+
+        Args:
+            regex (str): Regular expression to look for
+            time_out (int): Watching time in seconds, None or -1 means forever
+
+        Returns:
+            tuple: (path, offset, line) of the first match, where offset is
+                the position of the line in the file, (None, None, '') if the
+                timeout passed
+        """
+        matchers = dict((f.path, LineMatcher(regex)) for f in self.files)
+        for followed in self.files:
+            matchers[followed.path].reset(followed.offset)
+        deadline = helpers.get_deadline(time_out)
+
+        while True:
+            for path, offset, data in self.read():
+                matcher = matchers[path]
+                if offset != matcher.position:
+                    matcher.reset(offset)
+                matches = matcher.feed_offsets(data)
+                if matches:
+                    offset, line = matches[0]
+                    return path, offset, line
+            if helpers.deadline_passed(deadline):
+                return None, None, ''
+            self.wait(helpers.get_wait_time(deadline))
@@ -1,11 +1,13 @@
 import re
 import shlex
-import subprocess
 import logging
 import os
-import time
+import select
 from rrmng.rrmngmnt.host import Host as HostResource
 from rrmng.rrmngmnt.user import User
+from listener import helpers
+from listener.line_matcher import LineMatcher
+from listener.local_log_follower import LocalLogFollower
 import argparse
 
 DEFAULT_TIMEOUT = 240
@@ -23,12 +25,15 @@ class LogListener:
     """
 
     def __init__(
-        self, ip_for_files, username, password, time_out=DEFAULT_TIMEOUT
+        self, ip_for_files, username, password, time_out=DEFAULT_TIMEOUT,
+        read_size=helpers.READ_SIZE
     ):
         self.ssh = None
         self.channel = None
         self.executor = None
         self.time_out = time_out
+        self.read_size = read_size
+        self.stats = None
         logger.info(
             "Initiating executor for ip: %s with username %s and "
             "password %s" % (ip_for_files, username, password)
@@ -45,12 +50,8 @@ class LogListener:
             host.users.append(user)
             self.executor = host.executor(user)
             self.ssh = self.executor.session()
-            transport = self.ssh._ssh.get_transport()
-            if transport is None:
-                self.ssh.close()
-                self.ssh.open()
-                transport = self.ssh._ssh.get_transport()
-            self.channel = transport.open_session()
+            self.ssh.open()
+            self.channel = self.ssh.open_channel()
 
     def execute_command(
         self, run_locally, command_to_exec, ip_for_execute_command=None,
@@ -106,75 +107,77 @@ class LogListener:
         Returns:
             str: The regex if there's a match, empty string otherwise
         """
-        start_time = time.time()
         try:
             logger.info("run 'tail -f' command on file/s %s", files_to_watch)
             self.channel.exec_command("tail -f " + files_to_watch)
         except RuntimeError, ex:
             logger.info("Can't run command %s, exception is %s", "tail -f", ex)
 
-        recv = ""
+        matcher = LineMatcher(regex)
+        deadline = helpers.get_deadline(self.time_out)
+        self.stats = helpers.WatchStats()
 
-        timeout_condition = True if self.time_out == -1 else self.time_out > time.time() - start_time
-        while timeout_condition:
-            try:
-                # receive the output from the channel
-                recv = "".join([recv, self.channel.recv(1024)])
-                # reg = re.search(regex, recv)
-                reg = re.search(("^.*?" + regex + ".*$"), recv, re.MULTILINE)
-
-                if reg:
+        try:
+            while not helpers.deadline_passed(deadline):
+                if not self.channel.recv_ready():
+                    if self.channel.exit_status_ready():
+                        logger.warning("'tail -f' on file/s %s has ended", files_to_watch)
+                        break
+                    # sleep until data arrives or it is time to check the
+                    # deadline again
+                    select.select([self.channel], [], [], helpers.get_wait_time(deadline))
+                    continue
+
+                # receive the output from the channel, only the new data and
+                # the unfinished last line are scanned
+                data = self.channel.recv(self.read_size)
+                if not data:
+                    break
+                self.stats.update(data)
+                matches = matcher.feed(data)
+
+                if matches:
                     logger.info("regex %s found..", regex)
-                    full_reg_line = reg.group(0)
+                    full_reg_line = matches[0]
                     logger.info("Full match %s found..", full_reg_line)
 
                     return full_reg_line
 
-            except KeyboardInterrupt:
-                self.channel.close()
-                self.ssh.close()
-                raise Exception("close connections")
+        except KeyboardInterrupt:
+            self.ssh.close_channel(self.channel)
+            self.ssh.close()
+            raise Exception("close connections")
+        finally:
+            logger.info("watched %s", self.stats)
         return ''
 
     def watch_for_local_changes(self, files_to_watch, regex):
         """
-        Method that runs "tail -f 'file_name'" command locally
+        Method that follows local files (like "tail -F") natively,
+        woken up by inotify when the files change
 
         Args:
-            files_to_watch (str): Paths to files to watch
+            files_to_watch (str): Paths to files to watch, separated by spaces
             regex (str): Regular expression to look for
 
         Returns:
-            str: The regex if there's a match, empty string otherwise
+            str: The full matching line if there's a match, empty string
+                otherwise
         """
-        start_time = time.time()
+        logger.info("follow file/s %s", files_to_watch)
+        follower = LocalLogFollower(files_to_watch.split(), self.read_size)
+        follower.open()
         try:
-            logger.info("run 'tail -f' command on file/s %s", files_to_watch)
-            f = subprocess.Popen(['tail', '-F', files_to_watch,
-                                  '| stdbuf -o0'],
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
-
-        except RuntimeError as ex:
-            logger.info("Can't run command %s on %s, exception is %s", 'tail',
-                        files_to_watch, ex)
-        recv = ""
-        while True:
-            if self.time_out:
-                if self.time_out < time.time() - start_time:
-                    return ''
-            try:
-                line = f.stdout.readline()
-                recv = "".join([recv, line])
-                reg = re.search(regex, recv)
+            path, offset, line = follower.watch(regex, self.time_out)
+        except KeyboardInterrupt:
+            raise RuntimeError("Caught control-C")
+        finally:
+            follower.close()
 
-                if reg:
-                    logger.info("regex %s found..", regex)
-                    return reg
-
-            except KeyboardInterrupt:
-                raise RuntimeError("Caught control-C")
-        return ''
+        if line:
+            logger.info("regex %s found in file %s at offset %s..", regex, path, offset)
+            logger.info("Full match %s found..", line)
+        return line
 
     def watch_for_changes(self, run_locally, files_to_watch, regex):
         """
@@ -203,7 +206,8 @@ class LogListener:
 def watch_logs(
     files_to_watch, regex, command_to_exec=None, time_out=None,
     ip_for_files=None, username=None, password=None,
-    ip_for_execute_command=None, remote_username=None, remote_password=None
+    ip_for_execute_command=None, remote_username=None, remote_password=None,
+    read_size=helpers.READ_SIZE
 ):
     """
     When importing this module, this function can be used to watch log file
@@ -226,6 +230,7 @@ def watch_logs(
         command executes on
         * remote_password - the password for the remote machine that the
         command executes on
+        * read_size - maximum size of a single read from the watched files
 
     Returns: (found_regex,cmd_rc)
 
@@ -247,7 +252,9 @@ def watch_logs(
         remote_username = username
         remote_password = password
 
-    listener = LogListener(ip_for_files, username, password, time_out)
+    listener = LogListener(
+        ip_for_files, username, password, time_out, read_size
+    )
 
     cmd_rc = None
     found_regex = listener.watch_for_changes(run_locally,
@@ -287,6 +294,8 @@ def main():
         - remote_username: username for the second machine
         - remote_password: password for the second machine
         - time_out: limited time for watching , if '-1' is inserted watching time is infinite
+        - read_size: maximum size in bytes of a single read from the watched
+          files
 
     Options -
         * -m, --machine : if the file is on remote machine then '-m' followed
@@ -307,6 +316,8 @@ def main():
           (e.g. -M 10.0.0.0 root P@SSW0RD)
         * -t, --timeout : limited time for watching
           (e.g. -t 3)
+        * -b, --read_size : maximum size in bytes of a single read from the
+          watched files (e.g. -b 65536)
 
     """
     logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
@@ -349,6 +360,11 @@ def main():
                         dest="time_out",
                         help="limited time for watching")
 
+    parser.add_argument("-b", "--read_size", action="store", type=int,
+                        dest="read_size", default=helpers.READ_SIZE,
+                        help="maximum size in bytes of a single read from "
+                             "the watched files")
+
     options = parser.parse_args()
 
     if len(options.files_to_watch) > 0 and options.regex and \
@@ -378,7 +394,8 @@ def main():
                password=password,
                ip_for_execute_command=ip_for_execute_command,
                remote_username=remote_username,
-               remote_password=remote_password)
+               remote_password=remote_password,
+               read_size=options.read_size)
 
     logger.info("Done !!!")
 
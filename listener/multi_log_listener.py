@@ -0,0 +1,150 @@
+import logging
+import select
+
+from rrmng.rrmngmnt.host import Host as HostResource
+from rrmng.rrmngmnt.user import User
+from listener import helpers
+from listener.line_matcher import LineMatcher
+
+# Start at the end of the log and keep following it across rotations
+TAIL_CMD = "tail -n 0 -F %s"
+
+logger = logging.getLogger("art.utils.multi_log_listener")
+
+
+class MultiLogListener(object):
+    """
+    Watch many logs on many remote hosts at once.
+
+    Every (host, log) pair gets its own 'tail' channel, channels of the same
+    host share one ssh transport, and all of them are served by a single
+    select loop, so the number of watched logs does not add threads.
+    """
+
+    def __init__(self, hosts_logs, time_out=None, read_size=helpers.READ_SIZE):
+        """
+        Args:
+            hosts_logs (list): Tuples of (ip, username, password, logs) where
+                logs is a list of full paths of logs to watch on that host
+            time_out (int): Watching time in seconds, None or -1 means forever
+            read_size (int): Maximum size of a single read from a channel
+        """
+        self.hosts_logs = hosts_logs
+        self.time_out = time_out
+        self.read_size = read_size
+        self.stats = None
+        self.sessions = []
+        # channel -> (ip, log)
+        self.channels = {}
+
+    def open_channels(self):
+        """
+        Open an ssh session per host and start a tail channel per log
+        """
+        for ip, username, password, logs in self.hosts_logs:
+            host = HostResource(ip=ip)
+            user = User(username, password)
+            host.users.append(user)
+            session = host.executor(user).session()
+            session.open()
+            self.sessions.append(session)
+            for log in logs:
+                logger.info("run 'tail -F' command on file %s at host %s", log, ip)
+                channel = session.open_channel()
+                channel.exec_command(TAIL_CMD % log)
+                self.channels[channel] = (ip, log)
+
+    def close(self):
+        """
+        Close all tail channels and ssh sessions
+        """
+        for channel in self.channels:
+            channel.close()
+        self.channels = {}
+        # the sessions give the closed channels back to the pool
+        for session in self.sessions:
+            session.close()
+        self.sessions = []
+
+    def iter_matches(self, regex):
+        """
+        Follow the watched logs and yield every matching line, the channels
+        stay open between matches so nothing is missed while the caller
+        handles a match, and are closed once the iteration ends (including
+        a KeyboardInterrupt, which is passed on to the caller)
+
+        Args:
+            regex (str or FaultRuleSet): Regular expression to look for or a
+                set of fault rules
+
+        Yields:
+            tuple: (ip, log, line, rules) where rules is the list of matched
+                FaultRule, or None when watching for a plain regex
+        """
+        if not self.channels:
+            self.open_channels()
+        matchers = dict((channel, LineMatcher(regex)) for channel in self.channels)
+        deadline = helpers.get_deadline(self.time_out)
+        active = list(self.channels)
+        self.stats = helpers.WatchStats()
+
+        try:
+            while active and not helpers.deadline_passed(deadline):
+                readable, _, _ = select.select(active, [], [], helpers.get_wait_time(deadline))
+                for channel in readable:
+                    ip, log = self.channels[channel]
+                    data = channel.recv(self.read_size)
+                    if not data:
+                        logger.warning("tail of file %s at host %s has ended", log, ip)
+                        active.remove(channel)
+                        continue
+                    self.stats.update(data)
+                    for line, rules in matchers[channel].feed_rules(data):
+                        yield ip, log, line, rules
+        finally:
+            logger.info("watched %s", self.stats)
+            self.close()
+
+    def watch(self, regex):
+        """
+        Wait for the first line matching regex on any of the watched logs
+
+        Args:
+            regex (str or FaultRuleSet): Regular expression to look for or a
+                set of fault rules, lines matching only rules with the 'log'
+                action are logged and watching goes on
+
+        Returns:
+            tuple: (ip, log, line) of the first match, (None, None, '') if
+                the timeout passed or all channels were closed
+        """
+        for ip, log, line, rules in self.iter_matches(regex):
+            if rules and all(rule.action == 'log' for rule in rules):
+                logger.info("rules %s matched in file %s at host %s: %s", rules, log, ip, line)
+                continue
+            logger.info("regex %s found in file %s at host %s..", regex, log, ip)
+            logger.info("Full match %s found..", line)
+            return ip, log, line
+
+        return None, None, ''
+
+
+def watch_hosts_logs(hosts_logs, regex, time_out=None, read_size=helpers.READ_SIZE):
+    """
+    Watch all given logs on all given hosts until the first match of regex
+
+    Args:
+        hosts_logs (list): Tuples of (ip, username, password, logs)
+        regex (str or FaultRuleSet): Regular expression to look for or a set
+            of fault rules
+        time_out (int): Watching time in seconds, None or -1 means forever
+        read_size (int): Maximum size of a single read from a channel
+
+    Returns:
+        tuple: (ip, log, line) of the first match, (None, None, '') otherwise
+    """
+    listener = MultiLogListener(hosts_logs, time_out, read_size)
+    try:
+        return listener.watch(regex)
+    finally:
+        listener.close()
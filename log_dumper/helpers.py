@@ -1,3 +1,5 @@
+import time
+
 import config
 from rrmng.rrmngmnt.host import Host
 from rrmng.rrmngmnt.user import User
@@ -41,3 +43,22 @@ def get_host_executor(ip, password, username=None, use_pkey=False):
     return get_host_resource(
         ip, password, username
     ).executor(user, pkey=use_pkey)
+
+
+def measure_bandwidth(executor, probe_size=config.BANDWIDTH_PROBE_SIZE):
+    """
+    Measure the bandwidth from host to localhost by reading probe_size bytes over ssh
+
+    :param executor: host executor
+    :type executor: RemoteExecutor
+    :param probe_size: bytes to read
+    :type probe_size: int
+    :return: bytes per second, None if the probe failed
+    :rtype: float
+    """
+    start_time = time.time()
+    rc, out, _ = executor.run_cmd(['head', '-c', str(probe_size), '/dev/zero'])
+    elapsed = max(time.time() - start_time, 1e-6)
+    if rc or not out:
+        return None
+    return len(out) / elapsed
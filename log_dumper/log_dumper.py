@@ -1,15 +1,45 @@
 import logging
 import argparse
+import datetime
+import inspect
+import json
+import math
 import os
+import pipes
+import time
+from multiprocessing.pool import ThreadPool
 
+from rrmng.rrmngmnt.filesystem import COMPRESSORS, iter_chunks
 from rrmng.rrmngmnt.host import Host
 from rrmng.rrmngmnt.user import RootUser
 import helpers
 import global_helpers
 import config
+import window_extractor
+from log_store import LogStore, write_manifest
 
 
 LOCAL_HOST = Host("127.0.0.1")
+# Hosts dumped at once
+DUMP_WORKERS = 10
+# Seconds a single host may take to dump, copy and query its logs
+HOST_TIMEOUT = 300
+# Compressor used for the 'auto' compression mode
+DEFAULT_COMPRESSOR = 'gzip'
+COMPRESSION_MODES = sorted(COMPRESSORS) + ['auto']
+# Timestamps format of the logs and of the incident time
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Finds the python of the remote host, the window extractor is sent to it over stdin
+PYTHON_LOOKUP_CMD = ['sh', '-c', 'command -v python3 || command -v python']
+# Times passed to the window extractor, without spaces so they stay single shell words
+WINDOW_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+WINDOW_SUFFIX = ".window"
+# Byte offsets of a window in its log, saved next to the window
+WINDOW_INFO_SUFFIX = WINDOW_SUFFIX + ".json"
+# Seconds between checks of the hosts dumps
+WAIT_INTERVAL = 1.0
+# Result per host, written to the logs directory
+DUMP_RESULTS_FILE = "dump_results.json"
 
 # set up logging to file
 logging.basicConfig(
@@ -21,6 +51,44 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def shell_word(value):
+    """
+    Quote a command argument for the remote shell. RemoteExecutor joins the arguments with
+    subprocess.list2cmdline and the login shell of the host parses the result, list2cmdline leaves words without
+    whitespace and double quotes as they are, so only such words reach the shell unchanged.
+
+    :param value: the argument
+    :type value: str
+    :return: the argument quoted for a POSIX shell
+    :rtype: str
+    """
+    # single quotes are escaped as '\'' instead of '"'"', list2cmdline would escape the double quotes
+    quoted = pipes.quote(value).replace("'\"'\"'", "'\\''")
+    if [c for c in quoted if c in ' \t\n"']:
+        raise ValueError("%r can't be passed to the remote shell, it has whitespace or double quotes" % value)
+    return quoted
+
+
+def window_extractor_cmd(python, log, from_time, to_time):
+    """
+    :param python: path of the python of the remote host
+    :type python: str
+    :param log: full path of the log on the remote host
+    :type log: str
+    :param from_time: window start, DATETIME_FORMAT
+    :type from_time: str
+    :param to_time: window end, DATETIME_FORMAT
+    :type to_time: str
+    :return: command running the window extractor sent over stdin
+    :rtype: list
+    """
+    times = [
+        datetime.datetime.strptime(value, DATETIME_FORMAT).strftime(WINDOW_TIME_FORMAT)
+        for value in (from_time, to_time)
+    ]
+    return [shell_word(arg) for arg in [python, '-', log] + times]
+
+
 class LogDumper:
     """
     LogDumper class, dumps selected logs on remote hosts and copy them to a
@@ -29,7 +97,8 @@ class LogDumper:
 
     def __init__(
         self,  hosts_ips, passwords, usernames=None, logs=None,
-        tail_lines=1000, localhost_pass=None
+        tail_lines=1000, localhost_pass=None, compression=None, keep_compressed=False, window_minutes=None,
+        incident_time=None, log_store=None, materialize=True
     ):
         self.hosts_ips = hosts_ips
         self.passwords = passwords
@@ -37,35 +106,144 @@ class LogDumper:
         self.logs = logs
         self.tail_lines = tail_lines
         self.localhost_pass = localhost_pass
+        # None - plain copy, one of COMPRESSORS - always compress, 'auto' - compress on slow hosts
+        self.compression = compression
+        self.keep_compressed = keep_compressed
+        # When window_minutes is set only the lines of incident_time +- window_minutes are collected instead of the
+        # tail and the full log
+        self.window_minutes = window_minutes
+        self.incident_time = incident_time or datetime.datetime.now()
+        # When a LogStore is given the full logs are fetched to it, only the bytes appended since the last dump are
+        # copied, and the logs directory gets a manifest of the store chunks, plus the full logs if materialize is set
+        self.log_store = log_store
+        self.materialize = materialize
 
     def dump_host_logs(self, executor, logs=None, tail_lines=1000):
         """
         Dump N number of last lines of selected host logs
+        All logs are dumped concurrently, each on its own channel of the same ssh connection
         """
         cut_logs_path = []
+        cmds = []
         for log in logs:
             cut_log = log + str(tail_lines)
-            cmd = 'tail -n %s %s > %s' % (tail_lines, log, cut_log)
-            logger.info("running command %s", cmd)
-            rc, out, err = executor.run_cmd(cmd.split())
+            cmds.append('tail -n %s %s > %s' % (tail_lines, log, cut_log))
+            cut_logs_path.append(os.path.abspath(cut_log))
+        logger.info("running commands %s", cmds)
+        results = executor.run_cmds([cmd.split() for cmd in cmds])
+        for cmd, cut_log, (rc, out, err) in zip(cmds, cut_logs_path, results):
             assert not rc, (
                 "command %s failed\noutput=%s\n,err=%s\n" % (cmd, out, err)
             )
             logger.info("Dumped log is located at path %s", cut_log)
-            cut_logs_path.append(os.path.abspath(cut_log))
         return cut_logs_path
 
-    def collect_logs(self, remote_host, remote_logs_path, full_path):
+    def extract_log_window(self, executor, log, full_path):
+        """
+        Collect the lines of log stamped within window_minutes around incident_time. The window is found and read
+        on the remote host by window_extractor, nothing is written on the remote filesystem and only the window is
+        sent to the localhost.
+
+        Next to the window a json file with its byte offsets in the log is saved.
+
+        :param executor: host executor
+        :type executor: RemoteExecutor
+        :param log: full path of the log on the remote host
+        :type log: str
+        :param full_path: localhost directory to collect the window to
+        :type full_path: str
+        :return: localhost path of the window
+        :rtype: str
+        """
+        window = datetime.timedelta(minutes=self.window_minutes)
+        from_time = (self.incident_time - window).strftime(DATETIME_FORMAT)
+        # the window is closed, lines stamped with its last second are included
+        to_time = (self.incident_time + window + datetime.timedelta(seconds=1)).strftime(DATETIME_FORMAT)
+        window_path = os.path.join(full_path, os.path.basename(log) + WINDOW_SUFFIX)
+        script = inspect.getsource(window_extractor)
+
+        rc, out, err = executor.run_cmd(PYTHON_LOOKUP_CMD)
+        assert not rc and out.strip(), "python was not found on host %s\nerr=%s\n" % (executor.address, err)
+        cmd = window_extractor_cmd(out.strip().splitlines()[0], log, from_time, to_time)
+        logger.info("Extracting lines from %s to %s of log %s on host %s", from_time, to_time, log, executor.address)
+        with executor.session() as ss:
+            command = ss.command(cmd)
+            with command.execute() as (in_, out, err):
+                in_.write(script)
+                in_.close()
+                header = out.readline().split()
+                with open(window_path, 'wb') as wh:
+                    for data in iter_chunks(out):
+                        wh.write(data)
+                command.err = err.read()
+        assert not command.rc and len(header) == 3, (
+            "command %s failed\n,err=%s\n" % (cmd, command.err)
+        )
+
+        start_offset, end_offset, size = [int(value) for value in header]
+        with open(os.path.join(full_path, os.path.basename(log) + WINDOW_INFO_SUFFIX), 'w') as f:
+            json.dump({
+                'host': executor.address,
+                'log': log,
+                'from_time': from_time,
+                'to_time': to_time,
+                'start_offset': start_offset,
+                'end_offset': end_offset,
+                'log_size': size,
+            }, f, indent=2)
+        logger.info(
+            "Collected %s bytes of %s bytes of log %s to %s", end_offset - start_offset, size, log, window_path
+        )
+        return window_path
+
+    def host_compressor(self, executor):
+        """
+        Choose how to compress the logs of a host, in the 'auto' mode logs are compressed when the measured
+        bandwidth of the host is below config.COMPRESS_BELOW_BANDWIDTH
+
+        :param executor: host executor
+        :type executor: RemoteExecutor
+        :return: compressor name, None for a plain copy
+        :rtype: str
+        """
+        if self.compression != 'auto':
+            return self.compression
+        bandwidth = helpers.measure_bandwidth(executor)
+        if bandwidth is None:
+            logger.warning("Failed to measure bandwidth of host %s, compressing logs", executor.address)
+            return DEFAULT_COMPRESSOR
+        compressor = DEFAULT_COMPRESSOR if bandwidth < config.COMPRESS_BELOW_BANDWIDTH else None
+        logger.info(
+            "Host %s bandwidth is %.1f MB/sec, logs compression: %s", executor.address, bandwidth / 1024 / 1024,
+            compressor
+        )
+        return compressor
+
+    def collect_logs(self, remote_host, remote_logs_path, full_path, compressor=None):
         """
         Collect logs from remote hosts back to one directory in localhost
+
+        When compressor is given the logs are compressed on the remote host and decompressed on the fly on
+        localhost, or kept compressed if keep_compressed is set
         """
         logger.info(
             "Logs will be collected to the following directory %s", full_path
         )
-        LOCAL_HOST.users.append(RootUser(self.localhost_pass))
-        # Copy log to the localhost directory
-
+        # LOCAL_HOST operations over ssh (chmod/chown of the collected logs) run as root, add_user replaces the user
+        # of an earlier call instead of adding it again
+        if self.localhost_pass is not None:
+            LOCAL_HOST.add_user(RootUser(self.localhost_pass))
+        # Copy log to the localhost directory, LOCAL_HOST is detected as local so the
+        # logs are written straight to the local disk without an ssh session to localhost
         for log in remote_logs_path:
+            if compressor:
+                assert remote_host.fs.get_compressed(
+                    path_src=log,
+                    path_dst=full_path,
+                    compressor=compressor,
+                    keep_compressed=self.keep_compressed
+                )
+                continue
             assert remote_host.fs.transfer(
                 path_src=log,
                 target_host=LOCAL_HOST,
@@ -90,11 +268,11 @@ class LogDumper:
             search_components.append(log.split("/")[3])
 
         # Check per each host all components versions and add it to the hosts_components_versions_dict
-        for component in search_components:
-            cmd = "rpm -qa | grep ^%s-[0-9]" % component
-
-            logger.info("running command %s", cmd)
-            rc, out, err = executor.run_cmd(cmd.split())
+        # All components are queried concurrently, each on its own channel of the same ssh connection
+        cmds = ["rpm -qa | grep ^%s-[0-9]" % component for component in search_components]
+        logger.info("running commands %s", cmds)
+        results = executor.run_cmds([cmd.split() for cmd in cmds])
+        for component, cmd, (rc, out, err) in zip(search_components, cmds, results):
             if rc:
                 logger.error("command %s failed\noutput=%s\n,err=%s\n" % (cmd, out, err))
                 logger.error("Component '%s' was not found on remote host", component)
@@ -108,65 +286,267 @@ class LogDumper:
         return zip(found_components, versions)
 
 
-def dump_hosts_logs(hosts_ips, passwords, usernames, logs, tail_lines, localhost_pass, full_path):
+class HostDumpResult(object):
+    """
+    Outcome of dumping the logs of a single host
     """
 
-    :param hosts_ips:
-    :param passwords:
-    :param usernames:
-    :param logs:
-    :param tail_lines:
-    :param localhost_pass:
-    :param full_path:
+    def __init__(self, host_ip):
+        self.host_ip = host_ip
+        self.success = False
+        self.timed_out = False
+        self.error = None
+        self.logs = []
+        self.components_versions = []
+        self.compression = None
+        # Log store entries of the full logs
+        self.manifest = []
+        self.start_time = None
+        self.end_time = None
+
+    @property
+    def elapsed(self):
+        if self.start_time is None:
+            return 0
+        return (self.end_time or time.time()) - self.start_time
+
+    def to_dict(self):
+        return {
+            'host_ip': self.host_ip,
+            'success': self.success,
+            'timed_out': self.timed_out,
+            'error': self.error,
+            'logs': self.logs,
+            'components_versions': self.components_versions,
+            'compression': self.compression,
+            'fetched': sum(entry['fetched'] for entry in self.manifest),
+            'elapsed': round(self.elapsed, 3),
+        }
+
+    def __repr__(self):
+        if self.success:
+            return "HostDumpResult(%s, ok, %.1fs)" % (self.host_ip, self.elapsed)
+        return "HostDumpResult(%s, failed: %s)" % (self.host_ip, self.error)
 
-    :return: Tuple of collected versions of components per host as key
+
+def dump_host(logd_obj, host_ip, password, username, logs, full_path, result, on_done=None):
+    """
+    Dump the logs of a single host, copy them to localhost and collect its components versions
+
+    :param logd_obj: the dumper holding the dump settings
+    :type logd_obj: LogDumper
+    :param host_ip: host ip
+    :type host_ip: str
+    :param password: user's password
+    :type password: str
+    :param username: host username
+    :type username: str
+    :param logs: log to dump
+    :type logs: str
+    :param full_path: localhost directory to collect the logs to
+    :type full_path: str
+    :param result: result to fill in
+    :type result: HostDumpResult
+    :param on_done: called in the worker with the result when the dump succeeded, e.g. to queue the logs of the host
+        for parsing while other hosts are still dumped, it holds the worker so it should return right away
+    :type on_done: callable
+    :return: the filled in result
+    :rtype: HostDumpResult
     """
+    if result.timed_out:
+        # given up while waiting for a worker
+        return result
+    result.start_time = time.time()
+    try:
+        executor = helpers.get_host_executor(host_ip, password, username)
+        if logd_obj.window_minutes:
+            result.logs = [logd_obj.extract_log_window(executor, logs, full_path)]
+        else:
+            logger.info("Dumping logs %s on host ip %s", logs, host_ip)
+            cut_logs_path = logd_obj.dump_host_logs(executor, [logs], logd_obj.tail_lines)
+            # With a log store only the short logs are copied, the full logs are fetched to the store below
+            if not logd_obj.log_store:
+                cut_logs_path.extend([logs])
+
+            # Copy dumped logs back to localhost
+            logger.info("Collect logs %s back to localhost", cut_logs_path)
+            remote_host = Host(host_ip)
+            remote_host.users.append(RootUser(password))
+            result.compression = logd_obj.host_compressor(executor)
+            logd_obj.collect_logs(
+                remote_host=remote_host, remote_logs_path=cut_logs_path, full_path=full_path,
+                compressor=result.compression
+            )
+            result.logs = cut_logs_path
 
-    components_version_full_list = []
-    remote_hosts_logs_dict = {}
-    host_executors = []
+            if logd_obj.log_store:
+                entry = logd_obj.log_store.fetch(host_ip, executor, logs)
+                result.manifest.append(entry)
+                if logd_obj.materialize:
+                    result.logs.append(logd_obj.log_store.materialize(entry, full_path))
 
+        # Collect components versions
+        logger.info("Collect host %s components versions", host_ip)
+        result.components_versions = logd_obj.hosts_components_version(executor=executor)
+        # A host finishing after its timeout was already reported as failed
+        result.success = not result.timed_out
+    except Exception as e:
+        logger.error("Dumping logs of host %s failed with error %s", host_ip, e)
+        result.error = str(e) or e.__class__.__name__
+    finally:
+        result.end_time = time.time()
+    if on_done is not None and result.success and not result.timed_out:
+        try:
+            on_done(result)
+        except Exception as e:
+            logger.error("Handling the dumped logs of host %s failed with error %s", host_ip, e)
+    return result
+
+
+def dump_hosts(
+    hosts_ips, passwords, usernames, logs, tail_lines, localhost_pass, full_path,
+    workers=DUMP_WORKERS, host_timeout=HOST_TIMEOUT, compression=None, keep_compressed=False, window_minutes=None,
+    incident_time=None, log_store=None, materialize=True, on_host_done=None
+):
+    """
+    Dump the logs of all hosts at once on a bounded pool of workers, a slow or failing host does not hold
+    or fail the others
+
+    :param hosts_ips: hosts ips
+    :type hosts_ips: list
+    :param passwords: users passwords per host
+    :type passwords: list
+    :param usernames: usernames per host
+    :type usernames: list
+    :param logs: logs to dump
+    :type logs: list
+    :param tail_lines: number of last lines of the short logs
+    :type tail_lines: int
+    :param localhost_pass: localhost root password
+    :type localhost_pass: str
+    :param full_path: localhost directory to collect the logs to
+    :type full_path: str
+    :param workers: number of hosts dumped at once
+    :type workers: int
+    :param host_timeout: seconds a single host may take since its dump started, None for no limit. A host that hangs
+        keeps its worker, so all hosts are also given up after host_timeout per round of workers
+        (host_timeout * ceil(hosts / workers)), hosts still waiting for a worker then are not dumped
+    :type host_timeout: int
+    :param compression: None for a plain copy, gzip or zstd to compress the logs on the hosts, auto to compress
+        only on hosts with low bandwidth
+    :type compression: str
+    :param keep_compressed: keep the compressed logs instead of decompressing them on the fly
+    :type keep_compressed: bool
+    :param window_minutes: when given, collect only the lines of incident_time +- window_minutes of each log
+    :type window_minutes: int
+    :param incident_time: time of the incident, now if None
+    :type incident_time: datetime.datetime
+    :param log_store: fetch the full logs to this store and write a manifest of them to full_path
+    :type log_store: LogStore
+    :param materialize: with a log store, also write the full logs to full_path
+    :type materialize: bool
+    :param on_host_done: called with the result of each host dumped successfully as soon as it is done, see dump_host
+    :type on_host_done: callable
+    :return: result per host, in hosts order
+    :rtype: list
+    """
     logd_obj = LogDumper(
         hosts_ips=hosts_ips, passwords=passwords, usernames=usernames,
-        logs=logs[0], tail_lines=tail_lines, localhost_pass=localhost_pass
+        logs=logs[0], tail_lines=tail_lines, localhost_pass=localhost_pass, compression=compression,
+        keep_compressed=keep_compressed, window_minutes=window_minutes, incident_time=incident_time,
+        log_store=log_store, materialize=materialize
     )
-    # Get host executors per host
-    for host_ip, password, username, logs in zip(
-        logd_obj.hosts_ips, logd_obj.passwords, logd_obj.usernames, logd_obj.logs
-    ):
-        remote_hosts_logs_dict[host_ip] = {
-            'password': password,
-            'username': username,
-            'logs': logs,
-            'tail_lines': logd_obj.tail_lines,
-        }
-        logger.info("Host logs dict looks like %s", remote_hosts_logs_dict)
-        host_executors.append(
-            helpers.get_host_executor(host_ip, password, username)
-        )
-        logger.info("Dumping logs %s on host ip %s", remote_hosts_logs_dict[host_ip]['logs'], host_ip)
-        cut_logs_path = logd_obj.dump_host_logs(
-            host_executors[-1], [remote_hosts_logs_dict[host_ip]['logs']], remote_hosts_logs_dict[host_ip]['tail_lines']
+    hosts = zip(logd_obj.hosts_ips, logd_obj.passwords, logd_obj.usernames, logd_obj.logs)
+    results = [HostDumpResult(host_ip) for host_ip, _, _, _ in hosts]
+    if not hosts:
+        return results
+
+    workers = min(workers, len(hosts))
+    pool = ThreadPool(workers)
+    pending = []
+    deadline = None
+    if host_timeout is not None:
+        dump_timeout = host_timeout * int(math.ceil(len(hosts) / float(workers)))
+        deadline = time.time() + dump_timeout
+    try:
+        for (host_ip, password, username, host_logs), result in zip(hosts, results):
+            pending.append((result, pool.apply_async(
+                dump_host, (logd_obj, host_ip, password, username, host_logs, full_path, result, on_host_done)
+            )))
+        while pending:
+            for result, async_result in list(pending):
+                if async_result.ready():
+                    pending.remove((result, async_result))
+                elif host_timeout is not None and result.elapsed > host_timeout:
+                    logger.error("Dumping logs of host %s timed out after %s seconds", result.host_ip, host_timeout)
+                    result.timed_out = True
+                    result.error = "timed out after %s seconds" % host_timeout
+                    pending.remove((result, async_result))
+                elif result.start_time is None and deadline is not None and time.time() > deadline:
+                    # the workers are held by hung hosts, this host never started
+                    logger.error("Dumping logs of host %s did not start, all workers are busy", result.host_ip)
+                    result.timed_out = True
+                    result.error = "not started within %s seconds, all workers are busy" % dump_timeout
+                    pending.remove((result, async_result))
+            if pending:
+                pending[0][1].wait(WAIT_INTERVAL)
+    finally:
+        # Timed out hosts may still hang in their worker, don't wait for them
+        pool.close()
+    if log_store:
+        log_store.add_manifest(
+            write_manifest([entry for result in results if result.success for entry in result.manifest], full_path)
         )
-        cut_logs_path.extend([remote_hosts_logs_dict[host_ip]['logs']])
-
-        # Copy dumped logs back to localhost
-        logger.info("Collect logs %s back to localhost", cut_logs_path)
-        remote_host = Host(host_ip)
-        remote_host.users.append(RootUser(password))
-
-        # Collect logs back to localhost
-        logd_obj.collect_logs(remote_host=remote_host, remote_logs_path=cut_logs_path, full_path=full_path)
+        log_store.gc()
+        log_store.save()
+    return results
 
-        # Collect components versions
-        logger.info("Collect host %s components versions", host_ip)
-        components_version_tuple = logd_obj.hosts_components_version(executor=host_executors[-1])
-        components_version_full_list.append(components_version_tuple)
 
-    return components_version_full_list
+def dump_hosts_logs(
+    hosts_ips, passwords, usernames, logs, tail_lines, localhost_pass, full_path,
+    workers=DUMP_WORKERS, host_timeout=HOST_TIMEOUT, compression=None, keep_compressed=False, window_minutes=None,
+    incident_time=None, log_store=None, materialize=True, on_host_done=None
+):
+    """
+    Dump the logs of all hosts in parallel, see dump_hosts, the result per host is saved to
+    DUMP_RESULTS_FILE in full_path
 
+    :param hosts_ips:
+    :param passwords:
+    :param usernames:
+    :param logs:
+    :param tail_lines:
+    :param localhost_pass:
+    :param full_path:
+    :param workers: number of hosts dumped at once
+    :param host_timeout: seconds a single host may take, None for no limit
+    :param compression: logs compression mode, see dump_hosts
+    :param keep_compressed: keep the compressed logs instead of decompressing them on the fly
+    :param window_minutes: collect only the lines of incident_time +- window_minutes of each log
+    :param incident_time: time of the incident, now if None
+    :param log_store: fetch the full logs to this LogStore and write a manifest of them
+    :param materialize: with a log store, also write the full logs to full_path
+    :param on_host_done: called with the result of each host dumped successfully as soon as it is done
+
+    :return: Tuple of collected versions of components per host as key, of the hosts dumped successfully
+    """
+    start_time = time.time()
+    results = dump_hosts(
+        hosts_ips, passwords, usernames, logs, tail_lines, localhost_pass, full_path, workers, host_timeout,
+        compression, keep_compressed, window_minutes, incident_time, log_store, materialize, on_host_done
+    )
+    failed = [result for result in results if not result.success]
+    logger.info(
+        "Dumped logs of %s/%s hosts in %.1f seconds", len(results) - len(failed), len(results),
+        time.time() - start_time
+    )
+    if failed:
+        logger.error("Failed to dump logs of hosts %s", failed)
 
+    with open(os.path.join(full_path, DUMP_RESULTS_FILE), 'w') as f:
+        json.dump([result.to_dict() for result in results], f, indent=2)
 
+    return [result.components_versions for result in results if result.success]
 
 
 def main():
@@ -192,6 +572,28 @@ def main():
             * -p,--localhostpass:  option that followed by the string value of
               the password of the localhost.
               (e.g. -p "password")
+            * -w,--workers:  number of hosts to dump logs on at once
+              (e.g. -w 10)
+            * -t,--hosttimeout:  seconds a single host may take to dump its
+              logs, a host taking longer is reported as failed
+              (e.g. -t 300)
+            * -c,--compression:  compress logs on the hosts while collecting
+              them, gzip, zstd or auto to compress only on hosts with low
+              bandwidth
+              (e.g. -c auto)
+            * -k,--keepcompressed:  keep the collected logs compressed
+            * -W,--windowminutes:  collect only the lines logged within N
+              minutes around the incident time, instead of the last lines
+              and the full logs
+              (e.g. -W 10)
+            * -T,--incidenttime:  incident time for -W, default is now
+              (e.g. -T "2018-07-25 03:11:35")
+            * -S,--logstore:  local log store directory, the full logs are
+              fetched to it and only the bytes appended since the last dump
+              are copied
+              (e.g. -S ~/tmp/bug_hunter_logs/store)
+            * -N,--nomaterialize:  with -S, write only a manifest of the full
+              logs instead of the logs themselves
 
         Example for manual usage:
         python log_dumper/log_dumper.py -m 10.0.0.1 root password /var/log/vdsm/vdsm.log /var/log/vdsm/vdsm2.log -m 10.0.0.2 root password /var/log/vdsm/vdsm3.log -l 1000 -p "1234"
@@ -229,8 +631,48 @@ def main():
                         default=global_helpers.create_localhost_logs_dir(config.LOCALHOST_LOGS_PATH),
                         )
 
-
-
+    parser.add_argument("-w", "--workers", action="store", type=int,
+                        dest="workers",
+                        help="number of hosts to dump logs on at once",
+                        default=DUMP_WORKERS)
+
+    parser.add_argument("-t", "--hosttimeout", action="store", type=int,
+                        dest="host_timeout",
+                        help="seconds a single host may take to dump its logs",
+                        default=HOST_TIMEOUT)
+
+    parser.add_argument("-c", "--compression", action="store", type=str,
+                        dest="compression", choices=COMPRESSION_MODES,
+                        help="compress logs on the hosts while collecting them, "
+                             "'auto' compresses only on hosts with low bandwidth",
+                        default=None)
+
+    parser.add_argument("-k", "--keepcompressed", action="store_true",
+                        dest="keep_compressed",
+                        help="keep the collected logs compressed",
+                        default=False)
+
+    parser.add_argument("-W", "--windowminutes", action="store", type=int,
+                        dest="window_minutes",
+                        help="collect only the lines logged within N minutes around the incident time "
+                             "instead of the last lines and the full logs",
+                        default=None)
+
+    parser.add_argument("-T", "--incidenttime", action="store", type=str,
+                        dest="incident_time",
+                        help="incident time for -W in format '%s', default is now" % DATETIME_FORMAT.replace('%', '%%'),
+                        default=None)
+
+    parser.add_argument("-S", "--logstore", action="store", type=str,
+                        dest="log_store",
+                        help="local log store directory, full logs are fetched to it and only the bytes appended "
+                             "since the last dump are copied",
+                        default=None)
+
+    parser.add_argument("-N", "--nomaterialize", action="store_false",
+                        dest="materialize",
+                        help="with -S, write only a manifest of the full logs to the logs directory",
+                        default=True)
 
     options = parser.parse_args()
     if options.machines:
@@ -242,6 +684,9 @@ def main():
         tail_lines = options.line_numbers
         localhost_pass = options.localhost_pass
         full_path = options.localhost_logs_full_path
+        incident_time = None
+        if options.incident_time:
+            incident_time = datetime.datetime.strptime(options.incident_time, DATETIME_FORMAT)
     else:
         raise RuntimeError("Missing arguments! usage : %s", parser.parse_args(['-h']))
 
@@ -249,7 +694,10 @@ def main():
     config.LOCAL_ROOT_PASSWORD = localhost_pass
     hosts_components_version = dump_hosts_logs(
         hosts_ips=hosts_ips, passwords=passwords, usernames=usernames, logs=logs,
-        tail_lines=tail_lines, localhost_pass=localhost_pass, full_path=full_path
+        tail_lines=tail_lines, localhost_pass=localhost_pass, full_path=full_path,
+        workers=options.workers, host_timeout=options.host_timeout, compression=options.compression,
+        keep_compressed=options.keep_compressed, window_minutes=options.window_minutes, incident_time=incident_time,
+        log_store=LogStore(options.log_store) if options.log_store else None, materialize=options.materialize
     )
     logger.info(
         "Done !!!\n%s last lines and full version logs %s copied from hosts_ips %s to localhost",
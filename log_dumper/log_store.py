@@ -0,0 +1,290 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from rrmng.rrmngmnt.filesystem import iter_chunks
+
+# Size of a single stored chunk
+CHUNK_SIZE = 4 * 1024 * 1024
+# Bytes before the last fetched offset that are fetched again and compared with the store, to tell the log was
+# rewritten in place and has to be fetched from its start
+TAIL_CHECK_SIZE = 4096
+STATE_FILE = "state.json"
+CHUNKS_DIR = "chunks"
+MANIFEST_FILE = "manifest.json"
+# Manifests written from the store, their chunks are kept until the manifest is removed
+MANIFESTS_FILE = "manifests.json"
+
+logger = logging.getLogger(__name__)
+
+
+class LogStore(object):
+    """
+    Content addressed local store of remote logs.
+
+    Logs are kept as chunks named by their sha256, and the store remembers per host and log its inode, its size and
+    the chunks it is made of. When a log is fetched again only the bytes appended since the last fetch are copied,
+    unless the log was rotated, truncated or rewritten, then it is fetched from its start (unchanged chunks are still
+    stored once). An incident directory holds a manifest referring to the chunks instead of full copies of the logs.
+    Chunks referred to by neither the state nor a manifest, e.g. partial chunks that were refilled, are removed by gc.
+    """
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        """
+        :param path: store directory, created if missing
+        :type path: str
+        :param chunk_size: size of a single stored chunk
+        :type chunk_size: int
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.chunks_dir = os.path.join(path, CHUNKS_DIR)
+        self.state_file = os.path.join(path, STATE_FILE)
+        self.manifests_file = os.path.join(path, MANIFESTS_FILE)
+        self.lock = threading.Lock()
+        # fetches in progress, their new chunks are not in the state yet
+        self.fetching = 0
+        if not os.path.isdir(self.chunks_dir):
+            os.makedirs(self.chunks_dir)
+        self.state = {}
+        if os.path.exists(self.state_file):
+            with open(self.state_file) as f:
+                self.state = json.load(f)
+        self.manifests = []
+        if os.path.exists(self.manifests_file):
+            with open(self.manifests_file) as f:
+                self.manifests = json.load(f)
+
+    @staticmethod
+    def _key(host, path):
+        return "%s:%s" % (host, path)
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def _write_atomic(self, path, data):
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # created meanwhile by another host fetch
+                if not os.path.isdir(directory):
+                    raise
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.rename(tmp_path, path)
+
+    def put_chunk(self, data):
+        """
+        :param data: chunk data
+        :type data: str
+        :return: [sha256 of the data, size], the chunk reference
+        :rtype: list
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+        if not os.path.exists(path):
+            self._write_atomic(path, data)
+        return [digest, len(data)]
+
+    def read_chunks(self, chunks):
+        """
+        :param chunks: chunk references
+        :type chunks: list
+        :return: generator of the chunks data
+        """
+        for digest, _ in chunks:
+            with open(self.chunk_path(digest), 'rb') as f:
+                yield f.read()
+
+    def _tail(self, chunks, size):
+        """
+        Last size bytes of the stored chunks, size must not exceed the last chunk
+        """
+        digest, chunk_size = chunks[-1]
+        with open(self.chunk_path(digest), 'rb') as f:
+            f.seek(chunk_size - size)
+            return f.read(size)
+
+    def _fetch_chunks(self, fh, size, buf=''):
+        """
+        Read size bytes from the current position of fh and store them as chunks, prepending buf
+        """
+        chunks = []
+        for data in iter_chunks(fh, self.chunk_size, size):
+            buf += data
+            while len(buf) >= self.chunk_size:
+                chunks.append(self.put_chunk(buf[:self.chunk_size]))
+                buf = buf[self.chunk_size:]
+        if buf:
+            chunks.append(self.put_chunk(buf))
+        return chunks
+
+    def fetch(self, host, executor, path):
+        """
+        Bring the store copy of a remote log up to date
+
+        :param host: host ip, the store key of the log together with path
+        :type host: str
+        :param executor: host executor
+        :type executor: RemoteExecutor
+        :param path: full path of the log on the host
+        :type path: str
+        :return: manifest entry of the log, with host, path, inode, size, chunks and fetched (copied bytes)
+        :rtype: dict
+        """
+        rc, out, err = executor.run_cmd(['stat', '-L', '-c', '%i %s', path])
+        assert not rc, "stat of %s failed on host %s\nerr=%s\n" % (path, host, err)
+        inode, size = [int(value) for value in out.split()]
+        key = self._key(host, path)
+        with self.lock:
+            known = self.state.get(key)
+            self.fetching += 1
+        try:
+            return self._fetch(host, executor, path, key, known, inode, size)
+        finally:
+            with self.lock:
+                self.fetching -= 1
+
+    def _fetch(self, host, executor, path, key, known, inode, size):
+        """
+        Copy the bytes of the log not in the store yet, known is its state entry of the last fetch
+        """
+        chunks = []
+        offset = 0
+        if known and known['inode'] == inode and known['size'] <= size and known['chunks']:
+            chunks = list(known['chunks'])
+            offset = known['size']
+            check_size = min(TAIL_CHECK_SIZE, chunks[-1][1])
+        with executor.session() as ss:
+            with ss.open_file(path, 'rb') as fh:
+                if offset:
+                    fh.seek(offset - check_size)
+                    if fh.read(check_size) != self._tail(chunks, check_size):
+                        logger.info("Log %s on host %s was rewritten, fetching it from its start", path, host)
+                        chunks, offset = [], 0
+                        fh.seek(0)
+                if offset == size:
+                    new_chunks = []
+                elif chunks and chunks[-1][1] < self.chunk_size:
+                    # refill the last partial chunk so chunks stay full sized and shared between incidents
+                    buf = ''.join(self.read_chunks(chunks[-1:]))
+                    new_chunks = self._fetch_chunks(fh, size - offset, buf)
+                    chunks.pop()
+                else:
+                    new_chunks = self._fetch_chunks(fh, size - offset)
+        chunks.extend(new_chunks)
+
+        entry = {'host': host, 'path': path, 'inode': inode, 'size': size, 'chunks': chunks}
+        with self.lock:
+            self.state[key] = entry
+        logger.info("Fetched %s new bytes of log %s on host %s, %s bytes in store", size - offset, path, host, size)
+        return dict(entry, fetched=size - offset)
+
+    def save(self):
+        """
+        Save the state of the store, so next runs fetch only new bytes
+        """
+        with self.lock:
+            self._write_atomic(self.state_file, json.dumps(self.state, indent=2))
+            self._write_atomic(self.manifests_file, json.dumps(self.manifests, indent=2))
+
+    def add_manifest(self, path):
+        """
+        Keep the chunks of a manifest as long as the manifest exists
+
+        :param path: path of the manifest
+        :type path: str
+        """
+        path = os.path.abspath(path)
+        with self.lock:
+            if path not in self.manifests:
+                self.manifests.append(path)
+
+    def gc(self):
+        """
+        Remove the chunks referred to by neither the state nor an existing manifest, manifests that were removed are
+        forgotten. Nothing is removed while logs are fetched, their new chunks are not referred to yet.
+
+        :return: number of removed chunks
+        :rtype: int
+        """
+        with self.lock:
+            if self.fetching:
+                logger.info("Skipping garbage collection of log store %s, %s logs are fetched", self.path,
+                            self.fetching)
+                return 0
+            referred = set(digest for entry in self.state.values() for digest, _ in entry['chunks'])
+            manifests = []
+            for path in self.manifests:
+                try:
+                    with open(path) as f:
+                        entries = json.load(f)
+                except IOError:
+                    continue
+                manifests.append(path)
+                referred.update(digest for entry in entries for digest, _ in entry['chunks'])
+            self.manifests = manifests
+            removed = 0
+            for directory, _, files in os.walk(self.chunks_dir):
+                for name in files:
+                    if name not in referred:
+                        os.remove(os.path.join(directory, name))
+                        removed += 1
+        logger.info("Removed %s chunks no longer referred to from log store %s", removed, self.path)
+        return removed
+
+    def materialize(self, entry, dest_dir):
+        """
+        Rebuild a log of a manifest from its chunks
+
+        :param entry: manifest entry
+        :type entry: dict
+        :param dest_dir: directory to write the log to
+        :type dest_dir: str
+        :return: path of the log
+        :rtype: str
+        """
+        path = os.path.join(dest_dir, os.path.basename(entry['path']))
+        with open(path, 'wb') as f:
+            for data in self.read_chunks(entry['chunks']):
+                f.write(data)
+        return path
+
+
+def write_manifest(entries, dir_path):
+    """
+    :param entries: manifest entries as returned by LogStore.fetch
+    :type entries: list
+    :param dir_path: incident directory
+    :type dir_path: str
+    :return: path of the manifest
+    :rtype: str
+    """
+    path = os.path.join(dir_path, MANIFEST_FILE)
+    with open(path, 'w') as f:
+        json.dump(entries, f, indent=2)
+    return path
+
+
+def materialize_manifest(store, dir_path, dest_dir=None):
+    """
+    Rebuild all logs of the manifest of an incident directory
+
+    :param store: the store the manifest refers to
+    :type store: LogStore
+    :param dir_path: incident directory
+    :type dir_path: str
+    :param dest_dir: directory to write the logs to, dir_path if None
+    :type dest_dir: str
+    :return: paths of the logs
+    :rtype: list
+    """
+    with open(os.path.join(dir_path, MANIFEST_FILE)) as f:
+        entries = json.load(f)
+    return [store.materialize(entry, dest_dir or dir_path) for entry in entries]
@@ -0,0 +1,134 @@
+"""
+Extract a time window of a log, runs on the remote host.
+
+The script is sent to the host over ssh stdin and run by the host python, so it has to stay standalone and work with
+both python 2 and 3. The first and last lines of the window are found by binary search on the byte offsets of the log,
+comparing the timestamps at the start of the lines (log timestamps sort as strings), so only a few blocks of the log
+are read besides the window itself.
+
+Usage: python window_extractor.py LOG FROM_TIME TO_TIME
+    FROM_TIME and TO_TIME are '%Y-%m-%d %H:%M:%S' or '%Y-%m-%dT%H:%M:%S', the window holds the lines stamped
+    FROM_TIME <= stamp < TO_TIME (lines without a timestamp belong to the line above them).
+
+Output: one header line 'START_OFFSET END_OFFSET SIZE' followed by the bytes of the window.
+"""
+import os
+import re
+import sys
+
+CHUNK_SIZE = 256 * 1024
+STAMP_LENGTH = 19
+STAMP_REGEX = re.compile(br'\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d')
+
+
+def line_stamp(line):
+    """
+    :param line: log line
+    :type line: bytes
+    :return: the timestamp the line starts with, None if it has none
+    :rtype: bytes
+    """
+    if STAMP_REGEX.match(line):
+        return line[:STAMP_LENGTH].replace(b'T', b' ')
+    return None
+
+
+def next_stamp(f, pos):
+    """
+    Find the first timestamped line starting at or after pos
+
+    :param f: log open for binary reading
+    :type f: file
+    :param pos: byte offset
+    :type pos: int
+    :return: (offset, stamp) of the line, (size, None) if there is none
+    :rtype: tuple
+    """
+    if pos > 0:
+        # align to the start of the next line, a line starting exactly at pos is kept
+        f.seek(pos - 1)
+        f.readline()
+    else:
+        f.seek(0)
+    while True:
+        offset = f.tell()
+        line = f.readline()
+        if not line:
+            return offset, None
+        stamp = line_stamp(line)
+        if stamp is not None:
+            return offset, stamp
+
+
+def find_offset(f, size, target):
+    """
+    Binary search the offset of the first line stamped at or after target
+
+    :param f: log open for binary reading
+    :type f: file
+    :param size: log size
+    :type size: int
+    :param target: timestamp
+    :type target: bytes
+    :return: offset of the line, size if all lines are older
+    :rtype: int
+    """
+    lo, hi = 0, size
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        stamp = next_stamp(f, mid)[1]
+        if stamp is None or stamp >= target:
+            hi = mid
+        else:
+            lo = mid
+    offset, stamp = next_stamp(f, lo)
+    while stamp is not None and stamp < target:
+        offset, stamp = next_stamp(f, offset + 1)
+    return offset
+
+
+def extract_window(path, from_time, to_time, out):
+    """
+    Write the header and the window of the log to out
+
+    :param path: log path
+    :type path: str
+    :param from_time: window start timestamp
+    :type from_time: bytes
+    :param to_time: window end timestamp, excluded
+    :type to_time: bytes
+    :param out: binary output stream
+    :type out: file
+    :return: (start offset, end offset, size)
+    :rtype: tuple
+    """
+    with open(path, 'rb') as f:
+        # the size is taken once, lines appended meanwhile are not part of the window
+        size = os.fstat(f.fileno()).st_size
+        start = find_offset(f, size, from_time)
+        end = max(start, find_offset(f, size, to_time))
+        out.write(('%d %d %d\n' % (start, end, size)).encode())
+        f.seek(start)
+        left = end - start
+        while left > 0:
+            data = f.read(min(CHUNK_SIZE, left))
+            if not data:
+                break
+            out.write(data)
+            left -= len(data)
+    out.flush()
+    return start, end, size
+
+
+def main(argv):
+    if len(argv) != 4:
+        sys.stderr.write(__doc__)
+        return 2
+    out = getattr(sys.stdout, 'buffer', sys.stdout)
+    from_time, to_time = [value.replace('T', ' ').encode() for value in argv[2:]]
+    extract_window(argv[1], from_time, to_time, out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+
+# Parts of a log line which differ between repeats of the same fault: uuids, hex and decimal numbers (which also
+# covers timestamps, thread numbers and ports)
+VARIABLE_PARTS = re.compile(
+    r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|0x[0-9a-fA-F]+|\d+"
+)
+
+logger = logging.getLogger(__name__)
+
+
+def fault_signature(line, rules=None):
+    """
+    Signature of a fault, equal for repeats of the same fault
+
+    :param line: the matching log line
+    :type line: str
+    :param rules: the fault rules that matched the line
+    :type rules: list
+    :return: signature of the fault
+    :rtype: str
+    """
+    rule_names = ",".join(sorted(rule.name for rule in rules)) if rules else ""
+    return hashlib.md5(rule_names + "|" + VARIABLE_PARTS.sub("#", line)).hexdigest()
+
+
+class Incident(object):
+    """
+    One distinct fault, counting all its repeats on all hosts
+    """
+
+    def __init__(self, number, signature, host, log, line, rules):
+        self.number = number
+        self.signature = signature
+        self.host = host
+        self.log = log
+        self.line = line
+        self.rules = rules or []
+        self.count = 1
+        self.hosts = set([host])
+        self.first_seen = self.last_seen = time.time()
+
+    @property
+    def actions(self):
+        """
+        Actions called for by the matched rules, a plain regex match calls for the whole incident flow
+        """
+        return set(rule.action for rule in self.rules) if self.rules else set(['dump'])
+
+    def to_dict(self):
+        return {
+            'number': self.number,
+            'signature': self.signature,
+            'rules': [rule.name for rule in self.rules],
+            'severities': sorted(set(rule.severity for rule in self.rules)),
+            'host': self.host,
+            'log': self.log,
+            'line': self.line,
+            'count': self.count,
+            'hosts': sorted(self.hosts),
+            'first_seen': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.first_seen)),
+            'last_seen': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.last_seen)),
+        }
+
+
+class IncidentTracker(object):
+    """
+    Dedupe matched faults to incidents by their signature
+    """
+
+    def __init__(self, reopen_after=None):
+        """
+        :param reopen_after: seconds of silence after which a repeated fault opens a new incident, None means never
+        :type reopen_after: int
+        """
+        self.reopen_after = reopen_after
+        self.incidents = []
+        self._by_signature = {}
+        self._lock = threading.Lock()
+
+    def record(self, host, log, line, rules=None):
+        """
+        Record a matched fault
+
+        :param host: host the fault was found on
+        :type host: str
+        :param log: log the fault was found in
+        :type log: str
+        :param line: the matching log line
+        :type line: str
+        :param rules: the fault rules that matched the line
+        :type rules: list
+        :return: the incident of the fault and whether it is a new incident
+        :rtype: tuple
+        """
+        signature = fault_signature(line, rules)
+        now = time.time()
+        with self._lock:
+            incident = self._by_signature.get(signature)
+            if incident is not None and (self.reopen_after is None or now - incident.last_seen < self.reopen_after):
+                incident.count += 1
+                incident.hosts.add(host)
+                incident.last_seen = now
+                return incident, False
+            incident = Incident(len(self.incidents) + 1, signature, host, log, line, rules)
+            self.incidents.append(incident)
+            self._by_signature[signature] = incident
+            return incident, True
+
+    def dump(self, path):
+        """
+        Write all incidents with their counters to a json file
+
+        :param path: full path of the file
+        :type path: str
+        """
+        with self._lock:
+            incidents = [incident.to_dict() for incident in self.incidents]
+        with open(path, 'w') as f:
+            json.dump(incidents, f, indent=2)
+        logger.info("Wrote %s incidents to %s", len(incidents), path)
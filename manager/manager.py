@@ -1,17 +1,25 @@
+import json
 import logging
+import multiprocessing
+import os
+import Queue
 import time
 import datetime
-from threading import Thread
+from multiprocessing.pool import ThreadPool
 import yaml
 
 import config
 import global_helpers
-from listener.log_listener import watch_logs
-from log_dumper.log_dumper import dump_hosts_logs
+from listener.fault_rules import load_fault_rules
+from listener.multi_log_listener import MultiLogListener, watch_hosts_logs
+from log_dumper.log_dumper import WINDOW_INFO_SUFFIX, dump_hosts_logs
+from log_dumper.log_store import LogStore
 from notifier.notifier import notify_via_mail_and_console
 from scenario_finder.scenario_finder import ScenarioFinder
-from env_state.env_state import get_resources_stats
+from env_state.env_state import SNAPSHOT_EXTENSION, get_resources_stats, write_snapshots_diff
 from bugzilla_report_maker.bugzilla_report_maker import bugzilla_report_maker
+from incidents import IncidentTracker
+from pipeline import Pipeline
 
 # set up logging to file
 logging.basicConfig(
@@ -22,6 +30,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Events of the engine logs looked for when no scenario profiles are given
+SCENARIO_EVENT_STRING = "EVENT_ID"
+# Steps timings of each incident, written to its logs directory
+PIPELINE_RESULTS_FILE = "incident_pipeline.json"
+# Environment state changes between the start of the test and each incident, written to its logs directory
+ENV_STATE_DIFF_FILE = "env_state_diff.json"
+# Incidents of continuous monitoring with their counters, written to the logs directory of the run
+INCIDENTS_FILE = "incidents.json"
+# Seconds between rewrites of the incidents file for repeats of known incidents, new incidents rewrite it right away
+INCIDENTS_DUMP_INTERVAL = 60
+
 
 class Manager:
     """
@@ -41,9 +60,13 @@ class Manager:
     def __init__(
         self, fault_regex, logs, remote_hosts, remote_users, remote_passwords, timeout=None, localhost_pass=None,
         tail_lines=None, target_mail=None, mail_user=None, mail_password=None, test_name=None , env_state_uri=None,
-        env_state_pass=None
+        env_state_pass=None, fault_rules=None, continuous=False, workers=4, reopen_after=None, window_minutes=None,
+        log_store=None, materialize_logs=True, scenario_profiles=None, compression=None, keep_compressed=False
     ):
         self.fault_regex = fault_regex
+        # Fault rules are either a list of rule dicts or a path to a yaml file with such a list, the fault regex is
+        # added to them as one more rule
+        self.fault_rules = load_fault_rules(fault_rules, fault_regex)
         # Logs are a list of lists , each list represent logs we require in each host.
         # f.e :[['/var/log/vdsm/vdsm.log'], ['/var/log/ovirt-engine/engine.log']]
         self.logs = logs
@@ -60,6 +83,29 @@ class Manager:
         self.test_name = test_name
         self.env_state_uri = env_state_uri
         self.env_state_pass = env_state_pass
+        # Continuous mode keeps listening after an issue was found, handling each distinct fault once on a pool of
+        # workers, repeats of a fault are only counted unless it was silent for reopen_after seconds
+        self.continuous = continuous
+        self.workers = workers
+        self.reopen_after = reopen_after
+        # When set, only the lines logged within window_minutes around the issue are collected from each log
+        self.window_minutes = window_minutes
+        # None - plain copy of the logs, gzip or zstd - compress them on the hosts, auto - compress on slow hosts, the
+        # logs are decompressed on the fly unless keep_compressed is set
+        self.compression = compression
+        self.keep_compressed = keep_compressed
+        # With a log store directory the full logs are kept in it across incidents and runs, each incident fetches
+        # only what was appended to the logs since the previous one and gets a manifest of the logs (plus the logs
+        # themselves when materialize_logs is set)
+        self.log_store = LogStore(log_store) if log_store else None
+        self.materialize_logs = materialize_logs
+        # Scenario profiles (names of built in ones, dicts or a yaml file) the scenario is parsed with, the events of
+        # all of them are merged to one timeline, by default only the engine events are parsed
+        self.scenario_profiles = scenario_profiles
+        # Environment state at the start of the test, incidents are compared with it
+        self.env_state_start_path = None
+        # Process pool the scenarios of the incidents are parsed on, see _rhv_manager
+        self.parse_pool = None
 
     @property
     def fault_regex(self):
@@ -127,86 +173,296 @@ class Manager:
 
     @property
     def test_start_time(self):
-        return self.__tail_lines
+        return self.__test_start_time
 
     @test_start_time.setter
     def test_start_time(self, test_start_time_val):
         self.__test_start_time = test_start_time_val
 
+    def _hosts_logs(self):
+        """
+        Pair every remote host with its credentials and the logs to watch on it. Every host watches every log of the
+        configuration, so a fault is found whichever host logs it. The dump still collects from each host only the
+        log paired with it in the configuration (host i dumps log i, see dump_hosts_logs).
+
+        :return: list of (ip, username, password, logs) tuples
+        """
+        return zip(
+            self.remote_hosts, self.remote_users, self.remote_passwords, [self.logs[0]] * len(self.remote_hosts)
+        )
+
     def _rhv_manager(self):
-        config.SLAVE_HOST.users.insert(0, config.RootUser(self.localhost_pass))
-        test_start_time = datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d %H:%M:%S')
-        logger.info("Starting test monitoring at %s", test_start_time)
-
-        full_path = global_helpers.create_localhost_logs_dir(config.LOCALHOST_LOGS_PATH)
-        logger.info("Local host logs directory set to the following path: %s", full_path + "/" + "env_state_start")
-
-        logger.info("Check the enviroment state at the start of the test")
-        get_resources_stats(engine_uri=self.env_state_uri, engine_pass=self.env_state_pass,
-                            results_path=full_path + "/" + "env_state_start")
-
-        logger.info("Starting log listener searching for regex %s in logs %s", self.fault_regex, self.logs[0][0])
-        found_regex, issue_found = watch_logs(
-            files_to_watch=self.logs[0][0],
-            regex=self.fault_regex,
-            ip_for_files=self.remote_hosts[0],
-            username=self.remote_users[0],
-            password=self.remote_passwords[0],
-            time_out=self.timeout,
+        # The scenario finder parses the logs on processes forked now, before the listener, the dumps and the incident
+        # workers start threads, forking while other threads hold locks (e.g. of ssh transports) can hang the forked
+        # processes
+        self.parse_pool = multiprocessing.Pool()
+        try:
+            config.SLAVE_HOST.users.insert(0, config.RootUser(self.localhost_pass))
+            test_start_time = datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d %H:%M:%S')
+            logger.info("Starting test monitoring at %s", test_start_time)
+
+            full_path = global_helpers.create_localhost_logs_dir(config.LOCALHOST_LOGS_PATH)
+            logger.info("Local host logs directory set to the following path: %s", full_path + "/" + "env_state_start")
+
+            logger.info("Check the enviroment state at the start of the test")
+            self.env_state_start_path = full_path + "/" + "env_state_start"
+            get_resources_stats(engine_uri=self.env_state_uri, engine_pass=self.env_state_pass,
+                                results_path=self.env_state_start_path)
+
+            if self.continuous:
+                self._rhv_monitor(full_path)
+                return
+
+            logger.info(
+                "Starting log listener searching for %s in logs %s on hosts %s", self.fault_rules, self.logs,
+                self.remote_hosts
             )
-        logger.info("Issue found: %s\n Starting to dump logs to localhost ", found_regex)
-        components_version_full_list = dump_hosts_logs(
-            hosts_ips=self.remote_hosts, passwords=self.remote_passwords, usernames=self.remote_users, logs=self.logs,
-            tail_lines=self.tail_lines, localhost_pass=self.localhost_pass, full_path=full_path
+            issue_host, issue_log, found_regex = watch_hosts_logs(
+                hosts_logs=self._hosts_logs(), regex=self.fault_rules, time_out=self.timeout
+            )
+            matched_rules = self.fault_rules.match_line(found_regex) if found_regex else []
+            self._handle_incident(issue_host, issue_log, found_regex, matched_rules, full_path)
+        finally:
+            self.parse_pool.close()
+            self.parse_pool.join()
+            self.parse_pool = None
+
+
+    def _rhv_monitor(self, full_path):
+        """
+        Continuous monitoring, keep listening to all logs until the timeout passes (or forever) and handle every
+        distinct fault as an incident. Repeats of a fault are only counted, and the incidents work (dump, notify,
+        report) runs on a pool of workers so the listener never stalls.
+
+        :param full_path: local logs directory of this run, each incident gets a sub directory
+        :type full_path: str
+        """
+        tracker = IncidentTracker(reopen_after=self.reopen_after)
+        incidents_path = full_path + "/" + INCIDENTS_FILE
+        last_dump = time.time()
+        pool = ThreadPool(self.workers)
+        results = []
+        listener = MultiLogListener(self._hosts_logs(), self.timeout)
+        logger.info(
+            "Starting continuous monitoring for %s in logs %s on hosts %s with %s workers", self.fault_rules,
+            self.logs, self.remote_hosts, self.workers
         )
-        logger.info("Logs dumped to localhost path: %s", full_path)
-        logger.info("Moving short logs to dedicated folder")
-        global_helpers.create_localhost_short_logs_dir(full_path, self.tail_lines)
-        logger.info("Notify of the issue via mail and console")
-
-        t1 = Thread(target=notify_via_mail_and_console, args=(
-                self.fault_regex, found_regex, self.target_mail,self.mail_user, self.mail_password,
-                self.remote_hosts[0], self.test_name, full_path
-        ))
-        t2 = Thread(target=get_resources_stats, args=(
-            self.env_state_uri, self.env_state_pass, full_path + "/" + "env_state_at_issue")
+        try:
+            for issue_host, issue_log, found_regex, matched_rules in listener.iter_matches(self.fault_rules):
+                incident, is_new = tracker.record(issue_host, issue_log, found_regex, matched_rules)
+                # the counters are kept up to date on the disk, a run watching forever is only stopped by the user
+                if is_new or time.time() - last_dump >= INCIDENTS_DUMP_INTERVAL:
+                    tracker.dump(incidents_path)
+                    last_dump = time.time()
+                if not is_new:
+                    logger.debug("Incident %s repeated %s times", incident.number, incident.count)
+                    continue
+                logger.info(
+                    "New incident %s on host %s in log %s matching rules %s: %s", incident.number, issue_host,
+                    issue_log, matched_rules, found_regex
+                )
+                if 'dump' in incident.actions:
+                    results.append(pool.apply_async(self._handle_incident, (
+                        issue_host, issue_log, found_regex, matched_rules, full_path, "incident_%s" % incident.number
+                    )))
+                elif 'notify' in incident.actions:
+                    results.append(pool.apply_async(notify_via_mail_and_console, (
+                        self._fault_event(matched_rules), found_regex, self.target_mail, self.mail_user,
+                        self.mail_password, issue_host, self.test_name, full_path
+                    )))
+        except KeyboardInterrupt:
+            logger.info("Continuous monitoring was stopped")
+        finally:
+            listener.close()
+            pool.close()
+            pool.join()
+            for result in results:
+                try:
+                    result.get()
+                except Exception as e:
+                    logger.error("Handling an incident failed with error %s", e)
+            tracker.dump(incidents_path)
+
+    def _fault_event(self, matched_rules):
+        """
+        Short name of a fault, used as the event of notifications
+        """
+        return ", ".join(rule.name for rule in matched_rules) or self.fault_regex
+
+    def _incident_time(self, line):
+        """
+        Time of an issue, taken from the timestamp of its log line so it follows the clock of the host
+
+        :param line: the log line of the issue
+        :type line: str
+        :return: the time, None if the line has no timestamp
+        :rtype: datetime.datetime
+        """
+        return global_helpers.parse_log_timestamp(line)
+
+    def _parse_host_logs(self, scenario_finder_obj, full_path, result):
+        """
+        Parse the scenario of the logs of a host as soon as they were dumped, while other hosts are still dumped.
+        Short logs are left out, and so are logs dumped by more than one host, as each host overwrites the copy of the
+        others in the logs directory, the scenario finder parses them once all hosts are done.
+
+        :param scenario_finder_obj: scenario finder of the incident
+        :type scenario_finder_obj: ScenarioFinder
+        :param full_path: local logs directory of the incident
+        :type full_path: str
+        :param result: dump result of the host
+        :type result: HostDumpResult
+        """
+        # each host dumps the log paired with it, as in dump_hosts_logs
+        names = [os.path.basename(log) for _, log in zip(self.remote_hosts, self.logs[0])]
+        shared = set(name for name in names if names.count(name) > 1)
+        dumped = set(os.path.basename(log) for log in result.logs) - shared
+        # collected logs may be named with a suffix, e.g. the compression extension or the window suffix, the byte
+        # offsets of a window saved next to it are not a log
+        file_names = [
+            name for name in os.listdir(full_path)
+            if not global_helpers.is_short_log(name, self.tail_lines) and not name.endswith(WINDOW_INFO_SUFFIX) and
+            [dumped_name for dumped_name in dumped if name.startswith(dumped_name)]
+        ]
+        logger.info("Parsing the scenario of logs %s of host %s", file_names, result.host_ip)
+        scenario_finder_obj.add_logs(file_names, host=result.host_ip)
+
+    def _dump_logs(self, full_path, incident_time, dumped_hosts):
+        """
+        Dump the logs of all hosts to the logs directory of an incident
+
+        :param full_path: local logs directory of the incident
+        :type full_path: str
+        :param incident_time: time of the issue, see dump_hosts_logs
+        :type incident_time: datetime.datetime
+        :param dumped_hosts: queue getting the result of each host as soon as it was dumped, then None once all the
+            hosts are done
+        :type dumped_hosts: Queue.Queue
+        :return: the components versions, see dump_hosts_logs
+        :rtype: list
+        """
+        try:
+            return dump_hosts_logs(
+                self.remote_hosts, self.remote_passwords, self.remote_users, self.logs, self.tail_lines,
+                self.localhost_pass, full_path, compression=self.compression, keep_compressed=self.keep_compressed,
+                window_minutes=self.window_minutes, incident_time=incident_time,
+                log_store=self.log_store, materialize=self.materialize_logs, on_host_done=dumped_hosts.put
+            )
+        finally:
+            dumped_hosts.put(None)
+
+    def _parse_dumped_hosts(self, scenario_finder_obj, full_path, dumped_hosts):
+        """
+        Parse the scenario of the logs of each host taken from the queue of the dump, until the dump is done. Parsing
+        runs here rather than in the dump workers, which would be held by it while other hosts wait for a worker.
+
+        :param scenario_finder_obj: scenario finder of the incident
+        :type scenario_finder_obj: ScenarioFinder
+        :param full_path: local logs directory of the incident
+        :type full_path: str
+        :param dumped_hosts: queue of the dump results, see _dump_logs
+        :type dumped_hosts: Queue.Queue
+        """
+        for result in iter(dumped_hosts.get, None):
+            try:
+                self._parse_host_logs(scenario_finder_obj, full_path, result)
+            except Exception as e:
+                logger.error("Parsing the scenario of the logs of host %s failed with error %s", result.host_ip, e)
+
+    def _diff_env_state(self, env_state_path, full_path):
+        """
+        Compare the environment state when an issue occurred with the state at the start of the test
+
+        :param env_state_path: results path of the environment state of the issue
+        :type env_state_path: str
+        :param full_path: local directory to write the diff to
+        :type full_path: str
+        :return: the diff, see env_state.diff_snapshots
+        :rtype: dict
+        """
+        return write_snapshots_diff(
+            self.env_state_start_path + SNAPSHOT_EXTENSION, env_state_path + SNAPSHOT_EXTENSION,
+            full_path + "/" + ENV_STATE_DIFF_FILE
         )
 
-        logger.info("Starting 2 threads concurrently with the scenario finder as follows:")
-        logger.info("Notify of the issue via mail and console done on thread name %s", t1.getName())
-        logger.info("Check the environment state when the issue occurred done on thread named %s", t2.getName())
-
-        t1.start()
-        t2.start()
-
-        logger.info("Parsing scenario from the log file")
+    def _handle_incident(self, issue_host, issue_log, found_regex, matched_rules, full_path, incident_dir=None):
+        """
+        Dump the logs of all hosts, notify, check the environment state, parse the scenario and create a bugzilla
+        report for an issue found by the log listener.
+
+        The work runs as a pipeline of steps, each starting as soon as the steps it needs are done: the notification
+        and the environment state start right away, the scenario finder parses the logs of each host as soon as they
+        were dumped (in a step of its own, the dump only queues the hosts) and the report is created once the dump and
+        the scenario are done (with the changes of the environment state since the test start, when they could be
+        found). The steps timings are written to incident_pipeline.json.
+
+        :param issue_host: host the issue was found on
+        :type issue_host: str
+        :param issue_log: log the issue was found in
+        :type issue_log: str
+        :param found_regex: the log line of the issue
+        :type found_regex: str
+        :param matched_rules: the fault rules that matched the line
+        :type matched_rules: list
+        :param full_path: local directory for the logs and results of this issue
+        :type full_path: str
+        :param incident_dir: when given, the logs and results go to a new sub directory of full_path with this name
+        :type incident_dir: str
+        """
+        if incident_dir:
+            full_path = global_helpers.create_localhost_logs_dir(full_path, incident_dir)
+        logger.info(
+            "Issue found on host %s in log %s matching rules %s: %s\n Starting to dump logs to localhost ",
+            issue_host, issue_log, matched_rules, found_regex
+        )
+        fault_event = self._fault_event(matched_rules)
         event_file_path = full_path + "/" + "events"
-        global_helpers.chmod_files_directories(full_path)
+        env_state_path = full_path + "/" + "env_state_at_issue"
         scenario_finder_obj = ScenarioFinder(
-            time_start=self.test_start_time, path_logs=full_path, event_string="EVENT_ID",
-            scenario_result_file_path=event_file_path)
-        scenario_finder_obj.parse_logs()
-
-        t1.join()
-        t2.join()
-
-        logger.info("All threads are done, now we can start creating bugzilla report")
-        logger.info("Creating bugzilla report in file %s")
-        bugzilla_report_maker_ob = bugzilla_report_maker(
-            logs_path=full_path, issue_found=found_regex, test_name=self.test_name,
-            components_versions=components_version_full_list, events_file_path=event_file_path
+            time_start=self.test_start_time, path_logs=full_path, event_string=SCENARIO_EVENT_STRING,
+            scenario_result_file_path=event_file_path, scenario_profiles=self.scenario_profiles, pool=self.parse_pool)
+        dumped_hosts = Queue.Queue()
+
+        pipeline = Pipeline("incident at %s" % full_path)
+        pipeline.add("notify", notify_via_mail_and_console, (
+            fault_event, found_regex, self.target_mail, self.mail_user, self.mail_password, issue_host,
+            self.test_name, full_path
+        ))
+        pipeline.add("env_state", get_resources_stats, (self.env_state_uri, self.env_state_pass, env_state_path))
+        # the snapshot is written even when some resource types failed, they are just not compared
+        pipeline.add("env_state_diff", self._diff_env_state, (env_state_path, full_path), after=["env_state"])
+        pipeline.add("dump", self._dump_logs, (full_path, self._incident_time(found_regex), dumped_hosts))
+        pipeline.add("parse_hosts", self._parse_dumped_hosts, (scenario_finder_obj, full_path, dumped_hosts))
+        pipeline.add(
+            "short_logs", global_helpers.create_localhost_short_logs_dir, (full_path, self.tail_lines),
+            requires=["dump"]
         )
-        bugzilla_report_maker_ob.create_bugzilla_file()
+        pipeline.add("chmod", global_helpers.chmod_files_directories, (full_path,), requires=["short_logs"])
+        pipeline.add("scenario", scenario_finder_obj.parse_logs, requires=["dump", "short_logs", "parse_hosts"])
+        pipeline.add("report", lambda: bugzilla_report_maker(
+            logs_path=full_path, issue_found=found_regex, test_name=self.test_name,
+            components_versions=pipeline["dump"].result, events_file_path=event_file_path,
+            env_state_diff=pipeline["env_state_diff"].result
+        ).create_bugzilla_file(), requires=["dump", "scenario"], after=["env_state_diff"])
+        pipeline.run()
+
+        with open(full_path + "/" + PIPELINE_RESULTS_FILE, 'w') as f:
+            json.dump(pipeline.to_dict(), f, indent=2)
 
 
 def run_rhv_manager(yaml_path):
     conf = yaml.load(open(yaml_path))
     manager_obj = Manager(
-        fault_regex=conf['fault_regex'], logs=[conf['logs']], remote_hosts=conf['remote_hosts'],
-        remote_users=conf['remote_users'], remote_passwords=conf['remote_passwords'], timeout=conf['timeout'],
-        localhost_pass=conf['localhost_pass'], tail_lines=conf['tail_lines'], target_mail=conf['target_mail'],
-        mail_user=conf['mail_user'], mail_password=conf['mail_password'], test_name=conf['test_name'],
-        env_state_uri=conf['env_state_uri'], env_state_pass=conf['env_state_pass']
+        fault_regex=conf.get('fault_regex'), fault_rules=conf.get('fault_rules'), logs=[conf['logs']],
+        remote_hosts=conf['remote_hosts'], remote_users=conf['remote_users'],
+        remote_passwords=conf['remote_passwords'], timeout=conf['timeout'], localhost_pass=conf['localhost_pass'],
+        tail_lines=conf['tail_lines'], target_mail=conf['target_mail'], mail_user=conf['mail_user'],
+        mail_password=conf['mail_password'], test_name=conf['test_name'], env_state_uri=conf['env_state_uri'],
+        env_state_pass=conf['env_state_pass'], continuous=conf.get('continuous', False),
+        workers=conf.get('workers', 4), reopen_after=conf.get('reopen_after'),
+        window_minutes=conf.get('window_minutes'), log_store=conf.get('log_store'),
+        materialize_logs=conf.get('materialize_logs', True), scenario_profiles=conf.get('scenario_profiles'),
+        compression=conf.get('compression'), keep_compressed=conf.get('keep_compressed', False)
     )
 
     manager_obj._rhv_manager()
@@ -0,0 +1,182 @@
+import logging
+import Queue
+import time
+from multiprocessing.pool import ThreadPool
+
+logger = logging.getLogger(__name__)
+
+
+class Step(object):
+    """
+    A single step of a pipeline, with its outcome
+    """
+
+    def __init__(self, name, func, args=(), kwargs=None, requires=(), after=()):
+        """
+        :param name: step name, other steps require it by this name
+        :type name: str
+        :param func: called with args and kwargs when all the required steps are done
+        :type func: callable
+        :param args: arguments of func
+        :type args: tuple
+        :param kwargs: keyword arguments of func
+        :type kwargs: dict
+        :param requires: names of the steps that have to be done before this step starts
+        :type requires: tuple
+        :param after: names of the steps that have to end before this step starts, unlike the required steps this step
+            still runs when they fail
+        :type after: tuple
+        """
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.requires = tuple(requires)
+        self.after = tuple(after)
+        self.state = 'pending'
+        self.result = None
+        self.error = None
+        self.start_time = None
+        self.end_time = None
+
+    @property
+    def elapsed(self):
+        if self.start_time is None:
+            return 0
+        return (self.end_time or time.time()) - self.start_time
+
+    def to_dict(self, start_time):
+        return {
+            'name': self.name,
+            'requires': list(self.requires),
+            'after': list(self.after),
+            'state': self.state,
+            'error': self.error,
+            'started': round(self.start_time - start_time, 3) if self.start_time else None,
+            'elapsed': round(self.elapsed, 3),
+        }
+
+    def __repr__(self):
+        return "Step(%s, %s, %.1fs)" % (self.name, self.state, self.elapsed)
+
+
+class Pipeline(object):
+    """
+    Steps with dependencies between them, each step starts on a pool of threads as soon as all the steps it requires
+    are done, so independent chains of steps overlap and the whole run takes about as long as its longest chain.
+    A failed step does not stop the others, only the steps requiring it are skipped.
+    """
+
+    def __init__(self, name, workers=None):
+        """
+        :param name: pipeline name, used in logs
+        :type name: str
+        :param workers: steps running at once, None for all the steps
+        :type workers: int
+        """
+        self.name = name
+        self.workers = workers
+        self.steps = []
+        self.start_time = None
+        self.end_time = None
+
+    def add(self, name, func, args=(), kwargs=None, requires=(), after=()):
+        """
+        Add a step, see Step
+
+        :return: the step
+        :rtype: Step
+        """
+        if name in [step.name for step in self.steps]:
+            raise ValueError("Step %s was added to pipeline %s twice" % (name, self.name))
+        step = Step(name, func, args, kwargs, requires, after)
+        self.steps.append(step)
+        return step
+
+    def __getitem__(self, name):
+        for step in self.steps:
+            if step.name == name:
+                return step
+        raise KeyError(name)
+
+    def _check(self):
+        """
+        Make sure all the required steps exist and there is no dependency cycle
+        """
+        names = set(step.name for step in self.steps)
+        for step in self.steps:
+            unknown = set(step.requires + step.after) - names
+            if unknown:
+                raise ValueError("Step %s requires unknown steps %s" % (step.name, sorted(unknown)))
+        done = set()
+        left = list(self.steps)
+        while left:
+            ready = [step for step in left if set(step.requires + step.after) <= done]
+            if not ready:
+                raise ValueError("Steps %s of pipeline %s require each other" % ([s.name for s in left], self.name))
+            done.update(step.name for step in ready)
+            left = [step for step in left if step.name not in done]
+
+    def _run_step(self, step, finished):
+        step.start_time = time.time()
+        try:
+            step.result = step.func(*step.args, **step.kwargs)
+            step.state = 'done'
+        except Exception as e:
+            logger.exception("Step %s of pipeline %s failed", step.name, self.name)
+            step.error = str(e) or e.__class__.__name__
+            step.state = 'failed'
+        finally:
+            step.end_time = time.time()
+            finished.put(step)
+
+    def run(self):
+        """
+        Run all the steps and wait for them
+
+        :return: the steps
+        :rtype: list
+        """
+        self._check()
+        self.start_time = time.time()
+        finished = Queue.Queue()
+        pool = ThreadPool(self.workers or len(self.steps) or 1)
+        running = 0
+        try:
+            while True:
+                states = dict((step.name, step.state) for step in self.steps)
+                for step in self.steps:
+                    if step.state != 'pending':
+                        continue
+                    required = [states[name] for name in step.requires]
+                    waited = [states[name] for name in step.after]
+                    if [state for state in required if state in ('failed', 'skipped')]:
+                        logger.error("Skipping step %s of pipeline %s, a step it requires failed", step.name, self.name)
+                        step.state = states[step.name] = 'skipped'
+                    elif all(state == 'done' for state in required) and \
+                            all(state in ('done', 'failed', 'skipped') for state in waited):
+                        step.state = states[step.name] = 'running'
+                        pool.apply_async(self._run_step, (step, finished))
+                        running += 1
+                if not running:
+                    # nothing runs and nothing can start, all pending steps were skipped above
+                    if [step for step in self.steps if step.state == 'pending']:
+                        continue
+                    break
+                step = finished.get()
+                running -= 1
+                logger.info("Step %s of pipeline %s %s after %.1f seconds", step.name, self.name, step.state,
+                            step.elapsed)
+        finally:
+            pool.close()
+            pool.join()
+            self.end_time = time.time()
+        logger.info("Pipeline %s finished in %.1f seconds: %s", self.name, self.end_time - self.start_time, self.steps)
+        return self.steps
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'elapsed': round((self.end_time or time.time()) - self.start_time, 3) if self.start_time else 0,
+            'steps': [step.to_dict(self.start_time) for step in self.steps],
+        }
@@ -1,5 +1,9 @@
 import socket
 
+import netaddr
+
+_local_addresses = None
+
 
 def fqdn2ip(fqdn):
     """
@@ -20,3 +24,42 @@ def fqdn2ip(fqdn):
         ex.strerror = message
         ex.args = tuple(args)
         raise
+
+
+def local_addresses():
+    """
+    Addresses of the local machine, as far as its hostname tells
+
+    Returns:
+        set: IP addresses
+    """
+    global _local_addresses
+    if _local_addresses is None:
+        addresses = set()
+        try:
+            for info in socket.getaddrinfo(socket.gethostname(), None):
+                addresses.add(info[4][0])
+        except (socket.gaierror, socket.herror):
+            pass
+        _local_addresses = addresses
+    return _local_addresses
+
+
+def is_local_address(address):
+    """
+    Tell whether the address (or host name) points to the local machine
+
+    Args:
+        address (str): IP address or host name
+
+    Returns:
+        bool: True for loopback and local addresses
+    """
+    if not netaddr.valid_ipv4(address) and not netaddr.valid_ipv6(address):
+        try:
+            address = fqdn2ip(address)
+        except (socket.gaierror, socket.herror):
+            return False
+    if netaddr.IPAddress(address).is_loopback():
+        return True
+    return address in local_addresses()
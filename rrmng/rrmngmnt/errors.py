@@ -116,3 +116,34 @@ class FailToUmount(MountCommandError):
 
 class FailToRemount(MountCommandError):
     pass
+
+
+class ChecksumMismatch(FileSystemError):
+    """
+    Copied file content differs from its source
+    """
+    def __init__(self, path, expected, actual):
+        """
+        Args:
+            path (str): path of the copied file
+            expected (str): sha256 of the source
+            actual (str): sha256 of the copied data
+        """
+        super(ChecksumMismatch, self).__init__(path, expected, actual)
+
+    @property
+    def path(self):
+        return self.args[0]
+
+    @property
+    def expected(self):
+        return self.args[1]
+
+    @property
+    def actual(self):
+        return self.args[2]
+
+    def __str__(self):
+        return "Checksum mismatch of %s, expected sha256 %s, got %s" % (
+            self.path, self.expected, self.actual,
+        )
@@ -1,12 +1,142 @@
+import hashlib
 import os
+import subprocess
+import zlib
 
+import netaddr
 import six
 import warnings
 
 from rrmng.rrmngmnt import errors
+from rrmng.rrmngmnt.common import is_local_address
 from rrmng.rrmngmnt.service import Service
 from rrmng.rrmngmnt.resource import Resource
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Size of a single read/write when copying files
+COPY_CHUNK_SIZE = 256 * 1024
+# Number of chunks requested ahead when reading a remote file, so the
+# copy is not bound by the round trip of every single read request
+READ_AHEAD = 16
+# sftp - stream the file through this process, works with passwords
+# scp - 'scp -3' copies between the hosts, needs ssh keys on both hosts
+TRANSFER_METHODS = ('sftp', 'scp')
+# compressor -> (remote command compressing a file to stdout, file suffix)
+COMPRESSORS = {
+    'gzip': (['gzip', '-1', '-c'], '.gz'),
+    'zstd': (['zstd', '-1', '-c', '-q'], '.zst'),
+}
+
+
+def file_size(fh):
+    """
+    Size of an open file, local or remote (sftp)
+
+    Args:
+        fh (file): open file
+
+    Returns:
+        int: size of the file, None if it can't be told
+    """
+    try:
+        if hasattr(fh, 'stat'):
+            return fh.stat().st_size
+        return os.fstat(fh.fileno()).st_size
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+
+
+def iter_chunks(fh, chunk_size=COPY_CHUNK_SIZE, size=None):
+    """
+    Read a file chunk by chunk. Remote (sftp) files of known size are read
+    READ_AHEAD chunks at a time with pipelined requests, the rest are read
+    one chunk after the other.
+
+    Args:
+        fh (file): file open for reading, read from its current position
+        chunk_size (int): size of a single chunk
+        size (int): bytes to read, read to the end of the file if None
+
+    Yields:
+        str: chunks of data
+    """
+    readv = getattr(fh, 'readv', None)
+    if readv is None or size is None:
+        left = size
+        while left is None or left > 0:
+            data = fh.read(
+                chunk_size if left is None else min(chunk_size, left)
+            )
+            if not data:
+                return
+            if left is not None:
+                left -= len(data)
+            yield data
+        return
+
+    position = fh.tell()
+    window = chunk_size * READ_AHEAD
+    for start in range(position, position + size, window):
+        end = min(start + window, position + size)
+        chunks = [
+            (offset, min(chunk_size, end - offset))
+            for offset in range(start, end, chunk_size)
+        ]
+        for data in readv(chunks):
+            yield data
+
+
+def copy_file_object(
+    rh, wh, chunk_size=COPY_CHUNK_SIZE, progress_handler=None
+):
+    """
+    Copy file content chunk by chunk, so memory use does not depend on the
+    size of the file
+
+    Args:
+        rh (file): file open for reading
+        wh (file): file open for writing
+        chunk_size (int): size of a single read/write
+        progress_handler (func): called with (copied bytes, total bytes)
+            after every chunk, total is None if the size is not known
+
+    Returns:
+        tuple: (copied bytes, sha256 hex digest of the copied data)
+    """
+    size = file_size(rh)
+    if hasattr(wh, 'set_pipelined'):
+        # don't wait for the ack of every write, errors are raised on close
+        wh.set_pipelined(True)
+    sha256 = hashlib.sha256()
+    copied = 0
+    for data in iter_chunks(rh, chunk_size, size):
+        wh.write(data)
+        sha256.update(data)
+        copied += len(data)
+        if progress_handler:
+            progress_handler(copied, size)
+    return copied, sha256.hexdigest()
+
+
+def local_checksum(path, size=None):
+    """
+    Args:
+        path (str): path to file on local system
+        size (int): checksum only the first size bytes
+
+    Returns:
+        str: sha256 hex digest
+    """
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for data in iter_chunks(fh, size=size):
+            sha256.update(data)
+    return sha256.hexdigest()
+
 
 class FileSystem(Service):
     """
@@ -200,66 +330,269 @@ class FileSystem(Service):
         """
         self._exec_command(['chmod', mode, path])
 
-    def get(self, path_src, path_dst):
+    def checksum(self, path, size=None):
+        """
+        Compute sha256 of file on Host
+
+        Args:
+            path (str): path to file
+            size (int): checksum only the first size bytes, useful for
+                files which are still written to (logs)
+
+        Returns:
+            str: sha256 hex digest
+
+        Raises:
+            CommandExecutionFailure: If sha256sum failed
+        """
+        if size is None:
+            cmd = ['sha256sum', path]
+        else:
+            # the pipe needs the shell, which must not see the path unquoted
+            cmd = [
+                'head', '-c', str(size), six.moves.shlex_quote(path), '|',
+                'sha256sum',
+            ]
+        return self._exec_command(cmd).split()[0]
+
+    def _verify(self, path, copied, digest):
+        expected = self.checksum(path, copied)
+        if expected != digest:
+            raise errors.ChecksumMismatch(path, expected, digest)
+
+    def get(
+        self, path_src, path_dst, chunk_size=COPY_CHUNK_SIZE,
+        progress_handler=None, verify=False
+    ):
         """
         Fetch file from Host and store on local system
 
         Args:
             path_src (str): path to file on remote system
             path_dst (str): path to file on local system or directory
+            chunk_size (int): size of a single read/write
+            progress_handler (func): called with (copied bytes, total bytes)
+            verify (bool): compare sha256 of the copied data with the
+                source file
 
         Returns:
             str: Path to destination file
+
+        Raises:
+            ChecksumMismatch: If verify is set and the data differs
         """
         if os.path.isdir(path_dst):
             path_dst = os.path.join(path_dst, os.path.basename(path_src))
         with self.host.executor().session() as ss:
             with ss.open_file(path_src, 'rb') as rh:
                 with open(path_dst, 'wb') as wh:
-                    wh.write(rh.read())
+                    copied, digest = copy_file_object(
+                        rh, wh, chunk_size, progress_handler
+                    )
+        if verify:
+            self._verify(path_src, copied, digest)
         return path_dst
 
-    def put(self, path_src, path_dst):
+    def put(
+        self, path_src, path_dst, chunk_size=COPY_CHUNK_SIZE,
+        progress_handler=None, verify=False
+    ):
         """
         Upload file from local system to Host
 
         Args:
             path_src (str): path to file on local system
             path_dst (str): path to file on remote system or directory
+            chunk_size (int): size of a single read/write
+            progress_handler (func): called with (copied bytes, total bytes)
+            verify (bool): compare sha256 of the copied data with the
+                destination file
 
         Returns:
             str: path to destination file
+
+        Raises:
+            ChecksumMismatch: If verify is set and the data differs
         """
         if self.isdir(path_dst):
             path_dst = os.path.join(path_dst, os.path.basename(path_src))
         with self.host.executor().session() as ss:
             with open(path_src, 'rb') as rh:
                 with ss.open_file(path_dst, 'wb') as wh:
-                    wh.write(rh.read())
+                    copied, digest = copy_file_object(
+                        rh, wh, chunk_size, progress_handler
+                    )
+        if verify:
+            self._verify(path_dst, copied, digest)
         return path_dst
 
-    def transfer(self, path_src, target_host, path_dst):
+    def get_compressed(
+        self, path_src, path_dst, compressor='gzip', keep_compressed=False,
+        chunk_size=COPY_CHUNK_SIZE, progress_handler=None
+    ):
+        """
+        Fetch file from Host compressed on the fly by the Host, text files
+        like logs are sent several times smaller than by get
+
+        Args:
+            path_src (str): path to file on remote system
+            path_dst (str): path to file on local system or directory
+            compressor (str): one of COMPRESSORS
+            keep_compressed (bool): store the compressed data (with the
+                compressor suffix) instead of decompressing it on the fly
+            chunk_size (int): size of a single read/write
+            progress_handler (func): called with (received compressed
+                bytes, None) after every chunk
+
+        Returns:
+            str: Path to destination file
+
+        Raises:
+            CommandExecutionFailure: If the remote compression failed
+            UnsupportedOperation: If the data can't be decompressed locally
+        """
+        if compressor not in COMPRESSORS:
+            raise ValueError(
+                "Unknown compressor %s, expected one of %s" % (
+                    compressor, sorted(COMPRESSORS),
+                )
+            )
+        cmd, suffix = COMPRESSORS[compressor]
+        if keep_compressed:
+            decompressor = None
+        elif compressor == 'gzip':
+            # 16 + MAX_WBITS expects the gzip header and trailer
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif zstandard is not None:
+            decompressor = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            raise errors.UnsupportedOperation(
+                self.host, 'get_compressed',
+                "zstandard module is needed to decompress zstd on the fly, "
+                "use keep_compressed or gzip",
+            )
+
+        if os.path.isdir(path_dst):
+            path_dst = os.path.join(path_dst, os.path.basename(path_src))
+        if keep_compressed:
+            path_dst += suffix
+        cmd = cmd + [path_src]
+        host_executor = self.host.executor()
+        with host_executor.session() as ss:
+            command = ss.command(cmd)
+            with command.execute() as (_, out, err):
+                with open(path_dst, 'wb') as wh:
+                    received = 0
+                    for data in iter_chunks(out, chunk_size):
+                        received += len(data)
+                        if decompressor is not None:
+                            data = decompressor.decompress(data)
+                        wh.write(data)
+                        if progress_handler:
+                            progress_handler(received, None)
+                    if hasattr(decompressor, 'flush'):
+                        wh.write(decompressor.flush())
+                command.err = err.read()
+        if command.rc:
+            raise errors.CommandExecutionFailure(
+                host_executor, cmd, command.rc, command.err
+            )
+        return path_dst
+
+    def transfer(
+        self, path_src, target_host, path_dst, chunk_size=COPY_CHUNK_SIZE,
+        progress_handler=None, verify=False, method='sftp'
+    ):
         """
         Transfer file from one remote system (self) to other
         remote system (target_host).
 
+        When target_host is the local machine the file is fetched straight
+        to the local disk (as the user running this process), without an
+        ssh session to the local machine.
+
         Args:
             path_src (str): path to file on local system
             target_host (Host): target system
             path_dst (str): path to file on remote system or directory
+            chunk_size (int): size of a single read/write
+            progress_handler (func): called with (copied bytes, total bytes)
+            verify (bool): compare sha256 of the copied data with both the
+                source and the destination files
+            method (str): one of TRANSFER_METHODS, used between two remote
+                systems
 
         Returns:
             str: path to destination file
+
+        Raises:
+            ChecksumMismatch: If verify is set and the data differs
         """
+        if method not in TRANSFER_METHODS:
+            raise ValueError(
+                "Unknown transfer method %s, expected one of %s" % (
+                    method, TRANSFER_METHODS,
+                )
+            )
+        if is_local_address(target_host.ip):
+            return self.get(
+                path_src, path_dst, chunk_size, progress_handler, verify
+            )
         if target_host.fs.isdir(path_dst):
             path_dst = os.path.join(path_dst, os.path.basename(path_src))
+        if method == 'scp':
+            self._scp_transfer(path_src, target_host, path_dst)
+            if verify:
+                size = int(target_host.fs._exec_command(
+                    ['stat', '-c', '%s', path_dst]
+                ))
+                self._verify(
+                    path_src, size, target_host.fs.checksum(path_dst)
+                )
+            return path_dst
         with self.host.executor().session() as h1s:
             with target_host.executor().session() as h2s:
                 with h1s.open_file(path_src, 'rb') as rh:
                     with h2s.open_file(path_dst, 'wb') as wh:
-                        wh.write(rh.read())
+                        copied, digest = copy_file_object(
+                            rh, wh, chunk_size, progress_handler
+                        )
+        if verify:
+            self._verify(path_src, copied, digest)
+            target_host.fs._verify(path_dst, copied, digest)
         return path_dst
 
+    def _scp_transfer(self, path_src, target_host, path_dst):
+        """
+        Copy file between two remote systems with 'scp -3', the data goes
+        through the local machine but not through this process
+
+        Raises:
+            CommandExecutionFailure: If scp failed
+        """
+        def remote_path(host, path):
+            address = host.ip
+            if netaddr.valid_ipv6(address):
+                address = "[%s]" % address
+            return "%s@%s:%s" % (
+                host.executor().user.name, address, path
+            )
+
+        cmd = [
+            'scp', '-3', '-q', '-o', 'BatchMode=yes',
+            remote_path(self.host, path_src),
+            remote_path(target_host, path_dst),
+        ]
+        self.logger.info("Executing command %s", ' '.join(cmd))
+        p = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        _, err = p.communicate()
+        if p.returncode:
+            raise errors.CommandExecutionFailure(
+                self.host.executor(), cmd, p.returncode, err
+            )
+
     def wget(self, url, output_file, progress_handler=None):
         """
         Download file on the host from given url
@@ -14,7 +14,7 @@ from rrmng.rrmngmnt import errors
 from rrmng.rrmngmnt import power_manager
 from rrmng.rrmngmnt import ssh
 from rrmng.rrmngmnt.common import fqdn2ip
-from rrmng.rrmngmnt.filesystem import FileSystem
+from rrmng.rrmngmnt.filesystem import FileSystem, copy_file_object
 from rrmng.rrmngmnt.network import Network
 from rrmng.rrmngmnt.operatingsystem import OperatingSystem
 from rrmng.rrmngmnt.package_manager import PackageManagerProxy
@@ -207,7 +207,7 @@ class Host(Resource):
     def power_manager(self):
         return self.get_power_manager()
 
-    def executor(self, user=None, pkey=False):
+    def executor(self, user=None, pkey=False, pooled=True):
         """
         Gives you executor to allowing command execution
 
@@ -215,10 +215,13 @@ class Host(Resource):
             user (User): the executed commands will be executed under this
                 user. when it is None, the default executor user is used,
                 see set_executor_user method for more info.
+            pooled (bool): reuse ssh connections kept open in
+                ssh.CONNECTION_POOL instead of connecting for each session
         """
         if user is None:
             user = self.executor_user
-        return ssh.RemoteExecutor(user, self.ip, use_pkey=pkey)
+        pool = ssh.CONNECTION_POOL if pooled else None
+        return ssh.RemoteExecutor(user, self.ip, use_pkey=pkey, pool=pool)
 
     def run_command(
         self, command, input_=None, tcp_timeout=None, io_timeout=None,
@@ -266,7 +269,7 @@ class Host(Resource):
             with self.executor().session() as host_session:
                 with resource_session.open_file(src, 'rb') as resource_file:
                     with host_session.open_file(dst, 'wb') as host_file:
-                        host_file.write(resource_file.read())
+                        copy_file_object(resource_file, host_file)
         if mode:
             self.fs.chmod(path=dst, mode=mode)
         if ownership:
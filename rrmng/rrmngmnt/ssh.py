@@ -2,8 +2,10 @@ import os
 import time
 import socket
 import paramiko
+import threading
 import contextlib
 import subprocess
+from multiprocessing.pool import ThreadPool
 from rrmng.rrmngmnt.executor import Executor
 
 AUTHORIZED_KEYS = os.path.join("%s", ".ssh/authorized_keys")
@@ -12,6 +14,213 @@ ID_RSA_PUB = os.path.join("%s", ".ssh/id_rsa.pub")
 ID_RSA_PRV = os.path.join("%s", ".ssh/id_rsa")
 CONNECTIVITY_TIMEOUT = 600
 CONNECTIVITY_SAMPLE_TIME = 20
+SSH_KEEPALIVE = 30
+SSH_MAX_IDLE = 300
+# sshd allows 10 sessions (channels) per connection by default (MaxSessions),
+# stay below it
+MAX_CHANNELS = 8
+
+
+class SSHConnectionPool(object):
+    """
+    Keeps ssh connections open per (address, user) so sessions can reuse
+    warm transports instead of paying a tcp + ssh handshake and auth
+    for each command.
+
+    A connection may serve several sessions at once, each of them opens its
+    own channels on the shared transport. sshd refuses channels past
+    MaxSessions on a single connection, so the channels open on each
+    connection are capped at max_channels, and one more connection with the
+    same identity is opened when all of them are at the cap.
+    """
+
+    class Connection(object):
+        def __init__(self, client, max_channels=MAX_CHANNELS):
+            self.client = client
+            self.users = 0
+            self.last_used = time.time()
+            self.channels = threading.Semaphore(max_channels)
+
+    def __init__(
+        self, keepalive=SSH_KEEPALIVE, max_idle=SSH_MAX_IDLE,
+        max_channels=MAX_CHANNELS
+    ):
+        """
+        Args:
+            keepalive (int): Interval in seconds of keepalive packets sent on
+                pooled transports, 0 disables them
+            max_idle (int): Unused connections idle for longer than this many
+                seconds are closed instead of being reused
+            max_channels (int): Maximum number of channels open at once on a
+                single connection
+        """
+        super(SSHConnectionPool, self).__init__()
+        self.keepalive = keepalive
+        self.max_idle = max_idle
+        self.max_channels = max_channels
+        self._lock = threading.Lock()
+        # key -> list of Connection, more than one when channels overflow
+        self._connections = {}
+        self._key_locks = {}
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _is_healthy(self, connection):
+        """
+        Check the connection is still usable, an idle connection is probed
+        by sending an ignore packet through it
+        """
+        idle = time.time() - connection.last_used
+        if connection.users == 0 and idle > self.max_idle:
+            return False
+        transport = connection.client.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        if connection.users == 0 and idle > self.keepalive:
+            try:
+                transport.send_ignore()
+            except (paramiko.SSHException, EOFError, socket.error):
+                return False
+        return True
+
+    def _healthy_connections(self, key):
+        """
+        Drop the connections of the key which are not usable anymore, called
+        with the key lock held
+
+        Returns:
+            list: The healthy connections of the key
+        """
+        connections = []
+        for connection in self._connections.get(key, []):
+            if self._is_healthy(connection):
+                connections.append(connection)
+            elif connection.users == 0:
+                connection.client.close()
+        if connections:
+            self._connections[key] = connections
+        else:
+            self._connections.pop(key, None)
+        return connections
+
+    def _connect(self, key, connect):
+        """
+        Open one more connection of the key, called with the key lock held
+        """
+        client = connect()
+        transport = client.get_transport()
+        if transport is not None and self.keepalive:
+            transport.set_keepalive(self.keepalive)
+        connection = SSHConnectionPool.Connection(client, self.max_channels)
+        self._connections.setdefault(key, []).append(connection)
+        return connection
+
+    def _find(self, key, client):
+        for connection in self._connections.get(key, []):
+            if connection.client is client:
+                return connection
+        return None
+
+    def acquire(self, key, connect):
+        """
+        Get a connected client for the key, connecting when there is no
+        healthy one in the pool
+
+        Args:
+            key (tuple): Connection identity, like (address, user, password)
+            connect (callable): Creates and returns a new connected client
+
+        Returns:
+            paramiko.SSHClient: Connected client
+        """
+        with self._key_lock(key):
+            connections = self._healthy_connections(key)
+            if connections:
+                connection = connections[0]
+            else:
+                connection = self._connect(key, connect)
+            connection.users += 1
+            return connection.client
+
+    def release(self, key, client):
+        """
+        Give back a client got from acquire
+
+        Args:
+            key (tuple): Connection identity
+            client (paramiko.SSHClient): The client
+        """
+        with self._key_lock(key):
+            connection = self._find(key, client)
+            if connection is None:
+                # replaced in the meantime, nobody else can get it
+                client.close()
+                return
+            connection.users -= 1
+            connection.last_used = time.time()
+
+    def acquire_channel(self, key, connect, client=None):
+        """
+        Take a channel of a connection of the key, connecting once more
+        when all the connections are at max_channels
+
+        Args:
+            key (tuple): Connection identity
+            connect (callable): Creates and returns a new connected client
+            client (paramiko.SSHClient): Preferred client, e.g. the one of
+                the session asking for the channel
+
+        Returns:
+            paramiko.SSHClient: Client to open the channel on, give the
+                channel back with release_channel once it is closed
+        """
+        with self._key_lock(key):
+            connections = sorted(
+                self._healthy_connections(key),
+                key=lambda connection: connection.client is not client,
+            )
+            for connection in connections:
+                if connection.channels.acquire(False):
+                    break
+            else:
+                connection = self._connect(key, connect)
+                connection.channels.acquire()
+            connection.users += 1
+            return connection.client
+
+    def release_channel(self, key, client):
+        """
+        Give back a channel taken with acquire_channel
+
+        Args:
+            key (tuple): Connection identity
+            client (paramiko.SSHClient): The client the channel was open on
+        """
+        with self._key_lock(key):
+            connection = self._find(key, client)
+            if connection is None:
+                # replaced in the meantime, nobody else can get it
+                client.close()
+                return
+            connection.channels.release()
+            connection.users -= 1
+            connection.last_used = time.time()
+
+    def close_all(self):
+        """
+        Close all pooled connections
+        """
+        with self._lock:
+            connections, self._connections = self._connections, {}
+        for key_connections in connections.values():
+            for connection in key_connections:
+                connection.client.close()
+
+
+# Pool used by Host.executor()
+CONNECTION_POOL = SSHConnectionPool()
 
 
 class RemoteExecutor(Executor):
@@ -47,13 +256,18 @@ class RemoteExecutor(Executor):
 
     class Session(Executor.Session):
         """
-        Represents active ssh connection
+        Represents active ssh connection, when a pool is given the
+        connection is taken from the pool and given back on close
         """
-        def __init__(self, executor, timeout=None, use_pkey=False):
+        def __init__(self, executor, timeout=None, use_pkey=False, pool=None):
             super(RemoteExecutor.Session, self).__init__(executor)
             if timeout is None:
                 timeout = RemoteExecutor.TCP_TIMEOUT
             self._timeout = timeout
+            self._pool = pool
+            self._pooled = False
+            # channels opened by open_channel -> client they are open on
+            self._channels = {}
             self._ssh = paramiko.SSHClient()
             self._ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
             if use_pkey:
@@ -77,10 +291,29 @@ class RemoteExecutor(Executor):
                         "Can not close ssh session %s", ex,
                     )
 
+        @property
+        def _pool_key(self):
+            return (
+                self._executor.address,
+                self._executor.user.name,
+                self._executor.user.password,
+                self.pkey is not None,
+            )
+
         def open(self):
-            self._ssh.get_host_keys().clear()
+            if self._pool is not None:
+                self._ssh = self._pool.acquire(self._pool_key, self._connect)
+                self._pooled = True
+                return
+            self._connect(self._ssh)
+
+        def _connect(self, client=None):
+            if client is None:
+                client = paramiko.SSHClient()
+                client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            client.get_host_keys().clear()
             try:
-                self._ssh.connect(
+                client.connect(
                     self._executor.address,
                     username=self._executor.user.name,
                     password=self._executor.user.password,
@@ -97,9 +330,17 @@ class RemoteExecutor(Executor):
             except socket.timeout as ex:
                 self._update_timeout_exception(ex)
                 raise
+            return client
 
         def close(self):
-            self._ssh.close()
+            for channel in list(self._channels):
+                self.close_channel(channel)
+            if self._pooled:
+                self._pooled = False
+                self._pool.release(self._pool_key, self._ssh)
+                return
+            if self._pool is None:
+                self._ssh.close()
 
         def _update_timeout_exception(self, ex, timeout=None):
             if getattr(ex, '_updated', False):
@@ -112,6 +353,58 @@ class RemoteExecutor(Executor):
             ex.args = (message,)
             ex._updated = True
 
+        def _take_channel(self):
+            """
+            Returns:
+                paramiko.SSHClient: Client to open a channel on, with a
+                    pool it is taken from the pool channels
+            """
+            if not self._pooled:
+                return self._ssh
+            return self._pool.acquire_channel(
+                self._pool_key, self._connect, self._ssh
+            )
+
+        def _give_channel(self, client):
+            if self._pooled:
+                self._pool.release_channel(self._pool_key, client)
+
+        @contextlib.contextmanager
+        def _channel(self):
+            client = self._take_channel()
+            try:
+                yield client
+            finally:
+                self._give_channel(client)
+
+        def open_channel(self):
+            """
+            Open a channel to use directly, e.g. to follow the output of a
+            long running command
+
+            Returns:
+                paramiko.Channel: The channel, close it with close_channel,
+                    channels left open are closed with the session
+            """
+            client = self._take_channel()
+            try:
+                channel = client.get_transport().open_session()
+            except Exception:
+                self._give_channel(client)
+                raise
+            self._channels[channel] = client
+            return channel
+
+        def close_channel(self, channel):
+            """
+            Args:
+                channel (paramiko.Channel): Channel got from open_channel
+            """
+            channel.close()
+            client = self._channels.pop(channel, None)
+            if client is not None:
+                self._give_channel(client)
+
         def command(self, cmd):
             return RemoteExecutor.Command(cmd, self)
 
@@ -119,17 +412,53 @@ class RemoteExecutor(Executor):
             cmd = self.command(cmd)
             return cmd.run(input_, timeout)
 
+        def run_cmds(
+            self, cmds, input_=None, timeout=None, max_channels=None
+        ):
+            """
+            Run several commands concurrently, each on its own channel of
+            this session's transport. The session has to stay open until all
+            the results are fetched.
+
+            Args:
+                cmds (list): Commands, each of them a list
+                input_ (str): Input data for each command
+                timeout (float): Timeout for data operation (read/write)
+                max_channels (int): Maximum number of commands running at
+                    once, the rest wait for a free channel, by default the
+                    channels limit of the pool connections (MAX_CHANNELS
+                    without a pool)
+
+            Returns:
+                list: Futures (multiprocessing.pool.AsyncResult) in the order
+                    of cmds, their get() returns tuple (rc, out, err)
+            """
+            if max_channels is None:
+                max_channels = (
+                    self._pool.max_channels if self._pool is not None
+                    else MAX_CHANNELS
+                )
+            pool = ThreadPool(max(1, min(len(cmds), max_channels)))
+            try:
+                return [
+                    pool.apply_async(self.run_cmd, (cmd, input_, timeout))
+                    for cmd in cmds
+                ]
+            finally:
+                pool.close()
+
         @contextlib.contextmanager
         def open_file(self, path, mode='r', bufsize=-1):
-            with contextlib.closing(self._ssh.open_sftp()) as sftp:
-                with contextlib.closing(
-                    sftp.file(
-                        path,
-                        mode,
-                        bufsize,
-                    )
-                ) as fh:
-                    yield fh
+            with self._channel() as client:
+                with contextlib.closing(client.open_sftp()) as sftp:
+                    with contextlib.closing(
+                        sftp.file(
+                            path,
+                            mode,
+                            bufsize,
+                        )
+                    ) as fh:
+                        yield fh
 
     class Command(Executor.Command):
         """
@@ -164,30 +493,31 @@ class RemoteExecutor(Executor):
                 # where in_, out and err are file-like objects
                 # where you can read data from these
             """
-            try:
-                self.logger.debug("Executing: %s", self.cmd)
-                self._in, self._out, self._err = self._ss._ssh.exec_command(
-                    self.cmd,
-                    bufsize=bufsize,
-                    timeout=timeout,
-                    get_pty=get_pty,
-                )
-                yield self._in, self._out, self._err
-                self.get_rc(True)
-            except socket.timeout as ex:
-                self._ss._update_timeout_exception(ex, timeout)
-                raise
-            finally:
-                if self._in is not None:
-                    self._in.close()
-                if self._out is not None:
-                    self._out.close()
-                if self._err is not None:
-                    self._err.close()
-                self.logger.debug("Results of command: %s", self.cmd)
-                self.logger.debug("  OUT: %s", self.out)
-                self.logger.debug("  ERR: %s", self.err)
-                self.logger.debug("  RC: %s", self.rc)
+            with self._ss._channel() as client:
+                try:
+                    self.logger.debug("Executing: %s", self.cmd)
+                    self._in, self._out, self._err = client.exec_command(
+                        self.cmd,
+                        bufsize=bufsize,
+                        timeout=timeout,
+                        get_pty=get_pty,
+                    )
+                    yield self._in, self._out, self._err
+                    self.get_rc(True)
+                except socket.timeout as ex:
+                    self._ss._update_timeout_exception(ex, timeout)
+                    raise
+                finally:
+                    if self._in is not None:
+                        self._in.close()
+                    if self._out is not None:
+                        self._out.close()
+                    if self._err is not None:
+                        self._err.close()
+                    self.logger.debug("Results of command: %s", self.cmd)
+                    self.logger.debug("  OUT: %s", self.out)
+                    self.logger.debug("  ERR: %s", self.err)
+                    self.logger.debug("  RC: %s", self.rc)
 
         def run(self, input_, timeout=None, get_pty=False):
             with self.execute(
@@ -200,16 +530,19 @@ class RemoteExecutor(Executor):
                 self.err = err.read()
             return self.rc, self.out, self.err
 
-    def __init__(self, user, address, use_pkey=False):
+    def __init__(self, user, address, use_pkey=False, pool=None):
         """
         Args:
             use_pkey (bool): Use ssh private key in the connection
             user (instance of User): User
             address (str): Ip / hostname
+            pool (SSHConnectionPool): Reuse connections from this pool, when
+                None each session opens its own connection
         """
         super(RemoteExecutor, self).__init__(user)
         self.address = address
         self.use_pkey = use_pkey
+        self.pool = pool
 
     def session(self, timeout=None):
         """
@@ -219,7 +552,7 @@ class RemoteExecutor(Executor):
         Returns:
             instance of RemoteExecutor.Session: The session
         """
-        return RemoteExecutor.Session(self, timeout, self.use_pkey)
+        return RemoteExecutor.Session(self, timeout, self.use_pkey, self.pool)
 
     def run_cmd(self, cmd, input_=None, tcp_timeout=None, io_timeout=None):
         """
@@ -235,6 +568,26 @@ class RemoteExecutor(Executor):
         with self.session(tcp_timeout) as session:
             return session.run_cmd(cmd, input_, io_timeout)
 
+    def run_cmds(self, cmds, input_=None, tcp_timeout=None, io_timeout=None):
+        """
+        Run several commands concurrently over a single ssh connection, so
+        it takes about as long as the slowest command instead of the sum.
+
+        Args:
+            cmds (list): Commands, each of them a list
+            input_ (str): Input data for each command
+            tcp_timeout (float): Tcp timeout
+            io_timeout (float): Timeout for data operation (read/write)
+
+        Returns:
+            list: Tuples (rc, out, err) in the order of cmds
+        """
+        with self.session(tcp_timeout) as session:
+            return [
+                result.get()
+                for result in session.run_cmds(cmds, input_, io_timeout)
+            ]
+
     def is_connective(self, tcp_timeout=20.0):
         """
         Check if address is connective via ssh
@@ -250,7 +603,11 @@ class RemoteExecutor(Executor):
                 "Check if address is connective via ssh in given timeout %s",
                 tcp_timeout
             )
-            self.run_cmd(['true'], tcp_timeout=tcp_timeout)
+            # always a new connection, a pooled one may outlive the host
+            with RemoteExecutor.Session(
+                self, tcp_timeout, self.use_pkey
+            ) as session:
+                session.run_cmd(['true'])
             return True
         except (socket.timeout, socket.error) as e:
             self.logger.debug("Socket error: %s", e)
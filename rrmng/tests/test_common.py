@@ -13,3 +13,10 @@ def test_fqdn2ip_negative():
     with pytest.raises(Exception) as ex_info:
         common.fqdn2ip('github.or')
     assert 'github.or' in str(ex_info.value)
+
+
+def test_is_local_address():
+    assert common.is_local_address('127.0.0.1')
+    assert common.is_local_address('::1')
+    assert common.is_local_address('localhost')
+    assert not common.is_local_address('192.0.2.1')
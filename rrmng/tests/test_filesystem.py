@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import subprocess
+import zlib
+
 import pytest
 
 from rrmngmnt import Host, User
 from rrmngmnt import errors
+from rrmngmnt import filesystem
 from .common import FakeExecutor
 
 
@@ -208,6 +213,148 @@ class TestFSGetPutFile(object):
             '/path/to/put_dir/put_file'].data == "data of put_file"
 
 
+class TestFSStreamingCopy(object):
+    content = "0123456789" * 10
+    data = {
+        "[ -d /path/to/put_dir ]": (0, "", ""),
+        "head -c 100 /path/to/verified_file | sha256sum": (
+            0, hashlib.sha256(content.encode()).hexdigest() + "  -\n", ""
+        ),
+        "head -c 100 /path/to/changed_file | sha256sum": (
+            0, hashlib.sha256(b"other").hexdigest() + "  -\n", ""
+        ),
+        "head -c 100 '/path/to/odd;file' | sha256sum": (
+            0, hashlib.sha256(content.encode()).hexdigest() + "  -\n", ""
+        ),
+    }
+    files = {
+        "/path/to/big_file": content,
+        "/path/to/verified_file": content,
+        "/path/to/changed_file": content,
+        "/path/to/odd;file": content,
+    }
+
+    @classmethod
+    def setup_class(cls):
+        fake_cmd_data(cls.data, cls.files)
+
+    def get_host(self, ip='1.1.1.1'):
+        return Host(ip)
+
+    def test_get_chunks_progress(self, tmpdir):
+        progress = []
+        self.get_host().fs.get(
+            "/path/to/big_file", str(tmpdir), chunk_size=30,
+            progress_handler=lambda copied, total: progress.append(copied),
+        )
+        assert tmpdir.join("big_file").read() == self.content
+        assert progress == [30, 60, 90, 100]
+
+    def test_get_verify(self, tmpdir):
+        self.get_host().fs.get(
+            "/path/to/verified_file", str(tmpdir), verify=True
+        )
+
+    def test_get_verify_quoted_path(self, tmpdir):
+        self.get_host().fs.get("/path/to/odd;file", str(tmpdir), verify=True)
+        assert tmpdir.join("odd;file").read() == self.content
+
+    def test_get_verify_mismatch(self, tmpdir):
+        with pytest.raises(Exception) as ex_info:
+            self.get_host().fs.get(
+                "/path/to/changed_file", str(tmpdir), verify=True
+            )
+        assert ex_info.typename == 'ChecksumMismatch'
+
+    def test_put_chunks_progress(self, tmpdir):
+        p = tmpdir.join("put_file")
+        p.write(self.content)
+        progress = []
+        self.get_host().fs.put(
+            str(p), "/path/to/put_dir", chunk_size=64,
+            progress_handler=lambda copied, total: progress.append(
+                (copied, total)
+            ),
+        )
+        assert self.files[
+            '/path/to/put_dir/put_file'].data == self.content
+        assert progress == [(64, 100), (100, 100)]
+
+
+def gzip_data(data):
+    compressor = zlib.compressobj(1, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class TestFSGetCompressed(object):
+    content = "line of log\n" * 1000
+    data = {
+        "gzip -1 -c /path/to/log": (0, gzip_data(content), ""),
+        "gzip -1 -c /path/to/missing": (1, "", "No such file"),
+    }
+    files = {}
+
+    @classmethod
+    def setup_class(cls):
+        fake_cmd_data(cls.data, cls.files)
+
+    def get_host(self, ip='1.1.1.1'):
+        return Host(ip)
+
+    def test_decompressed_on_the_fly(self, tmpdir):
+        path = self.get_host().fs.get_compressed(
+            "/path/to/log", str(tmpdir), chunk_size=100
+        )
+        assert path == str(tmpdir.join("log"))
+        assert tmpdir.join("log").read() == self.content
+
+    def test_keep_compressed(self, tmpdir):
+        path = self.get_host().fs.get_compressed(
+            "/path/to/log", str(tmpdir), keep_compressed=True
+        )
+        assert path == str(tmpdir.join("log.gz"))
+        assert tmpdir.join("log.gz").read() == gzip_data(self.content)
+
+    def test_command_failure(self, tmpdir):
+        with pytest.raises(Exception) as ex_info:
+            self.get_host().fs.get_compressed(
+                "/path/to/missing", str(tmpdir)
+            )
+        assert ex_info.typename == 'CommandExecutionFailure'
+
+    def test_unknown_compressor(self, tmpdir):
+        with pytest.raises(ValueError):
+            self.get_host().fs.get_compressed(
+                "/path/to/log", str(tmpdir), compressor="rar"
+            )
+
+
+class FakeSFTPFile(object):
+    def __init__(self, data):
+        self.data = data
+        self.requests = []
+
+    def tell(self):
+        return 0
+
+    def readv(self, chunks):
+        self.requests.append(chunks)
+        for offset, size in chunks:
+            yield self.data[offset:offset + size]
+
+
+class TestIterChunks(object):
+
+    def test_read_ahead_windows(self):
+        fh = FakeSFTPFile(b"x" * 100)
+        chunks = list(filesystem.iter_chunks(fh, chunk_size=3, size=100))
+        assert b"".join(chunks) == fh.data
+        window = 3 * filesystem.READ_AHEAD
+        assert len(fh.requests) == (100 + window - 1) // window
+        assert fh.requests[0][:2] == [(0, 3), (3, 3)]
+        assert fh.requests[-1][-1] == (99, 1)
+
+
 class TestTransfer(object):
     data = {
         "[ -d /path/to/dest_dir ]": (0, "", ""),
@@ -230,3 +377,42 @@ class TestTransfer(object):
         )
         assert self.files[
             '/path/to/dest_dir/file_to_transfer'].data == "data to transfer"
+
+    def test_transfer_to_localhost(self, tmpdir):
+        self.files["/path/to/local_transfer"] = "data to local"
+        self.get_host().fs.transfer(
+            "/path/to/local_transfer", self.get_host("127.0.0.1"),
+            str(tmpdir),
+        )
+        assert tmpdir.join("local_transfer").read() == "data to local"
+
+    def test_transfer_unknown_method(self):
+        with pytest.raises(ValueError):
+            self.get_host().fs.transfer(
+                "/path/to/file_to_transfer", self.get_host("1.1.1.2"),
+                "/path/to/dest_dir", method="ftp",
+            )
+
+    def test_transfer_scp(self, monkeypatch):
+        calls = []
+
+        class FakePopen(object):
+            returncode = 0
+
+            def __init__(self, cmd, **kwargs):
+                calls.append(cmd)
+
+            def communicate(self):
+                return "", ""
+
+        monkeypatch.setattr(subprocess, "Popen", FakePopen)
+        path = self.get_host().fs.transfer(
+            "/path/to/file_to_transfer", self.get_host("1.1.1.2"),
+            "/path/to/dest_dir", method="scp",
+        )
+        assert path == "/path/to/dest_dir/file_to_transfer"
+        assert calls == [[
+            'scp', '-3', '-q', '-o', 'BatchMode=yes',
+            'fakeuser@1.1.1.1:/path/to/file_to_transfer',
+            'fakeuser@1.1.1.2:/path/to/dest_dir/file_to_transfer',
+        ]]
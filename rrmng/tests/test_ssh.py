@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from rrmngmnt import Host, RootUser
+from rrmngmnt import ssh
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.active = True
+        self.keepalive = None
+        self.ignored = 0
+
+    def is_active(self):
+        return self.active
+
+    def set_keepalive(self, interval):
+        self.keepalive = interval
+
+    def send_ignore(self):
+        if not self.active:
+            raise EOFError()
+        self.ignored += 1
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+        self.transport.active = False
+
+
+class TestSSHConnectionPool(object):
+    key = ('1.1.1.1', 'root', '123456', False)
+
+    def setup_method(self, method):
+        self.pool = ssh.SSHConnectionPool(keepalive=30, max_idle=300)
+        self.connected = []
+
+    def connect(self):
+        client = FakeClient()
+        self.connected.append(client)
+        return client
+
+    def test_reuse(self):
+        c1 = self.pool.acquire(self.key, self.connect)
+        self.pool.release(self.key, c1)
+        c2 = self.pool.acquire(self.key, self.connect)
+        assert c1 is c2
+        assert len(self.connected) == 1
+        assert c1.transport.keepalive == 30
+
+    def test_concurrent_users_share_connection(self):
+        c1 = self.pool.acquire(self.key, self.connect)
+        c2 = self.pool.acquire(self.key, self.connect)
+        assert c1 is c2
+        self.pool.release(self.key, c1)
+        self.pool.release(self.key, c2)
+        assert not c1.closed
+
+    def test_different_keys(self):
+        c1 = self.pool.acquire(self.key, self.connect)
+        c2 = self.pool.acquire(('2.2.2.2',) + self.key[1:], self.connect)
+        assert c1 is not c2
+
+    def test_dead_transport_reconnects(self):
+        c1 = self.pool.acquire(self.key, self.connect)
+        self.pool.release(self.key, c1)
+        c1.transport.active = False
+        c2 = self.pool.acquire(self.key, self.connect)
+        assert c1 is not c2
+        assert c1.closed
+
+    def test_idle_connection_expires(self):
+        c1 = self.pool.acquire(self.key, self.connect)
+        self.pool.release(self.key, c1)
+        self.pool._connections[self.key][0].last_used -= 301
+        c2 = self.pool.acquire(self.key, self.connect)
+        assert c1 is not c2
+        assert c1.closed
+
+    def test_idle_connection_probed(self):
+        c1 = self.pool.acquire(self.key, self.connect)
+        self.pool.release(self.key, c1)
+        self.pool._connections[self.key][0].last_used -= 31
+        c2 = self.pool.acquire(self.key, self.connect)
+        assert c1 is c2
+        assert c1.transport.ignored == 1
+
+    def test_replaced_connection_closed_on_release(self):
+        c1 = self.pool.acquire(self.key, self.connect)
+        c1.transport.active = False
+        c2 = self.pool.acquire(self.key, self.connect)
+        assert not c1.closed
+        self.pool.release(self.key, c1)
+        assert c1.closed
+        assert not c2.closed
+
+    def test_channels_capped_per_connection(self):
+        pool = ssh.SSHConnectionPool(max_channels=2)
+        c1 = pool.acquire(self.key, self.connect)
+        assert pool.acquire_channel(self.key, self.connect, c1) is c1
+        assert pool.acquire_channel(self.key, self.connect, c1) is c1
+        c2 = pool.acquire_channel(self.key, self.connect, c1)
+        assert c2 is not c1
+        assert len(self.connected) == 2
+        pool.release_channel(self.key, c1)
+        assert pool.acquire_channel(self.key, self.connect, c1) is c1
+        assert pool.acquire_channel(self.key, self.connect, c1) is c2
+        assert len(self.connected) == 2
+
+    def test_channel_keeps_connection(self):
+        c1 = self.pool.acquire(self.key, self.connect)
+        assert self.pool.acquire_channel(self.key, self.connect, c1) is c1
+        self.pool.release(self.key, c1)
+        self.pool._connections[self.key][0].last_used -= 301
+        assert self.pool.acquire(self.key, self.connect) is c1
+        assert not c1.closed
+
+    def test_close_all(self):
+        c1 = self.pool.acquire(self.key, self.connect)
+        self.pool.close_all()
+        assert c1.closed
+        assert self.pool.acquire(self.key, self.connect) is not c1
+
+
+class TestPooledExecutor(object):
+
+    def test_host_executor_pooled(self):
+        h = Host('1.1.1.1')
+        h.users.append(RootUser('123456'))
+        assert h.executor().pool is not None
+        assert h.executor(pooled=False).pool is None
+
+    def test_session_uses_pool(self):
+        pool = ssh.SSHConnectionPool()
+        client = FakeClient()
+        e = ssh.RemoteExecutor(RootUser('123456'), '1.1.1.1', pool=pool)
+        pool._connections[('1.1.1.1', 'root', '123456', False)] = [
+            ssh.SSHConnectionPool.Connection(client)
+        ]
+        with e.session() as ss:
+            assert ss._ssh is client
+        assert not client.closed
+        with e.session() as ss:
+            assert ss._ssh is client
+
+    def test_open_channel(self):
+        pool = ssh.SSHConnectionPool(max_channels=1)
+        client = FakeClient()
+        client.transport.open_session = FakeChannel
+        e = ssh.RemoteExecutor(RootUser('123456'), '1.1.1.1', pool=pool)
+        key = ('1.1.1.1', 'root', '123456', False)
+        pool._connections[key] = [ssh.SSHConnectionPool.Connection(client, 1)]
+        with e.session() as ss:
+            channel = ss.open_channel()
+            assert channel.closed is False
+            assert not pool._connections[key][0].channels.acquire(False)
+        assert channel.closed
+        assert pool._connections[key][0].channels.acquire(False)
+
+
+class FakeChannel(object):
+    def __init__(self, rc=0):
+        self.rc = rc
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def exit_status_ready(self):
+        return True
+
+    def recv_exit_status(self):
+        return self.rc
+
+
+class FakeStream(object):
+    def __init__(self, data='', rc=0):
+        self.data = data
+        self.channel = FakeChannel(rc)
+
+    def read(self):
+        return self.data
+
+    def write(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeExecClient(FakeClient):
+    def __init__(self, delay=0):
+        super(FakeExecClient, self).__init__()
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def exec_command(self, cmd, bufsize=-1, timeout=None, get_pty=False):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        rc = 1 if 'fail' in cmd else 0
+        return FakeStream(), FakeStream(cmd, rc), FakeStream('', rc)
+
+
+class TestRunCmds(object):
+    key = ('1.1.1.1', 'root', '123456', False)
+
+    def get_executor(self, client, max_channels=ssh.MAX_CHANNELS):
+        pool = ssh.SSHConnectionPool(max_channels=max_channels)
+        pool._connections[self.key] = [
+            ssh.SSHConnectionPool.Connection(client, max_channels)
+        ]
+        return ssh.RemoteExecutor(RootUser('123456'), '1.1.1.1', pool=pool)
+
+    def test_results_in_order(self):
+        e = self.get_executor(FakeExecClient())
+        results = e.run_cmds([['echo', 'a'], ['fail'], ['echo', 'b']])
+        assert results == [
+            (0, 'echo a', ''), (1, 'fail', ''), (0, 'echo b', ''),
+        ]
+
+    def test_commands_overlap(self):
+        client = FakeExecClient(delay=0.2)
+        e = self.get_executor(client)
+        start = time.time()
+        e.run_cmds([['sleep', str(i)] for i in range(5)])
+        assert time.time() - start < 0.6
+        assert client.max_running == 5
+
+    def test_max_channels(self):
+        client = FakeExecClient(delay=0.05)
+        e = self.get_executor(client)
+        with e.session() as ss:
+            futures = ss.run_cmds(
+                [['true']] * 6, max_channels=2
+            )
+            assert [f.get() for f in futures] == [(0, 'true', '')] * 6
+        assert client.max_running == 2
+
+    def test_pool_max_channels(self):
+        client = FakeExecClient(delay=0.05)
+        e = self.get_executor(client, max_channels=3)
+        results = e.run_cmds([['true']] * 7)
+        assert results == [(0, 'true', '')] * 7
+        assert client.max_running == 3
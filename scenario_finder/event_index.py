@@ -0,0 +1,249 @@
+"""
+Persistent SQLite index of the event lines of logs, kept across ScenarioFinder runs.
+
+A log is known by its host, the hash of its first line and the key of the scenario profile it is indexed for (see
+ScenarioProfile.key), so a log copied again to a new directory, grown since, or rotated and compressed is recognized and
+only its bytes after the indexed offset are parsed. Events are keyed by the log and the byte offset of their line (the
+offset within the decompressed data of compressed logs), and can be queried by time range, event code, host and
+correlation id.
+"""
+import logging
+import sqlite3
+from contextlib import closing
+
+# Times are kept as sortable strings with microseconds, so time ranges are string ranges
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+# Indexes of older schema versions are dropped and built again, version 2 times the events with their milliseconds
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    host TEXT NOT NULL,
+    head TEXT NOT NULL,
+    profile_key TEXT NOT NULL,
+    path TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    first_time TEXT,
+    last_time TEXT,
+    UNIQUE (host, head, profile_key)
+);
+CREATE TABLE IF NOT EXISTS events (
+    file_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    time TEXT,
+    code TEXT,
+    correlation_id TEXT,
+    line TEXT NOT NULL,
+    PRIMARY KEY (file_id, offset)
+);
+CREATE INDEX IF NOT EXISTS events_time ON events (time);
+CREATE INDEX IF NOT EXISTS events_code_time ON events (code, time);
+CREATE INDEX IF NOT EXISTS events_correlation_id ON events (correlation_id);
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def format_time(value):
+    """
+    :param value: time
+    :type value: datetime.datetime
+    :return: the time as stored in the index, None for None
+    :rtype: str
+    """
+    return value.strftime(TIME_FORMAT) if value is not None else None
+
+
+class IndexedFile(object):
+    """
+    Indexing state of a single log
+    """
+
+    def __init__(self, file_id, offset, first_time, last_time):
+        """
+        :param file_id: id of the log in the index
+        :type file_id: int
+        :param offset: the log is indexed up to this byte offset
+        :type offset: int
+        :param first_time: time of the first indexed line, as stored in the index
+        :type first_time: str
+        :param last_time: time of the last indexed line, as stored in the index
+        :type last_time: str
+        """
+        self.file_id = file_id
+        self.offset = offset
+        self.first_time = first_time
+        self.last_time = last_time
+
+
+class EventIndex(object):
+    """
+    Event index of logs in a SQLite database file
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path of the database file, created if missing
+        :type path: str
+        """
+        self.path = path
+        self.db = sqlite3.connect(path)
+        # log lines are kept as they are read, they are not always valid utf-8
+        self.db.text_factory = str
+        if self.db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            with self.db:
+                self.db.execute("DROP TABLE IF EXISTS events")
+                self.db.execute("DROP TABLE IF EXISTS files")
+                self.db.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def get_file(self, host, head, profile_key, path):
+        """
+        Find a log in the index, adding it if it is not there
+
+        :param host: host the log came from
+        :type host: str
+        :param head: hash of the first line of the log
+        :type head: str
+        :param profile_key: key of the scenario profile the log is indexed with
+        :type profile_key: str
+        :param path: current path of the log
+        :type path: str
+        :return: the indexing state of the log
+        :rtype: IndexedFile
+        """
+        with self.db:
+            self.db.execute(
+                "INSERT OR IGNORE INTO files (host, head, profile_key, path, offset) VALUES (?, ?, ?, ?, 0)",
+                (host, head, profile_key, path)
+            )
+            self.db.execute(
+                "UPDATE files SET path = ? WHERE host = ? AND head = ? AND profile_key = ?",
+                (path, host, head, profile_key)
+            )
+            row = self.db.execute(
+                "SELECT id, offset, first_time, last_time FROM files WHERE host = ? AND head = ? AND profile_key = ?",
+                (host, head, profile_key)
+            ).fetchone()
+        return IndexedFile(*row)
+
+    def reset_file(self, indexed):
+        """
+        Drop the indexed events of a log that was rewritten, so it is indexed from its start
+
+        :param indexed: the indexing state of the log, reset in place
+        :type indexed: IndexedFile
+        """
+        with self.db:
+            self.db.execute("DELETE FROM events WHERE file_id = ?", (indexed.file_id,))
+            self.db.execute(
+                "UPDATE files SET offset = 0, first_time = NULL, last_time = NULL WHERE id = ?", (indexed.file_id,)
+            )
+        indexed.offset = 0
+        indexed.first_time = indexed.last_time = None
+
+    def add_events(self, indexed, events, offset, first_time, last_time):
+        """
+        Add the events of newly parsed bytes of a log, in one transaction with its new offset
+
+        :param indexed: the indexing state of the log, updated in place
+        :type indexed: IndexedFile
+        :param events: tuples of (offset, time, code, correlation id, line), times as stored in the index
+        :type events: list
+        :param offset: the log is now indexed up to this byte offset
+        :type offset: int
+        :param first_time: time of the first line of the log
+        :type first_time: str
+        :param last_time: time of the last parsed line
+        :type last_time: str
+        """
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO events (file_id, offset, time, code, correlation_id, line) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(indexed.file_id,) + event for event in events]
+            )
+            self.db.execute(
+                "UPDATE files SET offset = ?, first_time = ?, last_time = ? WHERE id = ?",
+                (offset, first_time, last_time, indexed.file_id)
+            )
+        indexed.offset = offset
+        indexed.first_time = first_time
+        indexed.last_time = last_time
+
+    def last_event_time(self, indexed):
+        """
+        :param indexed: the indexing state of a log
+        :type indexed: IndexedFile
+        :return: time of the last indexed event of the log, as stored in the index, None if it has none
+        :rtype: str
+        """
+        row = self.db.execute(
+            "SELECT time FROM events WHERE file_id = ? ORDER BY offset DESC LIMIT 1", (indexed.file_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def covers(self, file_ids, time_from, time_to):
+        """
+        :param file_ids: ids of the logs to check
+        :type file_ids: list
+        :param time_from: range start
+        :type time_from: datetime.datetime
+        :param time_to: range end
+        :type time_to: datetime.datetime
+        :return: True if the lines of some of the logs span a time within the range
+        :rtype: bool
+        """
+        if not file_ids:
+            return False
+        with closing(self.db.cursor()) as cursor:
+            cursor.execute(
+                "SELECT 1 FROM files WHERE id IN (%s) AND first_time <= ? AND last_time >= ? LIMIT 1"
+                % ", ".join("?" * len(file_ids)),
+                list(file_ids) + [format_time(time_to), format_time(time_from)]
+            )
+            return cursor.fetchone() is not None
+
+    def query(self, time_from=None, time_to=None, code=None, host=None, correlation_id=None, file_ids=None):
+        """
+        Find indexed events, all filters are optional
+
+        :param time_from: events at or after this time
+        :type time_from: datetime.datetime
+        :param time_to: events before this time
+        :type time_to: datetime.datetime
+        :param code: EVENT_ID code name
+        :type code: str
+        :param host: host the logs came from
+        :type host: str
+        :param correlation_id: correlation id of the events
+        :type correlation_id: str
+        :param file_ids: ids of the logs the events are from
+        :type file_ids: list
+        :return: tuples of (host, log id, time, line) sorted by time, times as stored in the index
+        :rtype: list
+        """
+        conditions = []
+        params = []
+        for condition, value in (
+            ("events.time >= ?", format_time(time_from)), ("events.time < ?", format_time(time_to)),
+            ("events.code = ?", code), ("files.host = ?", host), ("events.correlation_id = ?", correlation_id),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        if file_ids is not None:
+            if not file_ids:
+                return []
+            conditions.append("events.file_id IN (%s)" % ", ".join("?" * len(file_ids)))
+            params.extend(file_ids)
+        sql = (
+            "SELECT files.host, events.file_id, events.time, events.line "
+            "FROM events JOIN files ON files.id = events.file_id%s ORDER BY events.time, files.path, events.offset"
+        ) % (" WHERE " + " AND ".join(conditions) if conditions else "")
+        with closing(self.db.cursor()) as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
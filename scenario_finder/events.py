@@ -0,0 +1,168 @@
+"""
+Structured engine events, parsed once from the event lines found by ScenarioFinder and exported as JSONL and as a
+NumPy structured array (.npy), so tools filtering or aggregating many events don't parse the text again.
+
+An engine event line looks like:
+2018-07-25 03:11:35,123+03 INFO  [org.ovirt...AuditLogDirector] (default task-12) [5f1b2c3d] EVENT_ID: \
+USER_VDC_LOGIN(30), User admin@internal-authz connected.
+"""
+import json
+import re
+from datetime import timedelta
+
+import global_helpers
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+EVENT_REGEX = re.compile(
+    r'(?P<time>\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d)(?:[,.](?P<millis>\d{1,6}))?\S*\s+(?P<level>[A-Z]+)\s+'
+    r'(?:\[[^\]]*\]\s+)?(?:\((?P<thread>[^)]*)\)\s+)?(?:\[(?P<correlation_id>[^\]]*)\]\s+)?'
+    r'EVENT_ID:\s*(?P<code>\w+)(?:\((?P<number>\d+)\))?,?\s*(?P<message>.*)'
+)
+JSONL_EXTENSION = '.jsonl'
+NPY_EXTENSION = '.npy'
+# Time precision of the .npy time column
+NPY_TIME_UNIT = 'datetime64[ms]'
+
+
+class Event(object):
+    """
+    A single engine event, fields of lines that don't have the engine event format are empty and their whole line is
+    the message.
+    """
+    __slots__ = ('time', 'component', 'level', 'thread', 'correlation_id', 'code', 'number', 'message')
+    fields = __slots__
+
+    def __init__(self, time, level='', thread='', correlation_id='', code='', number=-1, message='', component=''):
+        """
+        :param time: event time, None if unknown
+        :type time: datetime.datetime
+        :param level: log level
+        :type level: str
+        :param thread: engine thread that logged the event
+        :type thread: str
+        :param correlation_id: correlation id of the flow the event belongs to
+        :type correlation_id: str
+        :param code: EVENT_ID code name, e.g. USER_VDC_LOGIN
+        :type code: str
+        :param number: EVENT_ID code number, -1 if unknown
+        :type number: int
+        :param message: event message
+        :type message: str
+        :param component: scenario profile the event was found by, e.g. engine or vdsm
+        :type component: str
+        """
+        self.time = time
+        self.component = component
+        self.level = level
+        self.thread = thread
+        self.correlation_id = correlation_id
+        self.code = code
+        self.number = number
+        self.message = message
+
+    def to_dict(self):
+        """
+        :return: the event fields, the time as ISO 8601 string
+        :rtype: dict
+        """
+        record = dict((field, getattr(self, field)) for field in self.fields)
+        record['time'] = self.time.isoformat() if self.time else None
+        return record
+
+    def __repr__(self):
+        return "Event(%s, %s, %s, %s)" % (self.time, self.component, self.code, self.correlation_id)
+
+
+def parse_event(line, line_time=None):
+    """
+    :param line: event line
+    :type line: str
+    :param line_time: time of the line when it is already known (the time of the previous line for lines without a
+                      timestamp), parsed from the line if None
+    :type line_time: datetime.datetime
+    :return: the event
+    :rtype: Event
+    """
+    match = EVENT_REGEX.match(line)
+    if line_time is None:
+        line_time = global_helpers.parse_log_timestamp(line)
+    if match is None:
+        return Event(line_time, message=line.rstrip('\r\n'))
+    millis = match.group('millis')
+    if line_time is not None and millis:
+        line_time = line_time.replace(microsecond=0) + timedelta(microseconds=int(millis.ljust(6, '0')))
+    return Event(
+        line_time, level=match.group('level'), thread=match.group('thread') or '',
+        correlation_id=match.group('correlation_id') or '', code=match.group('code'),
+        number=int(match.group('number') or -1), message=match.group('message').rstrip('\r\n')
+    )
+
+
+def write_jsonl(events, path):
+    """
+    Write the events as JSON lines, one event object per line
+
+    :param events: events to write
+    :type events: list
+    :param path: full path of the file
+    :type path: str
+    """
+    with open(path, 'w') as f:
+        for event in events:
+            f.write(json.dumps(event.to_dict()))
+            f.write('\n')
+
+
+def to_array(events):
+    """
+    Build a structured array with a column per event field, strings are fixed width byte strings as wide as the
+    longest value of their column
+
+    :param events: events
+    :type events: list
+    :return: the array, None if numpy is not installed
+    :rtype: numpy.ndarray
+    """
+    if numpy is None:
+        return None
+    strings = [field for field in Event.fields if field not in ('time', 'number')]
+    columns = dict((field, [_to_bytes(getattr(event, field)) for event in events]) for field in strings)
+    dtype = [('time', NPY_TIME_UNIT), ('number', 'i4')] + [
+        (field, 'S%d' % max([1] + [len(value) for value in columns[field]])) for field in strings
+    ]
+    array = numpy.zeros(len(events), dtype=dtype)
+    array['time'] = [event.time or numpy.datetime64('NaT') for event in events]
+    array['number'] = [event.number for event in events]
+    for field in strings:
+        array[field] = columns[field]
+    return array
+
+
+def write_npy(events, path):
+    """
+    Write the events as a structured array, load it with numpy.load(path, mmap_mode='r') to filter columns without
+    reading the whole file
+
+    :param events: events to write
+    :type events: list
+    :param path: full path of the file
+    :type path: str
+    :return: True if written, False if numpy is not installed
+    :rtype: bool
+    """
+    array = to_array(events)
+    if array is None:
+        return False
+    with open(path, 'wb') as f:
+        numpy.save(f, array, allow_pickle=False)
+    return True
+
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return value.encode('utf-8')
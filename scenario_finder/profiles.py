@@ -0,0 +1,195 @@
+"""
+Scenario profiles, what the scenario finder looks for in each type of log.
+
+A profile tells the logs it applies to (by file name), the event lines to pick (any of a few regexes, matched with a
+single precompiled regex behind a literal prefilter), how to find the correlation id of an event and how the lines are
+timestamped, so a single pass over each log gives the events of all components on one timeline.
+"""
+import calendar
+import re
+import time
+from datetime import datetime
+
+import yaml
+
+import events
+import global_helpers
+from listener.fault_rules import literals_regex, required_literal
+
+# Built in profiles, keyword arguments of ScenarioProfile
+PROFILES = {
+    'engine': {
+        'files': r'engine',
+        'event_regexes': [r'EVENT_ID'],
+        'correlation_regex': r'\) \[([^\]\s]+)\]',
+    },
+    'vdsm': {
+        'files': r'^vdsm\.log',
+        'event_regexes': [r'\bSTART \w+', r'\bFINISH \w+', r' (?:ERROR|WARN) +\(', r'Traceback'],
+        'correlation_regex': r'flow_id=([\w-]+)',
+    },
+    'supervdsm': {
+        'files': r'^supervdsm\.log',
+        'event_regexes': [r'::(?:ERROR|WARNING)::', r'\bcall \w+ with\b'],
+        # MainProcess|jsonrpc/0::DEBUG::2018-07-25 03:11:35,123::supervdsm_server::...
+        'timestamp_regex': r'::(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)',
+    },
+    'libvirt': {
+        'files': r'^libvirtd?\.log',
+        'event_regexes': [r': (?:error|warning) : '],
+        'utc': True,
+    },
+}
+
+
+class ScenarioProfile(object):
+    """
+    Events of a single type of log
+    """
+
+    def __init__(self, name, files, event_regexes, correlation_regex=None, timestamp_regex=None, utc=False):
+        """
+        :param name: profile name, the component of the events
+        :type name: str
+        :param files: regex searched on the names of the logs the profile applies to
+        :type files: str
+        :param event_regexes: regexes of the event lines, a line matching any of them is an event
+        :type event_regexes: list
+        :param correlation_regex: regex whose first group is the correlation id of an event line
+        :type correlation_regex: str
+        :param timestamp_regex: regex whose first group is the '%Y-%m-%d %H:%M:%S' timestamp of a line, None if the
+                                lines start with their timestamp (such logs are searched for the start time by binary
+                                search, others are read from their start)
+        :type timestamp_regex: str
+        :param utc: the timestamps are UTC, they are converted to local time on the timeline
+        :type utc: bool
+        """
+        if not event_regexes:
+            raise ValueError("At least one event regex is needed for scenario profile %s" % name)
+        self.name = name
+        self.files = re.compile(files)
+        self.event_regexes = list(event_regexes)
+        self.pattern = re.compile('|'.join('(?:%s)' % regex for regex in self.event_regexes))
+        literals = [required_literal(regex) for regex in self.event_regexes]
+        self.gate = re.compile(literals_regex(literals)) if all(literals) else None
+        # when all the event regexes are plain strings the prefilter alone tells an event line
+        self.gate_only = self.gate is not None and all(
+            re.escape(literal) == regex or literal == regex for literal, regex in zip(literals, self.event_regexes)
+        )
+        # a single plain string is looked for with 'in', faster than any regex
+        self.literal = literals[0] if self.gate_only and len(literals) == 1 else None
+        self.correlation = re.compile(correlation_regex) if correlation_regex else None
+        self.timestamp = re.compile(timestamp_regex) if timestamp_regex else None
+        self.utc = utc
+        # identifies the profile in the event index, events indexed with other settings are indexed again
+        self.key = '\n'.join(
+            [name] + self.event_regexes + [correlation_regex or '', timestamp_regex or '', str(bool(utc))]
+        )
+
+    @property
+    def seekable(self):
+        """
+        True if the lines of the logs start with their timestamp
+        """
+        return self.timestamp is None
+
+    def is_event(self, line):
+        """
+        :param line: log line
+        :type line: str
+        :return: True if the line is an event line
+        :rtype: bool
+        """
+        if self.literal is not None:
+            return self.literal in line
+        if self.gate is not None and self.gate.search(line) is None:
+            return False
+        return self.gate_only or self.pattern.search(line) is not None
+
+    def line_time(self, line):
+        """
+        :param line: log line
+        :type line: str
+        :return: local time of the line with the fraction of a second following its timestamp, None if it has no
+                 timestamp
+        :rtype: datetime.datetime
+        """
+        if self.timestamp is None:
+            line_time = global_helpers.parse_log_timestamp(line)
+            end = global_helpers.LOG_TIMESTAMP_LENGTH
+        else:
+            match = self.timestamp.search(line)
+            line_time = global_helpers.parse_log_timestamp(match.group(1)) if match else None
+            end = match.end(1) if match else None
+        if line_time is None:
+            return None
+        fraction = global_helpers.parse_log_fraction(line, end)
+        if self.utc:
+            line_time = datetime.fromtimestamp(calendar.timegm(line_time.timetuple()))
+        return line_time.replace(microsecond=fraction) if fraction else line_time
+
+    def log_time(self, local_time):
+        """
+        :param local_time: local time
+        :type local_time: datetime.datetime
+        :return: the time as stamped in the logs of the profile
+        :rtype: datetime.datetime
+        """
+        if self.utc:
+            return datetime.utcfromtimestamp(time.mktime(local_time.timetuple()))
+        return local_time
+
+    def parse_event(self, line, line_time):
+        """
+        :param line: event line
+        :type line: str
+        :param line_time: local time of the line
+        :type line_time: datetime.datetime
+        :return: the event
+        :rtype: events.Event
+        """
+        event = events.parse_event(line, line_time)
+        event.component = self.name
+        if not event.correlation_id and self.correlation is not None:
+            match = self.correlation.search(line)
+            if match:
+                event.correlation_id = match.group(1)
+        return event
+
+    def __repr__(self):
+        return "ScenarioProfile(%s)" % self.name
+
+
+def event_string_profile(event_string):
+    """
+    :param event_string: string the event lines of the engine logs contain
+    :type event_string: str
+    :return: the engine profile looking for event_string
+    :rtype: ScenarioProfile
+    """
+    return ScenarioProfile('engine', **dict(PROFILES['engine'], event_regexes=[re.escape(event_string)]))
+
+
+def load_scenario_profiles(profiles):
+    """
+    Build scenario profiles from their configuration
+
+    :param profiles: names of built in profiles or dicts of ScenarioProfile arguments (a dict named as a built in
+                     profile overrides some of its arguments), or a path to a yaml file holding such a list
+    :type profiles: list or str
+    :return: the profiles, a log belongs to the first profile matching its name
+    :rtype: list
+    """
+    if isinstance(profiles, basestring):
+        with open(profiles) as f:
+            profiles = yaml.safe_load(f)
+    loaded = []
+    for profile in profiles or []:
+        if isinstance(profile, basestring):
+            if profile not in PROFILES:
+                raise ValueError("Unknown scenario profile %s, expected one of %s" % (profile, sorted(PROFILES)))
+            profile = dict(PROFILES[profile], name=profile)
+        else:
+            profile = dict(PROFILES.get(profile.get('name'), {}), **profile)
+        loaded.append(ScenarioProfile(**profile))
+    return loaded
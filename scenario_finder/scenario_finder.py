@@ -1,16 +1,51 @@
 import argparse
-import datetime
+import contextlib
+import gzip
+import hashlib
+import heapq
+import io
+import itertools
+import json
 import logging
+import multiprocessing
 import os
+import subprocess
 import sys
+import threading
 from datetime import datetime, timedelta
-from traceback import print_stack
 
 import config
+import event_index
+import events
+import profiles
+from log_dumper.window_extractor import find_offset, next_stamp
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
 
-EXTRACTED_FOLDER_NAME = 'extracted_gz'
 DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 MINUTES_INTERVAL = 5
+# Buffer size of the readers of the logs
+READ_SIZE = 1024 * 1024
+# Decompressing commands of the compressed logs that can't be decompressed in process, their output is read through
+# a pipe so nothing is written to the disk
+DECOMPRESS_CMDS = {
+    '.xz': ['xz', '-dc'],
+    '.zst': ['zstd', '-dc'],
+}
+COMPRESSED_EXTENSIONS = ['.gz'] + sorted(DECOMPRESS_CMDS)
+# Plain text logs are split to byte ranges of about this size, each parsed by its own worker
+RANGE_SIZE = 64 * 1024 * 1024
+# Logs are known to the event index by the hash of their first line, up to this size
+HEAD_SIZE = 4096
+# Events added to the event index in a single transaction, the indexed offset moves with each of them
+INDEX_BATCH_SIZE = 10000
+# Results of the hosts dumps written by log_dumper to the logs directory, tells the host of each log
+DUMP_RESULTS_FILE = "dump_results.json"
+# Files next to the logs that are never logs, e.g. the <log>.window.json of log windows collected by log_dumper
+NOT_LOG_EXTENSIONS = ('.json',)
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -21,105 +56,274 @@ logger = logging.getLogger(__name__)
 
 class ScenarioFinder:
     """
-    Class for searching and storing the needed events from engine logs. can handle gz files as well as plain text files.
+    Class for searching and storing the needed events from engine logs. can handle gz, xz and zst files as well as plain
+    text files, compressed files are decompressed on the fly while parsed. With scenario profiles the events of the logs
+    of other components (vdsm, supervdsm, libvirt) are found in the same pass and merged to one timeline.
     """
 
-    def __init__(self, time_start, path_logs, event_string, scenario_result_file_path):
+    def __init__(self, time_start, path_logs, event_string, scenario_result_file_path, workers=None, index_path=None,
+                 scenario_profiles=None, pool=None):
         self.time_start = time_start
+        # the window of the start time is parsed once, not per parsed line
+        self.datetime_start = datetime.strptime(time_start, DATETIME_FORMAT)
+        self.datetime_end = self.datetime_start + timedelta(minutes=MINUTES_INTERVAL)
         self.path_logs = path_logs
         self.event_string_to_find = event_string
         self.events_found_lst = []  # stores the lines of logs where  event_string_to_find was found
+        self.events = []  # the found events parsed to events.Event records, in the same order
         self.time_start_found = False  # it becomes true when 'time_start' string is found inside parsed logs
         self.scenario_result_file_path = scenario_result_file_path
+        self.workers = workers or multiprocessing.cpu_count()  # processes parsing the logs
+        # multiprocessing.Pool to parse the logs on, by default a pool is created for each parse. Logs added from a
+        # thread other than the main one should be given a pool created by the main thread before any other thread
+        # started, forking while other threads hold locks (e.g. ssh transports) can hang the forked processes.
+        self.pool = pool
+        self.index_path = index_path  # event index file, when given only log data not indexed yet is parsed
+        # what to look for in each type of log, by default event_string in the engine logs
+        if scenario_profiles:
+            self.profiles = profiles.load_scenario_profiles(scenario_profiles)
+        else:
+            self.profiles = [profiles.event_string_profile(event_string)]
+        # Logs can be added while other logs are still being collected (see add_logs), the parsed logs and their
+        # results are kept until finish() merges them
+        self.lock = threading.Lock()
+        self.parsed_files = set()
+        self.file_profiles = {}  # log name -> scenario profile
+        self.results = []  # (first time, events) per parsed task
+        self.indexed_files = {}  # log id in the event index -> scenario profile
 
     def parse_logs(self):
         """
         Main method where all of parsing logic's begins. It calls other methods for different tasks.
         """
         logger.info('Starting to parse files in ' + self.path_logs)
-        logger.info('******* Event sting is: %s', self.event_string_to_find)
+        logger.info('******* Scenario profiles are: %s', self.profiles)
         logger.info('******* Time as input is :%s', self.time_start)
 
         self.check_log_dir_exists(self.path_logs)
+        self.finish()
 
-        all_log_files_lst = os.listdir(self.path_logs)
-        engine_log_files_lst = [x for x in all_log_files_lst if 'engine' in x]
-        engine_log_files_lst.sort(reverse=False)  # now engine logs are sorted in DESC order. engine.log is first, then
-                                                  # the oldest file, and last index will be the most recent.
-        engine_log_files_lst.insert(len(engine_log_files_lst), engine_log_files_lst.pop(0))  # moving [0] element (engine.log)
-                                                                                             # TO last place index
-
-        for file_to_parse in engine_log_files_lst:
-            full_file_name = os.path.join(self.path_logs, file_to_parse)
-            logger.info("About to parse: " + file_to_parse)
-            if file_to_parse.endswith('.gz'):
-                full_file_name = self.extract_gz_file(full_file_name)
-
-                # continue to next file if extraction of gz failed in 'extract' for some reason
-                if full_file_name is None:
+    def add_logs(self, file_names, host=None, skip_outside_window=False):
+        """
+        Parse some of the logs of the logs directory now, e.g. the logs of a host as soon as they were collected while
+        other hosts are still collected. Logs matching no scenario profile and logs parsed already are skipped. Their
+        events are merged with the events of the other logs by finish().
+        :param file_names: Names of logs in the logs directory.
+        :param host: Host the logs came from, for the event index, found from the dump results if None.
+        :param skip_outside_window: Don't parse the logs at all if none of them is within the window of the start time,
+                                    only right when all the logs are parsed at once.
+        """
+        log_files_lst = []
+        with self.lock:
+            for file_name in sorted(set(file_names) - self.parsed_files):
+                if file_name.endswith(NOT_LOG_EXTENSIONS):
                     continue
-
-            try:
-                with open(full_file_name) as f:
-                    for line in f:
-                        if not self.time_start_found:
-                            self.time_start_found = self.find_time_start_string_in_line(line, full_file_name)
-
-                        if self.time_start_found:
-                            self.find_event_string_in_line(full_file_name, line)
-
-            except IOError as e:
-                logger.error("File does not appear to exist: %s\n %s" % (full_file_name, e))
+                # a log belongs to the first profile matching its name
+                for profile in self.profiles:
+                    if profile.files.search(file_name):
+                        log_files_lst.append((file_name, profile))
+                        self.file_profiles[file_name] = profile
+                        self.parsed_files.add(file_name)
+                        break
+        if not log_files_lst:
+            return
+        if self.index_path:
+            # a single writer of the index at a time
+            with self.lock:
+                self.index_logs(log_files_lst, host)
+        else:
+            results = self.find_events(log_files_lst, skip_outside_window)
+            with self.lock:
+                self.results.extend(results)
+
+    def finish(self):
+        """
+        Parse the logs of the logs directory not added yet, merge the events of all logs by time and dump them.
+        """
+        self.add_logs(os.listdir(self.path_logs), skip_outside_window=not self.parsed_files)
+        if self.index_path:
+            found = self.find_indexed_events()
+        else:
+            found = self.merge_events()
+        self.events_found_lst = [line for _, _, line in found]
+        self.events = [profile.parse_event(line, line_time) for line_time, profile, line in found]
 
         logger.info('Finished parsing logs, about to dump the scenario to: ' + self.scenario_result_file_path)
         self.dump_scenario_list_to_file()
 
+    def find_events(self, log_files_lst, skip_outside_window=False):
+        """
+        Parse the logs for the event lines at or after the start time.
+        :param log_files_lst: List of (name, scenario profile) of logs in the logs directory.
+        :param skip_outside_window: Don't parse the logs if none of them is within the window of the start time.
+        :return: List of (time of the first line at or after the start time, list of (time, log name, start offset,
+                 line number, line) of the event lines) per parsed task.
+        """
+        # The logs are split to tasks, a compressed log or a byte range of a plain text log each, parsed on a pool of
+        # processes. Their events are merged by time, so the rotated logs can come in any order.
+        tasks = []
+        first_times = []
+        for file_to_parse, profile in log_files_lst:
+            full_file_name = os.path.join(self.path_logs, file_to_parse)
+            try:
+                first_time, ranges = self.split_log(full_file_name, profile)
+            except (IOError, OSError) as e:
+                logger.error("Failed to read file: %s\n %s" % (full_file_name, e))
+                continue
+            if not ranges:
+                logger.info("No line of %s is after the start time, skipping it" % file_to_parse)
+            first_times.append(first_time)
+            for start_offset, end_offset in ranges:
+                tasks.append((len(tasks), full_file_name, start_offset, end_offset, self.datetime_start, profile))
+
+        # Plain text logs with leading timestamps tell where the start time is without parsing them, if none is within
+        # the window there is nothing to parse (compressed logs and other logs have to be parsed to tell)
+        if skip_outside_window and \
+                not [name for name, profile in log_files_lst if is_compressed(name) or not profile.seekable] and \
+                not [t for t in first_times if t is not None and t <= self.datetime_end]:
+            tasks = []
+
+        logger.info("Parsing %s logs in %s tasks on %s workers" % (len(log_files_lst), len(tasks), self.workers))
+        if len(tasks) > 1 and self.pool is not None:
+            results = self.pool.map(extract_events, tasks, chunksize=1)
+        elif len(tasks) > 1 and self.workers > 1:
+            pool = multiprocessing.Pool(min(self.workers, len(tasks)))
+            try:
+                results = pool.map(extract_events, tasks, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [extract_events(task) for task in tasks]
+
+        # events are keyed by their log name and offset instead of the task index, so events of logs added at different
+        # times merge in the same order as if they were parsed at once
+        return [
+            (first_time, [(line_time, os.path.basename(tasks[index][1]), tasks[index][2], number, line)
+                          for line_time, index, number, line in found])
+            for first_time, found in results
+        ]
+
+    def merge_events(self):
+        """
+        :return: List of (time, scenario profile, line) of the event lines of all parsed logs, sorted by time (with the
+                 fraction of a second), then by log name and offset, empty if the start time was not found.
+        """
+        first_times = [first_time for first_time, _ in self.results if first_time is not None]
+        if not first_times or min(first_times) > self.datetime_end:
+            return []
+        logger.info("Found start time string within defined range of %s minutes: %s Beginning to search for "
+                    "events of %s" % (MINUTES_INTERVAL, min(first_times), self.profiles))
+        self.time_start_found = True
+        return [(line_time, self.file_profiles[file_name], line)
+                for line_time, file_name, _, _, line in heapq.merge(*[found for _, found in self.results])]
+
+    def index_logs(self, log_files_lst, host=None):
+        """
+        Bring the event index up to date with logs, parsing only the data of each log after its indexed offset.
+        :param log_files_lst: List of (name, scenario profile) of logs in the logs directory.
+        :param host: Host the logs came from, found from the dump results if None.
+        """
+        hosts = self.log_hosts() if host is None else {}
+        index = event_index.EventIndex(self.index_path)
+        try:
+            for file_to_parse, profile in log_files_lst:
+                full_file_name = os.path.join(self.path_logs, file_to_parse)
+                try:
+                    indexed = index_log(index, full_file_name, hosts.get(file_to_parse, host or ''), profile)
+                except (IOError, OSError) as e:
+                    logger.error("Failed to read file: %s\n %s" % (full_file_name, e))
+                    continue
+                if indexed is not None:
+                    self.indexed_files[indexed.file_id] = profile
+        finally:
+            index.close()
+
+    def find_indexed_events(self):
+        """
+        Find the event lines at or after the start time of the indexed logs in the event index.
+        :return: List of (time, scenario profile, line) of the event lines, sorted by time, empty if the start time was
+                 not found.
+        """
+        file_ids = sorted(self.indexed_files)
+        index = event_index.EventIndex(self.index_path)
+        try:
+            if not index.covers(file_ids, self.datetime_start, self.datetime_end):
+                return []
+            logger.info("Found start time string within defined range of %s minutes in the index %s"
+                        % (MINUTES_INTERVAL, self.index_path))
+            self.time_start_found = True
+            return [
+                (datetime.strptime(line_time, event_index.TIME_FORMAT) if line_time else None,
+                 self.indexed_files[file_id], line)
+                for _, file_id, line_time, line in index.query(time_from=self.datetime_start, file_ids=file_ids)
+            ]
+        finally:
+            index.close()
+
+    def log_hosts(self):
+        """
+        Tell the host of each log in the logs directory, from the dump results written by log_dumper.
+        :return: Dict of log name to host ip, a log named like a dumped log with a suffix (e.g. a rotated log) belongs
+                 to the host of that log. Empty if there are no dump results.
+        """
+        try:
+            with open(os.path.join(self.path_logs, DUMP_RESULTS_FILE)) as f:
+                results = json.load(f)
+        except (IOError, ValueError):
+            return {}
+        dumped = {}
+        for result in results:
+            for log in result.get('logs') or []:
+                dumped[os.path.basename(log)] = result['host_ip']
+        hosts = {}
+        for name in os.listdir(self.path_logs):
+            prefixes = [dumped_name for dumped_name in dumped if name.startswith(dumped_name)]
+            if prefixes:
+                hosts[name] = dumped[max(prefixes, key=len)]
+        return hosts
+
     def dump_scenario_list_to_file(self):
         """
-        Writes the list of found event lines (which were extracted from logs) to a txt file.
+        Writes the list of found event lines (which were extracted from logs) to a txt file, and the parsed events next
+        to it as JSON lines (<name>.jsonl) and as a NumPy structured array (<name>.npy, when numpy is installed).
         """
+        base_path = os.path.splitext(self.scenario_result_file_path)[0]
         try:
             with open(self.scenario_result_file_path, 'w') as f:
                 f.writelines(self.events_found_lst)
                 logger.info("Wrote scenario events to file: " + self.scenario_result_file_path)
+            events.write_jsonl(self.events, base_path + events.JSONL_EXTENSION)
+            if events.write_npy(self.events, base_path + events.NPY_EXTENSION):
+                logger.info("Wrote scenario events columns to file: " + base_path + events.NPY_EXTENSION)
+            else:
+                logger.info("numpy is not installed, scenario events columns are not written")
         except IOError as e:
             logger.error("Failed to dump scenarios list to file: %s \n %s" % (self.scenario_result_file_path, e))
 
-    def find_event_string_in_line(self, full_file_name, line):
+    def split_log(self, full_file_name, profile):
         """
-        Finds the events string inside a line from some log file, and puts it to a list.
-        :param full_file_name: Full path to a plain text file (could be extracted GZ). used only for logging here.
-        :param line: Line from a file which needs to be parsed for the events string.
+        Split a log to the byte ranges parsed by the workers. Plain text logs start at the first line at or after the
+        start time, found by binary search on their byte offsets (log lines are time ordered), and are split to ranges
+        of about RANGE_SIZE starting at timestamped lines. Compressed logs can't be seeked and are parsed whole, as are
+        logs whose lines don't start with their timestamp.
+        :param full_file_name: Full path to a log.
+        :param profile: Scenario profile of the log.
+        :return: Tuple of (time of the first line at or after the start time, None if unknown (log parsed whole) or if
+                 there is no such line, list of (start offset, end offset) ranges), the end offset is None for a log
+                 parsed whole, no ranges if all the lines of the log are older than the start time.
         """
-        if self.event_string_to_find in line:
-            logger.debug('Found string: %s inside line. appending it to events_found_lst. File: %s The line: %s'
-                         % (self.event_string_to_find, full_file_name, line))
-            self.events_found_lst.append(line)
-
-    def find_time_start_string_in_line(self, line, full_file_name):
-        """
-        Finds the start time string inside a line from a log file. Returns true if found, false if not found.
-        :param line: Line from a file which needs to be parsed for the time string.
-        :param full_file_name: full_file_name: Full path to a plain text file (could be extracted GZ).
-        Used only for logging here.
-        :return:  true if found, false if not found.
-        """
-        datetime_object_start_time = datetime.strptime(self.time_start, DATETIME_FORMAT)
-        try:
-            datetime_str_in_line = line.split(',')[0]
-            datetime_object_in_line = datetime.strptime(datetime_str_in_line, DATETIME_FORMAT)
-
-            # True if timestamp in line is between start time and start time + min
-            # example: '2018-07-25 03:11:35' <= '2018-07-25 03:15:35' <= '2018-07-25 03:16:35'
-            if datetime_object_start_time <= datetime_object_in_line <= \
-                    datetime_object_start_time + timedelta(minutes=MINUTES_INTERVAL):
-                logger.info("Found start time string within defined range of %s minutes: %s in file: %s Beginning to search for event string: %s"
-                            % (MINUTES_INTERVAL, datetime_str_in_line, os.path.basename(full_file_name), self.event_string_to_find))
-                return True
-            return False
-
-        except:
-            return False
+        if is_compressed(full_file_name) or not profile.seekable:
+            return None, [(0, None)]
+        with open(full_file_name, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            offset = find_offset(f, size, profile.log_time(self.datetime_start).strftime(DATETIME_FORMAT))
+            f.seek(offset)
+            first_time = profile.line_time(f.readline())
+            boundaries = [offset]
+            while boundaries[-1] < size:
+                boundaries.append(max(next_stamp(f, boundaries[-1] + RANGE_SIZE)[0], boundaries[-1] + 1))
+        return first_time, list(zip(boundaries, boundaries[1:]))
 
     def check_log_dir_exists(self, dir_path):
         """
@@ -132,36 +336,171 @@ class ScenarioFinder:
             logger.error("Not a valid directory on local machine: " + dir_path)
             sys.exit()
 
-    def extract_gz_file(self, full_file_name):
-        """
-        Extracts a gz file to folder name as defined in 'EXTRACTED_FOLDER_NAME' inside the folder where the logs reside.
-        For example: '/home/ilan/tmp/bughunter/extracted_gz/'
-        :param full_file_name: Full path to a GZ file.
-        :return: Full path to the extracted file inside 'extracted' folder.
-        """
-        full_folder_path_for_extracted_file = os.path.join(self.path_logs,
-                                                           EXTRACTED_FOLDER_NAME)  # e.g /some/dir/extracted
 
-        if not os.path.exists(full_folder_path_for_extracted_file):
-            logger.info(
-                "Extraction folder for gz files does not exist. attempting to create it. %s"
-                % full_folder_path_for_extracted_file)
-            os.makedirs(full_folder_path_for_extracted_file)
+def is_compressed(path):
+    """
+    :param path: Full path to a log.
+    :return: True if the log is compressed, compressed logs are read from their start only.
+    """
+    return os.path.splitext(path)[1] in COMPRESSED_EXTENSIONS
 
-        gz_file_name = os.path.basename(full_file_name)  # e.g engine.log-20180718.gz
-        full_file_path_for_extracted_file = os.path.join(
-            full_folder_path_for_extracted_file, gz_file_name.strip('.gz'))  # e.g /x/y/extracted/engine.log-20180718
 
-        logger.info("Attempting to extract file %s to: %s" % (gz_file_name, full_file_path_for_extracted_file))
-        try:
-            os.system('gunzip -c %s > %s' % (full_file_name, full_file_path_for_extracted_file))
-        except Exception as e:
-            logger.error("Failed to extract file %s to path %s\n will continue to next file\n %s"
-                         % (full_file_name, full_file_path_for_extracted_file, e))
-            print_stack()
+def index_log(index, full_file_name, host, profile):
+    """
+    Add the event lines of a log that are not in the event index yet to the index. Plain text logs are read from their
+    indexed offset, compressed logs are decompressed up to it without parsing. A log shorter than its indexed offset
+    was rewritten and is indexed again from its start, the partial last line of a plain text log is left for the next
+    run.
+    :param index: The event index.
+    :param full_file_name: Full path to a log.
+    :param host: Host the log came from.
+    :param profile: Scenario profile of the log.
+    :return: The indexing state of the log (event_index.IndexedFile), None if its first line is not complete yet.
+    """
+    compressed = is_compressed(full_file_name)
+    with open_log(full_file_name) as f:
+        # the head is read apart from the lines, a first line longer than HEAD_SIZE is hashed by its start
+        head = f.read(HEAD_SIZE)
+        if not head or ('\n' not in head and len(head) < HEAD_SIZE and not compressed):
             return None
+        head_line = head[:head.find('\n') + 1] or head
+        indexed = index.get_file(host, hashlib.sha1(head_line).hexdigest(), profile.key, full_file_name)
+        position = indexed.offset
+        if not compressed:
+            if os.fstat(f.fileno()).st_size < position:
+                index.reset_file(indexed)
+                return index_log(index, full_file_name, host, profile)
+            f.seek(position)
+            lines = f
+        elif position <= len(head):
+            # compressed logs can't seek back, the rest of the head is completed to whole lines
+            lines = itertools.chain(io.BytesIO(head[position:] + f.readline()), f)
+        else:
+            left = position - len(head)
+            while left > 0:
+                data = f.read(min(READ_SIZE, left))
+                if not data:
+                    break
+                left -= len(data)
+            if left > 0:
+                index.reset_file(indexed)
+                return index_log(index, full_file_name, host, profile)
+            lines = f
+
+        first_time = indexed.first_time
+        last_time = indexed.last_time
+        line_time = index.last_event_time(indexed)
+        line_time = datetime.strptime(line_time, event_index.TIME_FORMAT) if line_time else None
+        start_position = position
+        found = []
+        last_line = None
+        for line in lines:
+            if not compressed and not line.endswith('\n'):
+                break
+            if first_time is None:
+                line_time = profile.line_time(line)
+                first_time = event_index.format_time(line_time)
+            if profile.is_event(line):
+                # an event line without a timestamp goes right after the previous one
+                line_time = profile.line_time(line) or line_time
+                event = profile.parse_event(line, line_time)
+                found.append((position, event_index.format_time(line_time), event.code or None,
+                              event.correlation_id or None, line))
+            position += len(line)
+            last_line = line
+            if len(found) >= INDEX_BATCH_SIZE:
+                last_time = event_index.format_time(profile.line_time(last_line)) or last_time
+                index.add_events(indexed, found, position, first_time, last_time)
+                found = []
+        if last_line is not None:
+            last_time = event_index.format_time(profile.line_time(last_line)) or last_time
+            index.add_events(indexed, found, position, first_time, last_time)
+    logger.info("Indexed %s new bytes of %s" % (position - start_position, full_file_name))
+    return indexed
+
+
+def iter_range(f, start_offset, end_offset):
+    """
+    Iterate the lines of a plain text log starting within a byte range.
+    :param f: Plain text log open for reading.
+    :param start_offset: Offset of the first line.
+    :param end_offset: Lines starting at or after this offset are not part of the range.
+    """
+    f.seek(start_offset)
+    position = start_offset
+    for line in f:
+        if position >= end_offset:
+            return
+        position += len(line)
+        yield line
 
-        return full_file_path_for_extracted_file
+
+def extract_events(task):
+    """
+    Worker of ScenarioFinder.parse_logs, finds the event lines of a whole log or of a byte range of a plain text log,
+    starting at the first line at or after the start time.
+    :param task: Tuple of (task index, full path to a log, start offset, end offset or None for a whole log, start time,
+                 scenario profile of the log).
+    :return: Tuple of (time of the first line at or after the start time or None if there is no such line, list of
+             (time, task index, line number, line) of the event lines, sorted).
+    """
+    index, full_file_name, start_offset, end_offset, datetime_start, profile = task
+    # bound once, they are called for every line
+    is_event = profile.gate.search if profile.gate_only else profile.is_event
+    literal = profile.literal
+    get_line_time = profile.line_time
+    first_time = line_time = None
+    found = []
+    try:
+        with open_log(full_file_name) as f:
+            lines = f if end_offset is None else iter_range(f, start_offset, end_offset)
+            for number, line in enumerate(lines):
+                if first_time is None:
+                    line_time = get_line_time(line)
+                    if line_time is None or line_time < datetime_start:
+                        continue
+                    first_time = line_time
+                if (literal in line) if literal is not None else is_event(line):
+                    # only event lines are timed, an event line without a timestamp goes right after the previous one
+                    line_time = get_line_time(line) or line_time
+                    found.append((line_time, index, number, line))
+    except (IOError, OSError) as e:
+        logger.error("Failed to read file: %s\n %s" % (full_file_name, e))
+    return first_time, found
+
+
+@contextlib.contextmanager
+def open_log(path):
+    """
+    Open a log for reading line by line, compressed logs (.gz, .xz, .zst) are decompressed on the fly while read.
+    :param path: Full path to a plain text or compressed log.
+    :return: Context manager of a line iterable.
+    """
+    _, ext = os.path.splitext(path)
+    if ext == '.gz':
+        with contextlib.closing(io.BufferedReader(gzip.GzipFile(path, 'rb'), READ_SIZE)) as f:
+            yield f
+    elif ext == '.xz' and lzma is not None:
+        with contextlib.closing(io.BufferedReader(lzma.LZMAFile(path, 'rb'), READ_SIZE)) as f:
+            yield f
+    elif ext in DECOMPRESS_CMDS:
+        with open(path, 'rb') as compressed:
+            process = subprocess.Popen(
+                DECOMPRESS_CMDS[ext], stdin=compressed, stdout=subprocess.PIPE, bufsize=READ_SIZE
+            )
+            try:
+                yield process.stdout
+            finally:
+                process.stdout.close()
+                # the process may still be writing when the reading stopped early
+                if process.poll() is None:
+                    process.kill()
+                if process.wait() > 0:
+                    logger.error("Failed to decompress %s, %s exited with %s", path, DECOMPRESS_CMDS[ext][0],
+                                 process.returncode)
+    else:
+        with open(path) as f:
+            yield f
 
 
 def main():
@@ -170,6 +509,9 @@ def main():
 
     e.g python scenario_finder.py -t "2018-07-25 03:08:41" -p "/home/ilan/tmp/bughunter" -e "EVENT_ID"
 
+    or, to list the events of an index without parsing any log:
+        python scenario_finder.py -i "/home/ilan/tmp/events.sqlite" -t "2018-07-25 03:08:41" -T "2018-07-25 03:20:00"
+
     Options -
         * -t, --time_start : Test start time. states starting from which time we should search for events. it must be in
                             the following format: '%Y-%m-%d %H:%M:%S'
@@ -179,6 +521,13 @@ def main():
         * -s, --scenario_result_file_path : Full path to a file in which we want to store the events list. By default
                                             It would be: config.LOCALHOST_LOGS_PATH/scenario_file_<date_time_now>.txt
                                             Where date time format is '%Y-%m-%d %H:%M:%S'.
+        * -w, --workers : Number of processes parsing the logs, default is the number of cpus.
+        * -i, --index : Event index file. With -p the logs data not indexed yet is added to the index and the events
+                        are taken from it, without -p the index is queried and the matching event lines are printed.
+        * -T, --time_end : Query end time, events before it are printed, same format as -t.
+        * --code, --host, --correlation_id : Query only events of this EVENT_ID code, host or correlation id.
+        * -P, --profiles : Scenario profiles (engine, vdsm, supervdsm, libvirt) whose events are looked for in one pass
+                           over the logs, or a yaml file of profiles. Replaces -e.
 
     """
     datetime_now = datetime.now().strftime(DATETIME_FORMAT)
@@ -191,10 +540,11 @@ def main():
                              "For example: '2018-07-19 10:25:17'", required=True)
 
     parser.add_argument("-p", "--path_logs", action="store", dest="path_logs",
-                        help="Full LOCAL folder path of logs that need to be parsed.", required=True)
+                        help="Full LOCAL folder path of logs that need to be parsed. Required unless querying an index.")
 
     parser.add_argument("-e", "--events_to_grab", action="store", dest="event_string",
-                        help="This is the string we are looking for, inside the logs", required=True)
+                        help="This is the string we are looking for, inside the logs. Required with -p unless -P is "
+                             "given.")
 
     parser.add_argument("-s", "--scenario_result_file_path", action="store", help="Full path for a result file where we"
                         " wish to save the scenario event. This is optional arg. if not specified,"
@@ -202,6 +552,22 @@ def main():
                         dest="scenario_result_file_path", nargs="?",
                         const="%s/scenario_file_%s.txt" % (config.LOCALHOST_LOGS_PATH, datetime_now),
                         default="%s/scenario_file_%s.txt" % (config.LOCALHOST_LOGS_PATH, datetime_now))
+    parser.add_argument("-w", "--workers", action="store", type=int, dest="workers",
+                        help="Number of processes parsing the logs, default is the number of cpus.", default=None)
+    parser.add_argument("-i", "--index", action="store", dest="index_path", default=None,
+                        help="Event index file. With -p only logs data not indexed yet is parsed, without -p the "
+                             "index is queried.")
+    parser.add_argument("-T", "--time_end", action="store", dest="time_end", default=None,
+                        help="Query end time, in the same format as -t. Used without -p.")
+    parser.add_argument("--code", action="store", dest="code", default=None,
+                        help="Query only events of this EVENT_ID code. Used without -p.")
+    parser.add_argument("--host", action="store", dest="host", default=None,
+                        help="Query only events from the logs of this host. Used without -p.")
+    parser.add_argument("--correlation_id", action="store", dest="correlation_id", default=None,
+                        help="Query only events of this correlation id. Used without -p.")
+    parser.add_argument("-P", "--profiles", action="store", dest="scenario_profiles", nargs="+", default=None,
+                        help="Scenario profiles to look for events with, any of %s, or a single yaml file of "
+                             "profiles." % ", ".join(sorted(profiles.PROFILES)))
     # const sets the default when there are 0 arguments. If you want to set -s to some value even if no -s is specified,
     # then include default=..  nargs=? means 0-or-1 arguments
 
@@ -212,9 +578,31 @@ def main():
     except:
         parser.error("Argument -t must be in the following format: " + DATETIME_FORMAT)
 
+    if args.index_path and not args.path_logs:
+        try:
+            time_end = datetime.strptime(args.time_end, DATETIME_FORMAT) if args.time_end else None
+        except ValueError:
+            parser.error("Argument -T must be in the following format: " + DATETIME_FORMAT)
+        index = event_index.EventIndex(args.index_path)
+        try:
+            for _, _, _, line in index.query(
+                time_from=datetime.strptime(args.time_start, DATETIME_FORMAT), time_to=time_end, code=args.code,
+                host=args.host, correlation_id=args.correlation_id
+            ):
+                sys.stdout.write(line)
+        finally:
+            index.close()
+        return
+
+    if not args.path_logs or not (args.event_string or args.scenario_profiles):
+        parser.error("Arguments -p and -e (or -P) are required unless querying an index")
+    scenario_profiles = args.scenario_profiles
+    if scenario_profiles and len(scenario_profiles) == 1 and os.path.isfile(scenario_profiles[0]):
+        scenario_profiles = scenario_profiles[0]
     scenario_finder = ScenarioFinder(time_start=args.time_start, path_logs=args.path_logs,
                                      event_string=args.event_string,
-                                     scenario_result_file_path=args.scenario_result_file_path)
+                                     scenario_result_file_path=args.scenario_result_file_path, workers=args.workers,
+                                     index_path=args.index_path, scenario_profiles=scenario_profiles)
     scenario_finder.parse_logs()
 
 
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import pytest
+import requests
+
+from env_state import env_state
+
+
+def fake_fetch_resource(failing):
+    def fetch_resource(self, session, resource, timeout):
+        if resource in failing:
+            raise requests.exceptions.HTTPError("%s failed" % resource)
+        status = 'down' if resource == 'vms' and failing else 'up'
+        return [
+            {'id': '%s-%d' % (resource, i), 'name': '%s%d' % (resource, i),
+             'status': status}
+            for i in range(2)
+        ]
+    return fetch_resource
+
+
+class TestEnvStateDiff(object):
+
+    def test_failed_resource_type(self, tmpdir, monkeypatch):
+        start = str(tmpdir.join("env_state_start"))
+        issue = str(tmpdir.join("env_state_at_issue"))
+        monkeypatch.setattr(
+            env_state.EnvState, "fetch_resource", fake_fetch_resource([])
+        )
+        env_state.get_resources_stats("engine", "pass", start)
+        monkeypatch.setattr(
+            env_state.EnvState, "fetch_resource",
+            fake_fetch_resource(['disks'])
+        )
+        with pytest.raises(requests.exceptions.HTTPError):
+            env_state.get_resources_stats("engine", "pass", issue)
+
+        # the snapshot of the other resource types is still written
+        snapshot = env_state.load_snapshot(
+            issue + env_state.SNAPSHOT_EXTENSION
+        )
+        assert 'disks' not in snapshot
+        assert len(snapshot) == len(env_state.RESOURCE_KEYS) - 1
+
+        diff = env_state.write_snapshots_diff(
+            start + env_state.SNAPSHOT_EXTENSION,
+            issue + env_state.SNAPSHOT_EXTENSION,
+            str(tmpdir.join("env_state_diff.json")),
+        )
+        assert diff['summary'] == {
+            'vms': {'added': 0, 'removed': 0, 'changed': 2},
+        }
+        assert [
+            (change['name'], change['before']['status'],
+             change['after']['status'])
+            for change in diff['resources']['vms']['changed']
+        ] == [('vms0', 'up', 'down'), ('vms1', 'up', 'down')]
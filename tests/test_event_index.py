@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+import gzip
+import shutil
+from datetime import datetime
+
+from scenario_finder import event_index
+from scenario_finder.event_index import EventIndex
+from scenario_finder.scenario_finder import ScenarioFinder
+
+
+def engine_line(second, number, code="CODE", correlation_id="corr"):
+    return (
+        "2018-07-25 03:05:%02d,%03d+03 INFO  [org.A] (task-1) [%s] "
+        "EVENT_ID: %s(%d), msg %d\n"
+        % (second, number % 1000, correlation_id, code, number, number)
+    )
+
+
+def plain_line(second, number):
+    return "2018-07-25 03:05:%02d,000+03 DEBUG [org.B] plain %d\n" % (
+        second, number
+    )
+
+
+def event(index, *args):
+    time = datetime(2018, 7, 25, 3, 5, args[0])
+    return (
+        index, event_index.format_time(time), args[1], args[2],
+        "line %d\n" % index,
+    )
+
+
+class TestEventIndex(object):
+
+    def test_get_file(self, tmpdir):
+        index = EventIndex(str(tmpdir.join("index.sqlite")))
+        try:
+            indexed = index.get_file("host1", "head", "EVENT_ID", "/a/log")
+            assert indexed.offset == 0
+            same = index.get_file("host1", "head", "EVENT_ID", "/b/log")
+            assert same.file_id == indexed.file_id
+            assert index.db.execute(
+                "SELECT path FROM files WHERE id = ?", (indexed.file_id,)
+            ).fetchone() == ("/b/log",)
+            for other in (
+                ("host2", "head", "EVENT_ID"), ("host1", "head2", "EVENT_ID"),
+                ("host1", "head", "ERROR"),
+            ):
+                assert index.get_file(*other + ("/a/log",)).file_id != \
+                    indexed.file_id
+        finally:
+            index.close()
+
+    def test_query(self, tmpdir):
+        path = str(tmpdir.join("index.sqlite"))
+        index = EventIndex(path)
+        try:
+            first = index.get_file("host1", "head1", "EVENT_ID", "/log1")
+            second = index.get_file("host2", "head2", "EVENT_ID", "/log2")
+            index.add_events(first, [
+                event(0, 1, "A", "c1"), event(10, 3, "B", "c2"),
+            ], 20, "first", "last")
+            index.add_events(second, [event(0, 2, "A", "c2")], 10, "f", "l")
+            assert first.offset == 20
+        finally:
+            index.close()
+
+        # the events are kept across runs
+        index = EventIndex(path)
+        try:
+            def lines(**filters):
+                return [row[-1] for row in index.query(**filters)]
+
+            assert lines() == ["line 0\n", "line 0\n", "line 10\n"]
+            assert [row[0] for row in index.query()] == [
+                "host1", "host2", "host1",
+            ]
+            assert lines(time_from=datetime(2018, 7, 25, 3, 5, 2)) == [
+                "line 0\n", "line 10\n",
+            ]
+            assert lines(time_to=datetime(2018, 7, 25, 3, 5, 2)) == [
+                "line 0\n",
+            ]
+            assert lines(code="A", host="host2") == ["line 0\n"]
+            assert lines(correlation_id="c2") == ["line 0\n", "line 10\n"]
+            assert lines(file_ids=[first.file_id]) == [
+                "line 0\n", "line 10\n",
+            ]
+            assert lines(file_ids=[]) == []
+            assert index.last_event_time(first) == event_index.format_time(
+                datetime(2018, 7, 25, 3, 5, 3)
+            )
+
+            index.reset_file(first)
+            assert first.offset == 0
+            assert lines() == ["line 0\n"]
+        finally:
+            index.close()
+
+    def test_covers(self, tmpdir):
+        index = EventIndex(str(tmpdir.join("index.sqlite")))
+        try:
+            indexed = index.get_file("host1", "head", "EVENT_ID", "/log")
+            index.add_events(
+                indexed, [], 10,
+                event_index.format_time(datetime(2018, 7, 25, 3, 0)),
+                event_index.format_time(datetime(2018, 7, 25, 3, 10)),
+            )
+            assert index.covers(
+                [indexed.file_id], datetime(2018, 7, 25, 3, 5),
+                datetime(2018, 7, 25, 3, 20),
+            )
+            assert not index.covers(
+                [indexed.file_id], datetime(2018, 7, 25, 3, 11),
+                datetime(2018, 7, 25, 3, 20),
+            )
+            assert not index.covers(
+                [], datetime(2018, 7, 25, 3, 5), datetime(2018, 7, 25, 3, 20)
+            )
+        finally:
+            index.close()
+
+
+class TestIndexedScenarioFinder(object):
+
+    def write_log(self, path, seconds, mode="w"):
+        with open(str(path), mode) as f:
+            for second in seconds:
+                f.write(plain_line(second, second))
+                f.write(engine_line(second, second, code="CODE_%d" % second))
+
+    def find(self, tmpdir, index_path=None):
+        finder = ScenarioFinder(
+            "2018-07-25 03:05:00", str(tmpdir.join("logs")), "EVENT_ID",
+            str(tmpdir.join("scenario.txt")), workers=1,
+            index_path=index_path,
+        )
+        finder.parse_logs()
+        return finder
+
+    def check(self, tmpdir):
+        """
+        Find the events with and without the index, which must agree
+        """
+        indexed = self.find(tmpdir, str(tmpdir.join("index.sqlite")))
+        parsed = self.find(tmpdir)
+        assert indexed.time_start_found and parsed.time_start_found
+        assert indexed.events_found_lst == parsed.events_found_lst
+        assert [e.to_dict() for e in indexed.events] == \
+            [e.to_dict() for e in parsed.events]
+        return indexed.events_found_lst
+
+    def indexed_files(self, tmpdir):
+        index = EventIndex(str(tmpdir.join("index.sqlite")))
+        try:
+            return index.db.execute(
+                "SELECT path, offset FROM files ORDER BY id"
+            ).fetchall()
+        finally:
+            index.close()
+
+    def test_appended_log(self, tmpdir):
+        log = tmpdir.mkdir("logs").join("engine.log")
+        self.write_log(log, range(0, 10))
+        assert len(self.check(tmpdir)) == 10
+        size = log.size()
+        self.write_log(log, range(10, 20), mode="a")
+        assert len(self.check(tmpdir)) == 20
+        assert self.indexed_files(tmpdir) == [(str(log), log.size())]
+        assert log.size() > size
+
+    def test_partial_last_line(self, tmpdir):
+        log = tmpdir.mkdir("logs").join("engine.log")
+        self.write_log(log, range(0, 10))
+        partial = engine_line(30, 30)
+        log.write(partial[:20], mode="a")
+        assert len(self.check(tmpdir)) == 10
+        log.write(partial[20:], mode="a")
+        lines = self.check(tmpdir)
+        assert lines[-1] == partial
+
+    def test_rotated_and_compressed_log(self, tmpdir):
+        logs = tmpdir.mkdir("logs")
+        log = logs.join("engine.log")
+        self.write_log(log, range(0, 10))
+        self.check(tmpdir)
+        with open(str(log), "rb") as src:
+            with gzip.open(str(logs.join("engine.log-1.gz")), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        self.write_log(log, range(10, 20))
+        assert len(self.check(tmpdir)) == 20
+        # the compressed log is known by its first line, not indexed again
+        files = self.indexed_files(tmpdir)
+        assert len(files) == 2
+        assert files[0][0] == str(logs.join("engine.log-1.gz"))
+
+    def test_rewritten_log(self, tmpdir):
+        log = tmpdir.mkdir("logs").join("engine.log")
+        self.write_log(log, range(0, 10))
+        self.check(tmpdir)
+        self.write_log(log, range(0, 3))
+        assert len(self.check(tmpdir)) == 3
+
+    def test_long_first_line(self, tmpdir):
+        logs = tmpdir.mkdir("logs")
+        log = logs.join("engine.log")
+        log.write(engine_line(0, 0)[:-1] + " x" * 4096 + "\n")
+        self.write_log(log, range(1, 10), mode="a")
+        assert len(self.check(tmpdir)) == 10
+        self.write_log(log, range(10, 20), mode="a")
+        assert len(self.check(tmpdir)) == 20
+        assert self.indexed_files(tmpdir) == [(str(log), log.size())]
+        with open(str(log), "rb") as src:
+            with gzip.open(str(logs.join("engine.log-1.gz")), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        self.write_log(log, range(20, 30))
+        assert len(self.check(tmpdir)) == 30
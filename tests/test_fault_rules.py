@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+
+import pytest
+
+from listener import fault_rules
+from listener.fault_rules import (
+    FaultRule, FaultRuleSet, has_group_refs, literals_regex,
+    load_fault_rules, required_literal,
+)
+from listener.line_matcher import LineMatcher
+
+RULES_FILE = os.path.join(
+    os.path.dirname(fault_rules.__file__), "fault_rules.yaml"
+)
+
+
+def names(rules):
+    return [rule.name for rule in rules]
+
+
+class TestRequiredLiteral(object):
+
+    @pytest.mark.parametrize(("regex", "literal"), [
+        (r"Traceback", "Traceback"),
+        (r"vdsm\.storage\.exception\.\w+", "vdsm.storage.exception."),
+        (r"Command '\S+' execution failed", "' execution failed"),
+        (r"\bERROR\b", "ERROR"),
+        (r"ERROR|WARN", ""),
+        (r"(?i)traceback", ""),
+        (r"[", ""),
+    ])
+    def test_required_literal(self, regex, literal):
+        assert required_literal(regex) == literal
+
+
+class TestHasGroupRefs(object):
+
+    @pytest.mark.parametrize(("regex", "refs"), [
+        (r"(\w+)=\1", True),
+        (r"(?P<key>\w+)=(?P=key)", True),
+        (r"(a)?(?(1)b|c)", True),
+        (r"x(?:(a)|b)+\1", True),
+        (r"(\w+)=(\w+)", False),
+        (r"[\1]", False),
+    ])
+    def test_has_group_refs(self, regex, refs):
+        assert has_group_refs(regex) == refs
+
+
+class TestLiteralsRegex(object):
+
+    def test_any_literal_matches(self):
+        literals = ["libvirtError", "lib.so", "SanlockException"]
+        gate = re.compile(literals_regex(literals))
+        for literal in literals:
+            assert gate.search("a %s b" % literal).group() == literal
+        assert gate.search("libvirt lib-so Sanlock") is None
+
+    def test_shorter_literal_is_enough(self):
+        assert literals_regex(["ERROR", "ERR", "ERRNO"]) == "ERR"
+        assert literals_regex(["ERR", "ERROR"]) == "ERR"
+
+
+class TestFaultRuleSet(object):
+    rules = [
+        FaultRule("traceback", r"Traceback \(most recent call last\)"),
+        FaultRule("error", r"\bERROR\b", action="log"),
+        FaultRule("storage", r"vdsm\.storage\.exception\.(\w+)"),
+    ]
+
+    def test_every_matching_rule(self):
+        rule_set = FaultRuleSet(self.rules)
+        assert rule_set._combined is not None
+        line = "ERROR vdsm.storage.exception.Failed Traceback " \
+               "(most recent call last)"
+        assert names(rule_set.match_line(line)) == [
+            "traceback", "error", "storage",
+        ]
+        assert names(rule_set.match_line("INFO ERROR")) == ["error"]
+        assert rule_set.match_line("INFO ERRORS") == []
+
+    def test_gate_of_rules_without_literal(self):
+        rule_set = FaultRuleSet(self.rules + [FaultRule("any", r"WARN|FAIL")])
+        assert rule_set.gate.pattern != literals_regex(
+            [rule.literal for rule in self.rules]
+        )
+        assert rule_set.gate.search("a FAIL b")
+        assert names(rule_set.match_line("a FAIL b")) == ["any"]
+
+    def test_inline_flags_are_matched_one_by_one(self):
+        rule_set = FaultRuleSet(
+            self.rules + [FaultRule("oom", r"(?i)out of memory")]
+        )
+        assert rule_set._combined is None
+        assert names(rule_set.match_line("ERROR Out Of Memory")) == [
+            "error", "oom",
+        ]
+
+    def test_group_refs_are_matched_one_by_one(self):
+        repeated = FaultRule("repeated", r"\b(\w+) \1\b")
+        rule_set = FaultRuleSet(self.rules + [repeated])
+        assert rule_set._combined is not None
+        assert rule_set.gate.search("failed failed")
+        assert names(rule_set.match_line("ERROR failed failed")) == [
+            "error", "repeated",
+        ]
+        assert names(rule_set.match_line("ERROR failed again")) == ["error"]
+        assert rule_set.match_line("storage failed again") == []
+
+    def test_group_refs_with_literal(self):
+        rule_set = FaultRuleSet([
+            FaultRule("any", r"WARN|FAIL"),
+            FaultRule("same", r"(\w+)=\1 mismatch"),
+        ])
+        assert names(rule_set.match_line("a=a mismatch")) == ["same"]
+        assert rule_set.match_line("a=b mismatch") == []
+        assert names(rule_set.match_line("FAIL a=a mismatch")) == [
+            "any", "same",
+        ]
+
+    def test_rules_over_the_groups_limit(self):
+        rules = [
+            FaultRule("rule%d" % i, r"code%d\b(\w*)" % i) for i in range(120)
+        ]
+        rule_set = FaultRuleSet(rules)
+        assert len(rule_set._combined) > 1
+        assert names(rule_set.match_line("code7 code119 code1000")) == [
+            "rule7", "rule119",
+        ]
+
+    def test_invalid_rules(self):
+        with pytest.raises(ValueError):
+            FaultRule("bad", "x", severity="fatal")
+        with pytest.raises(ValueError):
+            FaultRule("bad", "x", action="mail")
+        with pytest.raises(ValueError):
+            FaultRuleSet([])
+
+
+class TestLoadFaultRules(object):
+
+    def test_sample_rules_file(self):
+        rule_set = load_fault_rules(RULES_FILE, fault_regex="FAULT_X")
+        assert rule_set.rules[-1].name == "fault_regex"
+        assert names(rule_set.match_line(
+            "2018-07-25 vdsm.storage.exception.VolumeError: FAULT_X"
+        )) == ["vdsm_storage_exception", "fault_regex"]
+
+    def test_rule_dicts(self):
+        rule_set = load_fault_rules([
+            {"name": "oom", "regex": "oom-killer", "severity": "critical"},
+        ])
+        assert [(rule.name, rule.severity, rule.action)
+                for rule in rule_set.rules] == [("oom", "critical", "dump")]
+
+
+class TestLineMatcherRules(object):
+
+    def test_feed_rules(self):
+        matcher = LineMatcher(FaultRuleSet([
+            FaultRule("traceback", r"^Traceback"),
+            FaultRule("error", r"\bERROR\b"),
+        ]))
+        matches = matcher.feed(
+            "INFO Traceback\nTraceback ERROR\nERRORS\nERR"
+        )
+        assert matches == ["Traceback ERROR"]
+        assert [(line, names(rules))
+                for line, rules in matcher.feed_rules("OR x\n")] == [
+            ("ERROR x", ["error"]),
+        ]
+
+    def test_feed_rules_with_a_regex(self):
+        matcher = LineMatcher("ERROR")
+        assert matcher.feed_rules("ERROR x\n") == [("ERROR x", None)]
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from listener.line_matcher import LineMatcher
+
+
+class TestLineMatcher(object):
+
+    def test_lines_split_across_feeds(self):
+        matcher = LineMatcher("ERROR")
+        assert matcher.feed("INFO a\nERR") == []
+        assert matcher.feed("OR b\nINFO c\nERROR") == ["ERROR b"]
+        assert matcher.feed(" d\n") == ["ERROR d"]
+
+    def test_regex_is_searched_per_line(self):
+        matcher = LineMatcher(r"^ERROR .*end$")
+        data = "ERROR no\nend\nINFO ERROR x end\nERROR y end\n"
+        assert matcher.feed(data) == ["ERROR y end"]
+
+    def test_line_matching_twice_is_given_once(self):
+        matcher = LineMatcher("ERROR")
+        assert matcher.feed("ERROR ERROR\nINFO\nERROR\n") == [
+            "ERROR ERROR", "ERROR",
+        ]
+
+    def test_carriage_return_is_stripped(self):
+        matcher = LineMatcher("ERROR")
+        assert matcher.feed("ERROR a\r\nINFO\r\n") == ["ERROR a"]
+
+    def test_flush_scans_the_unfinished_line(self):
+        matcher = LineMatcher("ERROR")
+        assert matcher.feed("INFO\nERROR last") == []
+        assert matcher.flush() == ["ERROR last"]
+        assert matcher.flush() == []
+
+    def test_long_pending_line_is_scanned_and_dropped(self):
+        matcher = LineMatcher("ERROR", max_pending_line=10)
+        assert matcher.feed("x" * 8) == []
+        assert matcher.feed("ERROR") == ["x" * 8 + "ERROR"]
+        assert matcher.feed("INFO\nERROR b\n") == ["ERROR b"]
+
+    def test_feed_offsets(self):
+        matcher = LineMatcher("ERROR")
+        assert matcher.feed_offsets("INFO a\nERR") == []
+        assert matcher.feed_offsets("OR b\nERROR c\n") == [
+            (7, "ERROR b"), (15, "ERROR c"),
+        ]
+        assert matcher.position == 23
+
+    def test_reset_drops_the_unfinished_line(self):
+        matcher = LineMatcher("ERROR")
+        assert matcher.feed_offsets("INFO\nERROR partial") == []
+        matcher.reset(100)
+        assert matcher.feed_offsets(" ERROR new\n") == [(100, " ERROR new")]
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import time
+
+from listener import helpers, local_log_follower
+from listener.local_log_follower import FollowedFile, LocalLogFollower
+
+
+def read_all(followed):
+    return "".join(data for _, data in followed.read(helpers.READ_SIZE))
+
+
+class TestFollowedFile(object):
+
+    def test_missing_file(self, tmpdir):
+        followed = FollowedFile(str(tmpdir.join("engine.log")))
+        assert read_all(followed) == ""
+        tmpdir.join("engine.log").write("a\n")
+        assert read_all(followed) == "a\n"
+
+    def test_appended_data(self, tmpdir):
+        log = tmpdir.join("engine.log")
+        log.write("old\n")
+        followed = FollowedFile(str(log))
+        assert followed.open(at_end=True)
+        assert read_all(followed) == ""
+        log.write("new line\n", mode="a")
+        assert list(followed.read(helpers.READ_SIZE)) == [(4, "new line\n")]
+        assert read_all(followed) == ""
+
+    def test_truncated(self, tmpdir):
+        log = tmpdir.join("engine.log")
+        log.write("a long first line\n")
+        followed = FollowedFile(str(log))
+        assert read_all(followed) == "a long first line\n"
+        log.write("short\n")
+        assert read_all(followed) == "short\n"
+
+    def test_rotated(self, tmpdir):
+        log = tmpdir.join("engine.log")
+        log.write("first\n")
+        followed = FollowedFile(str(log))
+        assert read_all(followed) == "first\n"
+        log.write("last of old\n", mode="a")
+        log.rename(tmpdir.join("engine.log.1"))
+        # rotated away, not re-created yet
+        assert read_all(followed) == "last of old\n"
+        tmpdir.join("engine.log").write("new\n")
+        assert read_all(followed) == "new\n"
+        assert followed.offset == 4
+
+
+class TestLocalLogFollower(object):
+
+    def watch(self, follower, regex, time_out=5, write=None):
+        if write is not None:
+            timer = threading.Timer(0.2, write)
+            timer.start()
+        try:
+            return follower.watch(regex, time_out)
+        finally:
+            if write is not None:
+                timer.join()
+
+    def test_watch(self, tmpdir):
+        log = tmpdir.join("engine.log")
+        log.write("ERROR before the watch\n")
+        follower = LocalLogFollower([str(log)])
+        follower.open()
+        try:
+            path, offset, line = self.watch(
+                follower, "ERROR",
+                write=lambda: log.write("INFO a\nERROR b\n", mode="a"),
+            )
+        finally:
+            follower.close()
+        assert (path, offset, line) == (str(log), 30, "ERROR b")
+
+    def test_watch_several_logs(self, tmpdir):
+        engine = tmpdir.join("engine.log")
+        vdsm = tmpdir.join("vdsm.log")
+        engine.write("")
+        follower = LocalLogFollower([str(engine), str(vdsm)])
+        follower.open()
+        try:
+            # vdsm.log is created after the watch started
+            path, offset, line = self.watch(
+                follower, "ERROR", write=lambda: vdsm.write("ERROR v\n"),
+            )
+        finally:
+            follower.close()
+        assert (path, offset, line) == (str(vdsm), 0, "ERROR v")
+
+    def test_timeout(self, tmpdir):
+        log = tmpdir.join("engine.log")
+        log.write("")
+        follower = LocalLogFollower([str(log)])
+        follower.open()
+        start = time.time()
+        try:
+            assert follower.watch("ERROR", 1) == (None, None, '')
+        finally:
+            follower.close()
+        assert 1 <= time.time() - start < 3
+
+    def test_without_inotify(self, tmpdir, monkeypatch):
+        def no_inotify():
+            raise OSError(38, os.strerror(38))
+
+        monkeypatch.setattr(local_log_follower, "Inotify", no_inotify)
+        log = tmpdir.join("engine.log")
+        log.write("")
+        follower = LocalLogFollower([str(log)])
+        follower.open()
+        assert follower.inotify is None
+        try:
+            path, offset, line = self.watch(
+                follower, "ERROR", write=lambda: log.write("ERROR x\n"),
+            )
+        finally:
+            follower.close()
+        assert line == "ERROR x"
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import inspect
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from log_dumper import log_dumper, window_extractor
+
+
+def run_remote(cmd, stdin=b""):
+    """
+    Run a command the way RemoteExecutor does, joined by list2cmdline and
+    parsed by the login shell of the host
+    """
+    proc = subprocess.Popen(
+        ['sh', '-c', subprocess.list2cmdline(cmd)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    out, err = proc.communicate(stdin)
+    return proc.returncode, out, err
+
+
+class TestWindowExtractorCmd(object):
+    lines = [
+        b"2018-07-25 03:00:00,000 INFO before\n",
+        b"2018-07-25 03:10:00,000 INFO first\n",
+        b"  continued\n",
+        b"2018-07-25 03:20:00,000 INFO last\n",
+        b"2018-07-25 03:30:00,000 INFO after\n",
+    ]
+
+    def test_python_lookup(self):
+        rc, out, _ = run_remote(log_dumper.PYTHON_LOOKUP_CMD)
+        assert not rc
+        assert b"python" in out
+
+    def test_window(self, tmpdir):
+        log = tmpdir.join("engine $HOME's.log")
+        log.write(b"".join(self.lines), mode="wb")
+        cmd = log_dumper.window_extractor_cmd(
+            sys.executable, str(log).replace(" ", "_"),
+            "2018-07-25 03:10:00", "2018-07-25 03:20:01",
+        )
+        # the path has a space, quoted words can't carry it
+        with pytest.raises(ValueError):
+            log_dumper.window_extractor_cmd(
+                sys.executable, str(log),
+                "2018-07-25 03:10:00", "2018-07-25 03:20:01",
+            )
+        log.rename(str(log).replace(" ", "_"))
+        script = inspect.getsource(window_extractor).encode()
+        rc, out, err = run_remote(cmd, script)
+        assert not rc, err
+        header, window = out.split(b"\n", 1)
+        start = len(self.lines[0])
+        end = start + len(b"".join(self.lines[1:4]))
+        assert header.split() == [
+            str(start).encode(), str(end).encode(),
+            str(end + len(self.lines[4])).encode(),
+        ]
+        assert window == b"".join(self.lines[1:4])
+
+
+class TestDumpHosts(object):
+
+    def test_hung_host_with_more_hosts_than_workers(self, tmpdir, monkeypatch):
+        release = threading.Event()
+
+        def get_host_executor(ip, password, username=None):
+            if ip == "hung":
+                release.wait(30)
+            raise IOError("no route to host %s" % ip)
+
+        monkeypatch.setattr(
+            log_dumper.helpers, "get_host_executor", get_host_executor
+        )
+        hosts = ["hung", "10.0.0.2", "10.0.0.3"]
+        start = time.time()
+        try:
+            results = log_dumper.dump_hosts(
+                hosts, ["pass"] * 3, ["root"] * 3,
+                [["/var/log/a.log", "/var/log/b.log", "/var/log/c.log"]],
+                100, "pass", str(tmpdir), workers=1, host_timeout=1,
+            )
+        finally:
+            release.set()
+        # one round of workers per host, each given up after host_timeout
+        assert time.time() - start < 3 + 2 * log_dumper.WAIT_INTERVAL
+        assert [result.timed_out for result in results] == [True] * 3
+        assert [result.start_time is None for result in results] == [
+            False, True, True,
+        ]
+
+
+class TestCollectLogs(object):
+
+    def test_localhost_root_user(self, tmpdir, monkeypatch):
+        transfers = []
+
+        class FS(object):
+            def transfer(self, path_src, target_host, path_dst):
+                transfers.append((path_src, target_host, path_dst))
+                return path_dst
+
+        class RemoteHost(object):
+            fs = FS()
+
+        monkeypatch.setattr(log_dumper.LOCAL_HOST, "users", [])
+        dumper = log_dumper.LogDumper(["10.0.0.1"], ["pass"],
+                                      localhost_pass="local")
+        dumper.collect_logs(RemoteHost(), ["/var/log/a.log"], str(tmpdir))
+        dumper.collect_logs(RemoteHost(), ["/var/log/b.log"], str(tmpdir))
+        assert [user.password for user in log_dumper.LOCAL_HOST.users] == [
+            "local",
+        ]
+        assert log_dumper.LOCAL_HOST.users[0].name == "root"
+        assert [src for src, _, _ in transfers] == [
+            "/var/log/a.log", "/var/log/b.log",
+        ]
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import json
+import os
+import subprocess
+
+from log_dumper import log_store
+from log_dumper.log_store import (
+    LogStore, materialize_manifest, write_manifest,
+)
+
+
+class LocalSession(object):
+
+    def open_file(self, path, mode):
+        return open(path, mode)
+
+
+class LocalExecutor(object):
+    """
+    Executor of the local host, in place of a RemoteExecutor
+    """
+
+    def run_cmd(self, cmd):
+        proc = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        out, err = proc.communicate()
+        return proc.returncode, out, err
+
+    @contextlib.contextmanager
+    def session(self):
+        yield LocalSession()
+
+
+class TestLogStore(object):
+    chunk_size = 16
+
+    def fetch(self, store, log):
+        return store.fetch("10.0.0.1", LocalExecutor(), str(log))
+
+    def stored(self, store, entry):
+        return "".join(store.read_chunks(entry["chunks"]))
+
+    def chunk_files(self, store):
+        return sorted(
+            name for _, _, files in os.walk(store.chunks_dir)
+            for name in files
+        )
+
+    def test_append(self, tmpdir):
+        store = LogStore(str(tmpdir.join("store")), self.chunk_size)
+        log = tmpdir.join("engine.log")
+        log.write("a" * 20)
+        entry = self.fetch(store, log)
+        assert entry["fetched"] == 20
+        assert [size for _, size in entry["chunks"]] == [16, 4]
+
+        log.write("b" * 30, mode="a")
+        entry = self.fetch(store, log)
+        assert entry["fetched"] == 30
+        # the partial last chunk was refilled
+        assert [size for _, size in entry["chunks"]] == [16, 16, 16, 2]
+        assert self.stored(store, entry) == log.read()
+
+        entry = self.fetch(store, log)
+        assert entry["fetched"] == 0
+        assert self.stored(store, entry) == log.read()
+
+    def test_state_is_saved(self, tmpdir):
+        path = str(tmpdir.join("store"))
+        log = tmpdir.join("engine.log")
+        log.write("a" * 20)
+        store = LogStore(path, self.chunk_size)
+        self.fetch(store, log)
+        store.save()
+        log.write("b" * 10, mode="a")
+        entry = self.fetch(LogStore(path, self.chunk_size), log)
+        assert entry["fetched"] == 10
+        assert self.stored(store, entry) == log.read()
+
+    def test_rotated(self, tmpdir):
+        store = LogStore(str(tmpdir.join("store")), self.chunk_size)
+        log = tmpdir.join("engine.log")
+        log.write("a" * 20)
+        self.fetch(store, log)
+        log.rename(tmpdir.join("engine.log.1"))
+        log.write("c" * 40)
+        entry = self.fetch(store, log)
+        assert entry["fetched"] == 40
+        assert self.stored(store, entry) == "c" * 40
+
+    def test_truncated(self, tmpdir):
+        store = LogStore(str(tmpdir.join("store")), self.chunk_size)
+        log = tmpdir.join("engine.log")
+        log.write("a" * 20)
+        self.fetch(store, log)
+        with open(str(log), "r+") as f:
+            f.truncate(5)
+        entry = self.fetch(store, log)
+        assert entry["fetched"] == 5
+        assert self.stored(store, entry) == "a" * 5
+
+    def test_rewritten_tail(self, tmpdir):
+        store = LogStore(str(tmpdir.join("store")), self.chunk_size)
+        log = tmpdir.join("engine.log")
+        log.write("a" * 20)
+        self.fetch(store, log)
+        # same inode, grown, but the fetched bytes changed
+        with open(str(log), "r+") as f:
+            f.write("x" * 20 + "y" * 10)
+        entry = self.fetch(store, log)
+        assert entry["fetched"] == 30
+        assert self.stored(store, entry) == "x" * 20 + "y" * 10
+
+    def test_chunks_are_shared(self, tmpdir):
+        store = LogStore(str(tmpdir.join("store")), self.chunk_size)
+        engine = tmpdir.join("engine.log")
+        engine.write("a" * 32)
+        copy = tmpdir.join("engine-copy.log")
+        copy.write("a" * 32)
+        self.fetch(store, engine)
+        self.fetch(store, copy)
+        assert len(self.chunk_files(store)) == 1
+
+    def test_manifest(self, tmpdir):
+        store = LogStore(str(tmpdir.join("store")), self.chunk_size)
+        log = tmpdir.join("engine.log")
+        log.write("line\n" * 10)
+        incident = tmpdir.mkdir("incident")
+        path = write_manifest([self.fetch(store, log)], str(incident))
+        assert os.path.basename(path) == log_store.MANIFEST_FILE
+        assert json.load(open(path))[0]["path"] == str(log)
+        dest = tmpdir.mkdir("materialized")
+        assert materialize_manifest(store, str(incident), str(dest)) == [
+            str(dest.join("engine.log")),
+        ]
+        assert dest.join("engine.log").read() == log.read()
+
+    def test_gc(self, tmpdir):
+        store = LogStore(str(tmpdir.join("store")), self.chunk_size)
+        log = tmpdir.join("engine.log")
+        log.write("a" * 20)
+        incident = tmpdir.mkdir("incident")
+        store.add_manifest(
+            write_manifest([self.fetch(store, log)], str(incident))
+        )
+        partial = self.fetch(store, log)["chunks"][-1][0]
+        log.write("b" * 4, mode="a")
+        entry = self.fetch(store, log)
+        assert partial not in [digest for digest, _ in entry["chunks"]]
+        # the refilled partial chunk is still referred to by the manifest
+        assert store.gc() == 0
+        assert partial in self.chunk_files(store)
+        incident.remove()
+        assert store.gc() == 1
+        assert self.chunk_files(store) == sorted(
+            digest for digest, _ in entry["chunks"]
+        )
+        assert self.stored(store, entry) == log.read()
+        assert store.manifests == []
+
+    def test_gc_skipped_while_fetching(self, tmpdir):
+        store = LogStore(str(tmpdir.join("store")), self.chunk_size)
+        store.put_chunk("a" * 16)
+        store.fetching = 1
+        assert store.gc() == 0
+        store.fetching = 0
+        assert store.gc() == 1
+
+    def test_manifests_are_saved(self, tmpdir):
+        path = str(tmpdir.join("store"))
+        store = LogStore(path, self.chunk_size)
+        store.add_manifest(str(tmpdir.join("incident", "manifest.json")))
+        store.save()
+        assert LogStore(path, self.chunk_size).manifests == [
+            str(tmpdir.join("incident", "manifest.json")),
+        ]
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import json
+import Queue
+import threading
+import time
+
+import pytest
+
+from listener import multi_log_listener
+from listener.multi_log_listener import MultiLogListener
+from manager import manager
+
+
+class FakeChannel(object):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_manager(**kwargs):
+    return manager.Manager(
+        fault_regex=None, logs=[["/var/log/vdsm/vdsm.log"]],
+        remote_hosts=["10.0.0.1"], remote_users=["root"],
+        remote_passwords=["pass"], timeout=-1, continuous=True,
+        fault_rules=[{"name": "error", "regex": "ERROR", "action": "log"}],
+        **kwargs
+    )
+
+
+class TestMultiLogListener(object):
+
+    def test_keyboard_interrupt(self, monkeypatch):
+        def select(*args):
+            raise KeyboardInterrupt()
+
+        monkeypatch.setattr(multi_log_listener.select, "select", select)
+        listener = MultiLogListener([])
+        channel = FakeChannel()
+        listener.channels = {channel: ("10.0.0.1", "/var/log/vdsm/vdsm.log")}
+        with pytest.raises(KeyboardInterrupt):
+            list(listener.iter_matches("ERROR"))
+        assert channel.closed
+        assert listener.channels == {}
+
+
+class TestMonitor(object):
+
+    def test_incidents_are_written_while_monitoring(
+            self, tmpdir, monkeypatch):
+        incidents_path = tmpdir.join(manager.INCIDENTS_FILE)
+        monkeypatch.setattr(manager, "INCIDENTS_DUMP_INTERVAL", 0.5)
+        rules = make_manager().fault_rules.rules
+        seen = []
+
+        def counts():
+            return [incident["count"]
+                    for incident in json.loads(incidents_path.read())]
+
+        class Listener(object):
+
+            def __init__(self, hosts_logs, time_out):
+                pass
+
+            def iter_matches(self, regex):
+                host, log = "10.0.0.1", "/var/log/vdsm/vdsm.log"
+                yield host, log, "ERROR a 1", rules
+                seen.append(counts())
+                yield host, log, "ERROR a 2", rules
+                seen.append(counts())
+                yield host, log, "ERROR b", rules
+                seen.append(counts())
+                time.sleep(0.5)
+                yield host, log, "ERROR a 3", rules
+                seen.append(counts())
+                raise KeyboardInterrupt()
+
+            def close(self):
+                pass
+
+        monkeypatch.setattr(manager, "MultiLogListener", Listener)
+        make_manager()._rhv_monitor(str(tmpdir))
+        # new incidents are written right away, repeats once in a while
+        assert seen == [[1], [1], [2, 1], [3, 1]]
+        assert counts() == [3, 1]
+
+
+class TestIncidentPipeline(object):
+
+    def test_hosts_are_parsed_off_the_dump_workers(self, tmpdir, monkeypatch):
+        hosts = ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+        dump_threads = []
+        parsed = []
+
+        class Result(object):
+            def __init__(self, host_ip):
+                self.host_ip = host_ip
+
+        def dump_hosts_logs(*args, **kwargs):
+            for host in hosts:
+                dump_threads.append(threading.current_thread())
+                kwargs["on_host_done"](Result(host))
+            return ["versions"]
+
+        def parse_host_logs(scenario_finder_obj, full_path, result):
+            parsed.append((threading.current_thread(), result.host_ip))
+            if result.host_ip == "10.0.0.2":
+                raise IOError("no such file")
+
+        monkeypatch.setattr(manager, "dump_hosts_logs", dump_hosts_logs)
+        manager_obj = make_manager()
+        monkeypatch.setattr(manager_obj, "_parse_host_logs", parse_host_logs)
+        dumped_hosts = Queue.Queue()
+        parser = threading.Thread(
+            target=manager_obj._parse_dumped_hosts,
+            args=(None, str(tmpdir), dumped_hosts),
+        )
+        parser.start()
+        try:
+            assert manager_obj._dump_logs(
+                str(tmpdir), None, dumped_hosts
+            ) == ["versions"]
+        finally:
+            parser.join(5)
+        # a failed host does not stop the others, the parse ends with the dump
+        assert not parser.is_alive()
+        assert [host for _, host in parsed] == hosts
+        assert set(thread for thread, _ in parsed) == set([parser])
+        assert parser not in dump_threads
+
+    def test_compression_is_passed_to_the_dump(self, tmpdir, monkeypatch):
+        calls = []
+
+        def dump_hosts_logs(*args, **kwargs):
+            calls.append(kwargs)
+            return []
+
+        monkeypatch.setattr(manager, "dump_hosts_logs", dump_hosts_logs)
+        manager_obj = make_manager(compression="zstd", keep_compressed=True)
+        manager_obj._dump_logs(str(tmpdir), None, Queue.Queue())
+        assert [(kwargs["compression"], kwargs["keep_compressed"])
+                for kwargs in calls] == [("zstd", True)]
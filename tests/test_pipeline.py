@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+
+from manager.pipeline import Pipeline
+
+
+class TestPipeline(object):
+
+    def test_dependency_order(self):
+        order = []
+        lock = threading.Lock()
+
+        def step(name, delay=0):
+            time.sleep(delay)
+            with lock:
+                order.append(name)
+            return name
+
+        pipeline = Pipeline("test")
+        pipeline.add("report", step, ("report",), requires=["dump", "env"])
+        pipeline.add("dump", step, ("dump", 0.2))
+        pipeline.add("env", step, ("env",))
+        pipeline.add("notify", step, ("notify",), requires=["env"])
+        steps = pipeline.run()
+        assert [s.state for s in steps] == ["done"] * 4
+        assert pipeline["report"].result == "report"
+        assert order.index("env") < order.index("notify")
+        assert order[-1] == "report"
+        # notify did not wait for the slow dump
+        assert order.index("notify") < order.index("dump")
+
+    def test_independent_steps_overlap(self):
+        pipeline = Pipeline("test")
+        for name in "abc":
+            pipeline.add(name, time.sleep, (0.3,))
+        start = time.time()
+        pipeline.run()
+        assert time.time() - start < 0.6
+
+    def test_failure_skips_requiring_steps(self):
+        def fail():
+            raise RuntimeError("no route to host")
+
+        pipeline = Pipeline("test")
+        pipeline.add("dump", fail)
+        pipeline.add("parse", lambda: "parsed", requires=["dump"])
+        pipeline.add("report", lambda: "reported", requires=["parse"])
+        pipeline.add("env", lambda: "env")
+        pipeline.run()
+        assert [(s.name, s.state) for s in pipeline.steps] == [
+            ("dump", "failed"), ("parse", "skipped"), ("report", "skipped"),
+            ("env", "done"),
+        ]
+        assert pipeline["dump"].error == "no route to host"
+        assert pipeline["parse"].start_time is None
+        assert [s["state"] for s in pipeline.to_dict()["steps"]] == [
+            "failed", "skipped", "skipped", "done",
+        ]
+
+    def test_invalid_dependencies(self):
+        pipeline = Pipeline("test")
+        pipeline.add("a", lambda: None, requires=["b"])
+        with pytest.raises(ValueError):
+            pipeline.add("a", lambda: None)
+        with pytest.raises(ValueError):
+            pipeline.run()
+        pipeline.add("b", lambda: None, requires=["a"])
+        with pytest.raises(ValueError):
+            pipeline.run()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+import calendar
+import multiprocessing
+from datetime import datetime
+
+import pytest
+
+from scenario_finder import profiles
+from scenario_finder.profiles import (
+    ScenarioProfile, event_string_profile, load_scenario_profiles,
+)
+from scenario_finder.scenario_finder import ScenarioFinder
+
+ENGINE_LINE = (
+    "2018-07-25 03:05:01,100+03 INFO  [org.A] (task-1) [corr1] "
+    "EVENT_ID: USER_VDC_LOGIN(30), User admin connected.\n"
+)
+VDSM_LINE = (
+    "2018-07-25 03:05:02,200+0300 INFO  (jsonrpc/1) [vdsm.api] START "
+    "getSpmStatus(spUUID='x') from=::1,1234, flow_id=flow-1, "
+    "task_id=t (api:46)\n"
+)
+SUPERVDSM_LINE = (
+    "MainProcess|jsonrpc/0::DEBUG::2018-07-25 03:05:03,300::supervdsm_server"
+    "::93::SuperVdsm.ServerCallback::(wrapper) call getHardwareInfo with "
+    "() {}\n"
+)
+LIBVIRT_LINE = (
+    "2018-07-25 00:05:04.400+0000: 1234: error : virNetSocketReadWire:1806 "
+    ": End of file while reading data\n"
+)
+
+
+def builtin(name):
+    return load_scenario_profiles([name])[0]
+
+
+class TestScenarioProfile(object):
+
+    def test_load_builtin_profiles(self):
+        loaded = load_scenario_profiles(sorted(profiles.PROFILES))
+        assert [profile.name for profile in loaded] == sorted(
+            profiles.PROFILES
+        )
+
+    def test_override_builtin_profile(self):
+        profile, = load_scenario_profiles(
+            [{"name": "vdsm", "files": r"^vdsm-1\.log"}]
+        )
+        assert profile.files.search("vdsm-1.log")
+        assert not profile.files.search("vdsm.log")
+        assert profile.event_regexes == profiles.PROFILES["vdsm"][
+            "event_regexes"
+        ]
+
+    def test_load_yaml_file(self, tmpdir):
+        path = tmpdir.join("profiles.yaml")
+        path.write(
+            "- engine\n"
+            "- name: sanlock\n"
+            "  files: ^sanlock\\.log\n"
+            "  event_regexes: [' error ']\n"
+        )
+        assert [p.name for p in load_scenario_profiles(str(path))] == [
+            "engine", "sanlock",
+        ]
+
+    def test_invalid_profiles(self):
+        with pytest.raises(ValueError):
+            load_scenario_profiles(["sanlock"])
+        with pytest.raises(ValueError):
+            ScenarioProfile("empty", "log", [])
+
+    def test_is_event(self):
+        engine = builtin("engine")
+        assert engine.literal == "EVENT_ID"
+        assert engine.is_event(ENGINE_LINE)
+        vdsm = builtin("vdsm")
+        assert not vdsm.gate_only
+        assert vdsm.is_event(VDSM_LINE)
+        assert vdsm.is_event("2018-07-25 03:05:02,200+0300 ERROR (a) x\n")
+        # passes the literal prefilter only
+        assert not vdsm.is_event("2018-07-25 03:05:02 INFO RESTART now\n")
+        assert builtin("supervdsm").is_event(SUPERVDSM_LINE)
+        assert builtin("libvirt").is_event(LIBVIRT_LINE)
+
+    def test_line_time(self):
+        assert builtin("engine").line_time(ENGINE_LINE) == datetime(
+            2018, 7, 25, 3, 5, 1, 100000
+        )
+        assert builtin("supervdsm").line_time(SUPERVDSM_LINE) == datetime(
+            2018, 7, 25, 3, 5, 3, 300000
+        )
+        assert builtin("engine").line_time("  continued\n") is None
+
+    def test_utc_line_time(self):
+        libvirt = builtin("libvirt")
+        utc_time = datetime(2018, 7, 25, 0, 5, 4)
+        local_time = datetime.fromtimestamp(
+            calendar.timegm(utc_time.timetuple())
+        )
+        assert libvirt.line_time(LIBVIRT_LINE) == local_time.replace(
+            microsecond=400000
+        )
+        assert libvirt.log_time(local_time) == utc_time
+
+    def test_parse_event(self):
+        engine_event = builtin("engine").parse_event(ENGINE_LINE, None)
+        assert (engine_event.component, engine_event.code,
+                engine_event.correlation_id) == (
+            "engine", "USER_VDC_LOGIN", "corr1",
+        )
+        vdsm_event = builtin("vdsm").parse_event(VDSM_LINE, None)
+        assert (vdsm_event.component, vdsm_event.correlation_id) == (
+            "vdsm", "flow-1",
+        )
+
+    def test_key(self):
+        keys = set(
+            profile.key for profile in [
+                builtin("engine"), builtin("vdsm"),
+                event_string_profile("EVENT_ID"),
+                event_string_profile("USER_VDC_LOGIN"),
+                ScenarioProfile("engine", r"engine", [r"EVENT_ID"], utc=True),
+            ]
+        )
+        assert len(keys) == 5
+        assert builtin("vdsm").key == builtin("vdsm").key
+
+
+class TestScenarioFinderProfiles(object):
+
+    def write_logs(self, tmpdir):
+        logs = tmpdir.mkdir("logs")
+        logs.join("engine.log").write(
+            "2018-07-25 03:04:00,000+03 INFO  before EVENT_ID: OLD(1)\n" +
+            ENGINE_LINE +
+            "2018-07-25 03:05:05,000+03 INFO  [org.A] (task-1) [corr2] "
+            "EVENT_ID: LAST(2), done\n"
+        )
+        logs.join("vdsm.log").write(
+            "2018-07-25 03:05:00,000+0300 INFO  (a) nothing\n" + VDSM_LINE
+        )
+        logs.join("supervdsm.log").write(SUPERVDSM_LINE)
+        # stamped in UTC, 03:05:04 local time
+        utc_time = builtin("libvirt").log_time(datetime(2018, 7, 25, 3, 5, 4))
+        logs.join("libvirtd.log").write(
+            utc_time.strftime("%Y-%m-%d %H:%M:%S") + LIBVIRT_LINE[19:]
+        )
+        logs.join("other.log").write(ENGINE_LINE)
+        return logs
+
+    def find(self, tmpdir, workers, index_path=None):
+        finder = ScenarioFinder(
+            "2018-07-25 03:05:00", str(tmpdir.join("logs")), None,
+            str(tmpdir.join("scenario.txt")), workers=workers,
+            index_path=index_path,
+            scenario_profiles=["engine", "vdsm", "supervdsm", "libvirt"],
+        )
+        finder.parse_logs()
+        return finder
+
+    @pytest.mark.parametrize(("workers", "index"), [
+        (1, False), (4, False), (1, True),
+    ])
+    def test_one_timeline(self, tmpdir, workers, index):
+        self.write_logs(tmpdir)
+        index_path = str(tmpdir.join("index.sqlite")) if index else None
+        finder = self.find(tmpdir, workers, index_path)
+        assert finder.time_start_found
+        assert [event.component for event in finder.events] == [
+            "engine", "vdsm", "supervdsm", "libvirt", "engine",
+        ]
+        assert [event.correlation_id for event in finder.events][:2] == [
+            "corr1", "flow-1",
+        ]
+
+    @pytest.mark.parametrize("index", [False, True])
+    def test_events_within_a_second(self, tmpdir, index):
+        logs = tmpdir.mkdir("logs")
+        line = (
+            "2018-07-25 03:05:01,%03d+03 INFO  [org.A] (task-1) [corr] "
+            "EVENT_ID: CODE_%d(1), msg\n"
+        )
+        logs.join("engine.log").write(line % (300, 300) + line % (500, 500))
+        logs.join("engine.log-1").write(
+            line % (100, 100) + line % (400, 400)
+        )
+        index_path = str(tmpdir.join("index.sqlite")) if index else None
+        finder = self.find(tmpdir, 1, index_path)
+        assert [event.code for event in finder.events] == [
+            "CODE_100", "CODE_300", "CODE_400", "CODE_500",
+        ]
+
+    def test_given_pool(self, tmpdir):
+        self.write_logs(tmpdir)
+        pool = multiprocessing.Pool(2)
+        calls = []
+
+        class Pool(object):
+            def map(self, *args, **kwargs):
+                calls.append(args)
+                return pool.map(*args, **kwargs)
+
+        try:
+            finder = ScenarioFinder(
+                "2018-07-25 03:05:00", str(tmpdir.join("logs")), None,
+                str(tmpdir.join("scenario.txt")), workers=1,
+                scenario_profiles=["engine", "vdsm", "supervdsm", "libvirt"],
+                pool=Pool(),
+            )
+            finder.parse_logs()
+        finally:
+            pool.close()
+            pool.join()
+        assert len(calls) == 1
+        assert len(finder.events) == 5